@@ -1,7 +1,7 @@
 import logging
 from datetime import datetime
 
-from django.db.models import Q,Sum
+from django.db.models import Q
 from django.utils import timezone
 from django.contrib.auth import authenticate
 
@@ -11,9 +11,9 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.pagination import PageNumberPagination
-from decimal import Decimal
 
 from accounts.models import User
+from utils.phone import is_phone_query, normalize_phone, phone_suffix_q
 from accounts.serializers import (
     UserProfileSerializer,
     LoginSerializer,
@@ -23,7 +23,8 @@ from accounts.serializers import (
 
 from staff.models import StaffAttendance
 
-from finance.models import Expense, Income, StockTransaction
+from finance.shifts import close_shift_snapshot, payment_method_breakdown, shift_finance_totals
+from finance.models import StockTransaction
 from finance.serializers import ExpenseSerializer, IncomeSerializer
 
 logger = logging.getLogger(__name__)
@@ -108,16 +109,25 @@ def api_user_list(request):
         elif search_query.lower() in ['غير نشط', 'inactive', 'false', '0']:
             is_active_filter = False
 
-        query = (
-            Q(username__icontains=search_query) |
-            Q(email__icontains=search_query) |
-            Q(first_name__icontains=search_query) |
-            Q(last_name__icontains=search_query) |
-            Q(role__icontains=search_query) |
-            Q(rfid_code__iexact=search_query) |
-            Q(phone_number__iexact=search_query) |
-            Q(card_number__icontains=search_query)
-        )
+        if is_phone_query(search_query):
+            # بحث بالأرقام: الرقم كاملا أو نهايته على الفهارس فقط، ومطابقة تامة لكود RFID ورقم الكارت
+            query = (
+                Q(phone_number=normalize_phone(search_query)) |
+                phone_suffix_q('phone_number_reversed', search_query) |
+                Q(rfid_code=search_query) |
+                Q(card_number=search_query)
+            )
+        else:
+            query = (
+                Q(username__icontains=search_query) |
+                Q(email__icontains=search_query) |
+                Q(first_name__icontains=search_query) |
+                Q(last_name__icontains=search_query) |
+                Q(role__icontains=search_query) |
+                Q(rfid_code__iexact=search_query) |
+                Q(phone_number__iexact=search_query) |
+                Q(card_number__icontains=search_query)
+            )
 
         if is_active_filter is not None:
             query &= Q(is_active=is_active_filter)
@@ -257,12 +267,6 @@ def api_system_users(request):
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-PAYMENT_METHOD_TRANSLATIONS = {
-    "Cash": "كاش",
-    "Visa": "فيزا"
-}
-
-
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def api_shift_reports(request):
@@ -309,52 +313,23 @@ def api_shift_reports(request):
         role__in=FULL_ACCESS_ROLES + ['reception']
     ).distinct()
 
+    # كل الشيفتات في استعلام واحد؛ المغلقة تقرأ من اللقطة المحفوظة والمفتوحة (أو التي بلا لقطة بعد) تحسب الآن دون كتابة
+    shifts = StaffAttendance.objects.filter(
+        staff__in=system_users,
+        check_in__range=[start_date, end_date]
+    ).select_related('finance_snapshot').order_by('check_in')
+    shifts_by_user = {}
+    for shift in shifts:
+        shifts_by_user.setdefault(shift.staff_id, []).append(shift)
+    totals_by_shift = shift_finance_totals(shift for user_shifts in shifts_by_user.values() for shift in user_shifts)
+
     report_data = []
     for user in system_users:
-        # Get shifts within the date range
-        shifts = StaffAttendance.objects.filter(
-            staff=user,
-            check_in__range=[start_date, end_date]
-        ).select_related('staff').order_by('check_in')
-        
         user_shifts = []
-        for shift in shifts:
-            # Get total expenses and incomes during the shift
-            expenses = Expense.objects.filter(
-                paid_by=user,
-                date__range=[shift.check_in, shift.check_out or timezone.now()]
-            ).aggregate(total_expense=Sum('amount'))['total_expense'] or Decimal('0.0')
-            
-            incomes = Income.objects.filter(
-                received_by=user,
-                date__range=[shift.check_in, shift.check_out or timezone.now()]
-            )
-            
-            # التحقق من وجود إيرادات بدون طريقة دفع
-            null_payment_methods = incomes.filter(payment_method__isnull=True).count()
-            if null_payment_methods > 0:
-                logger.warning(f"Found {null_payment_methods} income records with no payment method for user {user.username} in shift {shift.id}", extra={'force': True})
-
-            # تجميع الإيرادات حسب طريقة الدفع
-            income_by_payment_method = incomes.values('payment_method__name').annotate(
-                total_income=Sum('amount')
-            ).order_by('payment_method__name')
-
-            total_income = incomes.aggregate(total_income=Sum('amount'))['total_income'] or Decimal('0.0')
-            
-            # إعداد بيانات طرق الدفع
-            payment_methods_data = []
-            for item in income_by_payment_method:
-                method_name = item['payment_method__name'] or 'غير محدد'
-                method_income = item['total_income'] or Decimal('0.0')
-                method_expense = (method_income / total_income * expenses) if total_income > 0 else Decimal('0.0')
-                method_net_profit = method_income - method_expense
-                payment_methods_data.append({
-                    'payment_method': PAYMENT_METHOD_TRANSLATIONS.get(method_name, method_name),
-                    'total_income': float(method_income),
-                    'total_expense': float(method_expense),
-                    'net_profit': float(method_net_profit)
-                })
+        for shift in shifts_by_user.get(user.id, []):
+            totals = totals_by_shift[shift.id]
+            total_income = totals['total_income']
+            expenses = totals['total_expense']
 
             # Calculate shift duration in hours
             end_time = shift.check_out or timezone.now()
@@ -368,7 +343,7 @@ def api_shift_reports(request):
                 'total_expense': float(expenses),
                 'net_profit': float(total_income - expenses),
                 'shift_duration': round(duration, 2),
-                'payment_methods': payment_methods_data
+                'payment_methods': payment_method_breakdown(totals)
             })
         
         report_data.append({
@@ -407,6 +382,7 @@ def staff_check_out_by_code(request):
     try:
         attendance.check_out = timezone.now()
         attendance.save(update_fields=['check_out'])
+        close_shift_snapshot(attendance)
         logger.info(f"Check-out successful for user: {user.username}, shift_id: {attendance.id}")
         return Response({
             'message': 'تم تسجيل الخروج بنجاح',
@@ -1,6 +1,7 @@
 from django.contrib.auth.models import AbstractUser, Group, Permission
 from django.db import models
 from core.models import Club
+from utils.phone import normalize_phone, reverse_digits
 
 class User(AbstractUser):
     club = models.ForeignKey(Club, on_delete=models.CASCADE, null=True, blank=True)
@@ -14,6 +15,7 @@ class User(AbstractUser):
     role = models.CharField(max_length=50, choices=ROLE_CHOICES, default='reception')
     rfid_code = models.CharField(max_length=32, unique=True, null=True, blank=True, help_text="RFID tag or card code")
     phone_number = models.CharField(max_length=15, null=True, blank=True, help_text="User's phone number")
+    phone_number_reversed = models.CharField(max_length=15, null=True, blank=True, db_index=True, editable=False)
     notes = models.TextField(null=True, blank=True, help_text="Additional notes about the user")
     card_number = models.CharField(max_length=50, null=True, blank=True, help_text="User's card number")
     address = models.TextField(null=True, blank=True, help_text="User's address")
@@ -41,6 +43,11 @@ class User(AbstractUser):
         # Only require password for owner, admin, and reception roles
         if self.role in ['accountant', 'coach']:
             self.set_unusable_password()  # Set unusable password for non-login roles
+        self.phone_number = normalize_phone(self.phone_number) or None
+        self.phone_number_reversed = reverse_digits(self.phone_number)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'phone_number' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'phone_number_reversed'}
         super().save(*args, **kwargs)
 
     class Meta:
@@ -1,3 +1,30 @@
 from django.test import TestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
 
-# Create your tests here.
+from core.models import Club
+from .api import api_user_list
+from .models import User
+
+
+class UserListSearchTests(TestCase):
+    def setUp(self):
+        self.club = Club.objects.create(name='Club')
+        self.owner = User.objects.create(username='owner', club=self.club, role='owner')
+        self.reception = User.objects.create(
+            username='reception', club=self.club, role='reception', phone_number='٠١٠ ١٢٣٤ ٥٦٧٨',
+        )
+        self.other = User.objects.create(username='emp5678', club=self.club, role='coach', card_number='995678')
+
+    def search(self, query):
+        request = APIRequestFactory().get('/', {'search': query})
+        force_authenticate(request, user=self.owner)
+        response = api_user_list(request)
+        self.assertEqual(response.status_code, 200)
+        return sorted(user['username'] for user in response.data['results'])
+
+    def test_phone_query_uses_only_phone_and_exact_identifiers(self):
+        self.assertEqual(self.reception.phone_number, '01012345678')
+        self.assertEqual(self.search('5678'), ['reception'])
+        self.assertEqual(self.search('01012345678'), ['reception'])
+        self.assertEqual(self.search('995678'), ['emp5678'])
+        self.assertEqual(self.search('emp'), ['emp5678'])
@@ -10,6 +10,7 @@ from rest_framework import status
 from rest_framework.pagination import PageNumberPagination
 from .models import Attendance, EntryLog
 from members.models import Member
+from utils.phone import normalize_phone
 from .serializers import AttendanceSerializer, EntryLogSerializer
 from django.db.models import Case, When, F, BooleanField, Q, Count
 from django.utils.dateparse import parse_datetime
@@ -169,7 +170,7 @@ def add_attendance_api(request):
         
         # Find member using identifier
         try:
-            member = Member.objects.get(Q(rfid_code=identifier) | Q(phone=identifier))
+            member = Member.objects.get(Q(rfid_code=identifier) | Q(phone=normalize_phone(identifier)))
         except Member.DoesNotExist:
             logger.error(f"No member found for identifier {identifier}")
             return Response(
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from .models import Attendance, EntryLog
 from members.models import Member
+from utils.phone import normalize_phone
 from members.serializers import MemberSerializer
 from subscriptions.models import Subscription
 from subscriptions.serializers import SubscriptionSerializer
@@ -51,7 +52,7 @@ class AttendanceSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({'identifier': 'حقل identifier مطلوب'})
 
         try:
-            member = Member.objects.get(Q(rfid_code=identifier) | Q(phone=identifier))
+            member = Member.objects.get(Q(rfid_code=identifier) | Q(phone=normalize_phone(identifier)))
         except Member.DoesNotExist:
             raise serializers.ValidationError({'identifier': 'لم يتم العثور على عضو'})
 
@@ -128,7 +129,7 @@ class EntryLogSerializer(serializers.ModelSerializer):
         try:
             member = Member.objects.get(
                 Q(rfid_code=identifier) |
-                Q(phone=identifier)
+                Q(phone=normalize_phone(identifier))
             )
         except Member.DoesNotExist:
             raise serializers.ValidationError({'identifier': 'لم يتم العثور على عضو بالـ RFID أو رقم الهاتف أو رقم العضوية المقدم'})
@@ -7,4 +7,22 @@ class Club(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+class SequenceCounter(models.Model):
+    """Last number handed out per (club, kind, day); club is empty for global sequences."""
+    club = models.ForeignKey(Club, on_delete=models.CASCADE, null=True, blank=True)
+    kind = models.CharField(max_length=30)
+    day = models.DateField()
+    last_value = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.kind} {self.day} ({self.club_id or 'global'}): {self.last_value}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['club', 'kind', 'day'], condition=models.Q(club__isnull=False),
+                                    name='unique_club_sequence_per_day'),
+            models.UniqueConstraint(fields=['kind', 'day'], condition=models.Q(club__isnull=True),
+                                    name='unique_global_sequence_per_day'),
+        ]
@@ -1,3 +1,51 @@
-from django.test import TestCase
+from datetime import date, timedelta
 
-# Create your tests here.
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from members.models import Member
+from utils.generate_membership_number import generate_membership_number, generate_membership_numbers
+from utils.sequences import allocate, daily_limit, format_daily_number, max_existing_sequence
+from .models import Club, SequenceCounter
+
+
+class SequenceTests(TestCase):
+    def setUp(self):
+        self.day = date(2025, 3, 14)
+
+    def test_counter_is_seeded_once_from_existing_numbers(self):
+        club = Club.objects.create(name='Club')
+        existing = Member.objects.create(
+            club=club, name='Member', membership_number='250314007', national_id='1',
+            birth_date=date(1990, 1, 1), phone='01000000001',
+        )
+        self.assertEqual(generate_membership_number(created_at=self.day), '250314008')
+        self.assertEqual(generate_membership_numbers(3, created_at=self.day), ['250314009', '250314010', '250314011'])
+        # العداد موجود: حذف الرقم الأعلى لا يعيد استخدام الأرقام
+        existing.delete()
+        self.assertEqual(generate_membership_number(created_at=self.day), '250314012')
+        self.assertEqual(generate_membership_number(created_at=self.day + timedelta(days=1)), '250315001')
+
+    def test_allocate_blocks_per_club_and_day(self):
+        first, second = Club.objects.create(name='First'), Club.objects.create(name='Second')
+        self.assertEqual(list(allocate('receipt', self.day, 3, club=first)), [1, 2, 3])
+        self.assertEqual(list(allocate('receipt', self.day, 2, club=first)), [4, 5])
+        self.assertEqual(list(allocate('receipt', self.day, club=second)), [1])
+        self.assertEqual(list(allocate('receipt', self.day)), [1])
+        self.assertEqual(list(allocate('receipt', self.day + timedelta(days=1), club=first)), [1])
+        with self.assertRaises(ValueError):
+            allocate('receipt', self.day, 0, club=first)
+
+    def test_limit_rolls_back_the_reservation(self):
+        self.assertEqual(list(allocate('invoice', self.day, 998, max_value=999)), list(range(1, 999)))
+        with self.assertRaisesMessage(ValueError, 'full'), transaction.atomic():
+            allocate('invoice', self.day, 2, max_value=999, limit_message='full')
+        self.assertEqual(SequenceCounter.objects.get(kind='invoice').last_value, 998)
+        self.assertEqual(list(allocate('invoice', self.day, max_value=999)), [999])
+
+    def test_helpers(self):
+        self.assertEqual(daily_limit(), 999)
+        with override_settings(SEQUENCE_WIDE_NUMBERS=True):
+            self.assertIsNone(daily_limit())
+        self.assertEqual(format_daily_number('POS-250314', 7, width=4, separator='-'), 'POS-250314-0007')
+        self.assertEqual(max_existing_sequence(['250314009', '250314x', None, '2503141000'], '250314'), 1000)
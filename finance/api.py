@@ -1,13 +1,11 @@
-import os
-import subprocess
 import logging
-import tempfile
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 from django.db.models import Sum, Q, Count
-from django.db.models.functions import TruncDay, TruncWeek, TruncMonth, TruncYear, TruncHour
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth, TruncYear
 from django.http import FileResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.utils import timezone
 from django.db import transaction
 from rest_framework import status
@@ -15,17 +13,29 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from jinja2 import Template
 from decimal import Decimal
 from accounts.models import User
 from staff.models import StaffAttendance
-from .models import Expense, Income, ExpenseCategory, IncomeSource, StockTransaction, StockItem, Schedule
+from .models import (
+    Expense, Income, ExpenseCategory, IncomeSource, InsufficientStock, StockTransaction, StockItem, Schedule,
+    FinanceDailyRollup, FinancePeriodClose, ReportJob,
+)
 from .serializers import (
     ExpenseSerializer, IncomeSerializer, ExpenseCategorySerializer, IncomeSourceSerializer,
     ExpenseDetailSerializer, IncomeDetailSerializer, IncomeSummarySerializer, StockItemSerializer, ScheduleSerializer
 )
 from utils.convert_to_name import get_object_from_id_or_name
 from utils.reports import get_employee_report_data
+from utils.streaming import EXPORT_FORMATS, iter_values, streaming_export
+from .diagnostics import diagnostics_mode, record_missing_payment_methods, record_queryset
+from .report_jobs import render_report_now, submit_report
+from .labels import UNSPECIFIED, apply_income_labels, club_labels, translate_payment_method, translate_source
+from .periods import ClosedPeriodError, close_period, parse_month, period_rows
+from .pos import checkout, parse_cart
+from .rollups import day_start, range_days, rollup_for_request, rollup_totals, whole_day_range
+from .stock import parse_inventory_counts, reconcile_inventory, sales_analysis
+from .trends import financial_trends
+from .valuation import stock_valuation
 from operator import or_
 from functools import reduce
 from django.utils.dateparse import parse_datetime
@@ -35,16 +45,11 @@ logger = logging.getLogger(__name__)
 
 FULL_ACCESS_ROLES = ['owner', 'admin']
 
-SOURCE_TRANSLATIONS = {
-    "Refund": "استرداد",
-    "Renewal": "تجديد",
-    "Subscription": "اشتراك"
-}
-
-PAYMENT_METHOD_TRANSLATIONS = {
-    "Cash": "كاش",
-    "Visa": "فيزا"
-}
+# select_related اللازم لتسلسل IncomeSerializer بدون استعلام لكل صف
+INCOME_LIST_RELATED = (
+    'club', 'source__club', 'source__stock_item', 'received_by__club', 'payment_method',
+    'stock_transaction__stock_item'
+)
 
 
 class StandardPagination(PageNumberPagination):
@@ -82,12 +87,12 @@ def apply_common_filters(queryset, request, user_field=None, source_category_fie
         attendances = StaffAttendance.objects.filter(
             staff=request.user, club=request.user.club
         ).select_related('staff', 'club')
-        if not attendances.exists():
+        latest_attendance = attendances.order_by('-check_in').first()
+        if latest_attendance is None:
             logger.debug("No attendance records found for user", extra={'force': True})
             queryset = queryset.none()
             applied_filters.append("no_attendance")
         else:
-            latest_attendance = attendances.order_by('-check_in').first()
             end_time = latest_attendance.check_out if latest_attendance.check_out else timezone.now()
             queryset = queryset.filter(date__gte=latest_attendance.check_in, date__lte=end_time)
             applied_filters.append(f"attendance={latest_attendance.id}")
@@ -199,9 +204,8 @@ def apply_common_filters(queryset, request, user_field=None, source_category_fie
         queryset = queryset.filter(stock_item__name__icontains=query_params.get('stock_item'))
         applied_filters.append(f"stock_item={query_params.get('stock_item')}")
 
-    logger.debug(f"Applied filters: {', '.join(applied_filters) if applied_filters else 'none'}", extra={'force': True})
-    logger.debug(f"Number of records after filtering: {queryset.count()}", extra={'force': True})
-    if queryset.exists():
+    # التشخيص معطل افتراضيا حتى لا يضيف استعلامات لكل طلب
+    if diagnostics_mode(request):
         sample_fields = ['id', 'amount', 'date']
         if source_category_field == 'source':
             sample_fields.append('source__name')
@@ -211,13 +215,12 @@ def apply_common_filters(queryset, request, user_field=None, source_category_fie
             sample_fields.append(f"{user_field}__username")
         if 'related_employee' in query_params:
             sample_fields.append('related_employee__username')
-        sample_records = queryset[:5].values(*sample_fields)
-        logger.debug(f"Sample records: {list(sample_records)}", extra={'force': True})
+        record_queryset(request, queryset, applied_filters, sample_fields)
     return queryset
 
 def calculate_totals(queryset, field='amount'):
     total = queryset.aggregate(total=Sum(field))['total'] or 0
-    logger.debug(f"Calculated total for {field}: {total} for {queryset.count()} records", extra={'force': True})
+    logger.debug(f"Calculated total for {field}: {total}", extra={'force': True})
     return float(total)
 
 def handle_response(data, details_queryset=None, details_serializer=None, details_key=None, translated_details=None, status_code=status.HTTP_200_OK):
@@ -349,11 +352,7 @@ def income_api(request):
         return Response({'error': 'غير مسموح: المستخدم ليس مرتبط بنادي.'}, status=status.HTTP_403_FORBIDDEN)
     if request.method == 'GET':
         try:
-            incomes = Income.objects.select_related('source', 'received_by').filter(
-                club=request.user.club
-            ).only(
-                'id', 'amount', 'date', 'source__name', 'received_by__username', 'description', 'quantity', 'payment_method__name'
-            )
+            incomes = Income.objects.select_related(*INCOME_LIST_RELATED).filter(club=request.user.club)
             if request.user.role not in ['admin', 'owner']:
                 shift_id = request.query_params.get('shift_id')
                 incomes = apply_common_filters(
@@ -365,21 +364,11 @@ def income_api(request):
                     incomes, request, user_field='received_by', source_category_field='source'
                 )
             incomes = incomes.order_by('-date')
-            null_payment_methods = incomes.filter(payment_method__isnull=True).count()
-            if null_payment_methods > 0:
-                logger.warning(f"Found {null_payment_methods} income records with no payment method for club {request.user.club.name}", extra={'force': True})
+            record_missing_payment_methods(request, incomes, f"club {request.user.club.name}")
             paginator = PageNumberPagination()
             page = paginator.paginate_queryset(incomes, request)
             serializer = IncomeSerializer(page, many=True)
-            translated_data = serializer.data
-            for income in translated_data:
-                if income['source']:
-                    source_name = IncomeSource.objects.get(id=income['source']).name
-                    income['source'] = SOURCE_TRANSLATIONS.get(source_name, source_name)
-                income['payment_method'] = PAYMENT_METHOD_TRANSLATIONS.get(
-                    Income.objects.get(id=income['id']).payment_method.name if Income.objects.get(id=income['id']).payment_method else None,
-                    'غير محدد'
-                )
+            translated_data = apply_income_labels(serializer.data, request.user.club.id)
             return paginator.get_paginated_response(translated_data)
         except ValueError as e:
             logger.error(f"Error in income_api GET: {str(e)}", extra={'force': True})
@@ -421,19 +410,44 @@ def income_api(request):
         data['payment_method'] = payment_method_id
         serializer = IncomeSerializer(data=data)
         if serializer.is_valid():
-            with transaction.atomic():
-                income = serializer.save()
-                if source.stock_item:
-                    StockTransaction.objects.create(
-                        stock_item=source.stock_item, transaction_type='CONSUME', quantity=quantity,
-                        description=f'بيع عبر الإيراد #{income.id} - {data["description"]}', related_income=income,
-                        created_by=request.user
-                    )
+            try:
+                with transaction.atomic():
+                    income = serializer.save()
+                    if source.stock_item:
+                        StockTransaction.objects.create(
+                            stock_item=source.stock_item, transaction_type='CONSUME', quantity=quantity,
+                            description=f'بيع عبر الإيراد #{income.id} - {data["description"]}', related_income=income,
+                            created_by=request.user
+                        )
+            except InsufficientStock:
+                # بيع آخر سحب الكمية بعد التحقق الأول؛ يلغى الإيراد مع الحركة
+                return Response({'error': 'الكمية المطلوبة غير متوفرة في المخزون'}, status=status.HTTP_400_BAD_REQUEST)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def pos_checkout_api(request):
+    """Sell a cart ({payment_method, description, items: [{source, quantity}]}) and return one receipt."""
+    if not request.user.club:
+        logger.error(f"User {request.user.username} has no associated club")
+        return Response({'error': 'غير مسموح: المستخدم ليس مرتبط بنادي.'}, status=status.HTTP_403_FORBIDDEN)
+    if not request.data.get('payment_method'):
+        return Response({'error': 'طريقة الدفع مطلوبة'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        lines = parse_cart(request.data.get('items'))
+        receipt = checkout(
+            request.user.club, request.user, request.data.get('payment_method'), lines,
+            description=request.data.get('description') or ''
+        )
+    except ValueError as e:
+        # يشمل InsufficientStock
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(receipt, status=status.HTTP_201_CREATED)
+
+
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([IsAuthenticated])
 def expense_detail_api(request, pk):
@@ -451,11 +465,19 @@ def expense_detail_api(request, pk):
     elif request.method == 'PUT':
         serializer = ExpenseSerializer(expense, data=request.data, partial=True, context={'request': request})
         if serializer.is_valid():
-            serializer.save()
+            try:
+                with transaction.atomic():
+                    serializer.save()
+            except ClosedPeriodError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     elif request.method == 'DELETE':
-        expense.delete()
+        try:
+            with transaction.atomic():
+                expense.delete()
+        except ClosedPeriodError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -473,18 +495,24 @@ def income_detail_api(request, pk):
     if request.method == 'GET':
         serializer = IncomeSerializer(income)
         translated_data = serializer.data
-        if translated_data['source']:
-            source_name = IncomeSource.objects.get(id=translated_data['source']).name
-            translated_data['source'] = SOURCE_TRANSLATIONS.get(source_name, source_name)
+        apply_income_labels([translated_data], request.user.club.id)
         return Response(translated_data)
     elif request.method == 'PUT':
         serializer = IncomeSerializer(income, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            try:
+                with transaction.atomic():
+                    serializer.save()
+            except ClosedPeriodError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     elif request.method == 'DELETE':
-        income.delete()
+        try:
+            with transaction.atomic():
+                income.delete()
+        except ClosedPeriodError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -498,7 +526,7 @@ def income_summary(request):
         return Response({'error': 'غير مسموح: المستخدم ليس مرتبط بنادي.'}, status=status.HTTP_403_FORBIDDEN)
   
     try:
-        incomes = Income.objects.select_related('source', 'received_by').filter(club=request.user.club).only(
+        incomes = Income.objects.select_related('source', 'received_by', 'payment_method').filter(club=request.user.club).only(
             'id', 'amount', 'date', 'source__name', 'received_by__username', 'description', 'quantity', 'payment_method__name'
         )
       
@@ -506,15 +534,26 @@ def income_summary(request):
         if not any(request.query_params.get(param) for param in ['date', 'start_date', 'end_date', 'source', 'user', 'amount', 'description', 'shift_id']):
             return Response({'error': 'يجب تحديد معايير البحث (تاريخ، مدة زمنية، مصدر، مستخدم، مبلغ، وصف، أو shift_id).'}, status=status.HTTP_400_BAD_REQUEST)
       
+        details = request.query_params.get('details', 'false').lower() == 'true'
+        rollup = None
+        if request.user.role in FULL_ACCESS_ROLES and not details:
+            rollup = rollup_for_request(request, 'income')
+        if rollup is not None:
+            totals = rollup_totals(rollup)
+            response_data = {
+                'total_income': float(totals['total']),
+                'total_quantity': int(totals['quantity']),
+                'total_income_count': totals['count']
+            }
+            return Response(response_data, status=status.HTTP_200_OK)
+
         # Apply common filters
         incomes = apply_common_filters(incomes, request, user_field='received_by', source_category_field='source', restrict_to_attendance=request.user.role not in FULL_ACCESS_ROLES, shift_id=request.query_params.get('shift_id'))
       
         # Order by date ascending
         incomes = incomes.order_by('date')
         # Check for incomes with no payment method
-        null_payment_methods = incomes.filter(payment_method__isnull=True).count()
-        if null_payment_methods > 0:
-            logger.warning(f"Found {null_payment_methods} income records with no payment method for club {request.user.club.name}", extra={'force': True})
+        record_missing_payment_methods(request, incomes, f"club {request.user.club.name}")
         # Calculate totals
         total_income = calculate_totals(incomes, field='amount')
         total_quantity = incomes.aggregate(total_quantity=Sum('quantity'))['total_quantity'] or 0
@@ -527,15 +566,9 @@ def income_summary(request):
         }
         translated_details = None
         if request.query_params.get('details', 'false').lower() == 'true':
-            translated_details = IncomeSummarySerializer(incomes, many=True).data
-            for income in translated_details:
-                if income['source']:
-                    source_name = IncomeSource.objects.get(id=income['source']).name
-                    income['source'] = SOURCE_TRANSLATIONS.get(source_name, source_name)
-                income['payment_method'] = PAYMENT_METHOD_TRANSLATIONS.get(
-                    Income.objects.get(id=income['id']).payment_method.name if Income.objects.get(id=income['id']).payment_method else None,
-                    'غير محدد'
-                )
+            translated_details = apply_income_labels(
+                IncomeSummarySerializer(incomes, many=True).data, request.user.club.id
+            )
       
         return handle_response(
             response_data,
@@ -570,6 +603,11 @@ def expense_summary(request):
         if not any(request.query_params.get(param) for param in ['date', 'start_date', 'end_date', 'category', 'user', 'related_employee', 'amount', 'description', 'shift_id']):
             return Response({'error': 'يجب تحديد معايير البحث (تاريخ، مدة زمنية، فئة، مستخدم، موظف مرتبط، مبلغ، وصف، أو shift_id).'}, status=status.HTTP_400_BAD_REQUEST)
        
+        if request.user.role in FULL_ACCESS_ROLES and request.query_params.get('details', 'false').lower() != 'true':
+            rollup = rollup_for_request(request, 'expense')
+            if rollup is not None:
+                return Response({'total_expense': float(rollup_totals(rollup)['total'])}, status=status.HTTP_200_OK)
+
         # Apply common filters
         expenses = apply_common_filters(expenses, request, user_field='paid_by', source_category_field='category', restrict_to_attendance=request.user.role not in FULL_ACCESS_ROLES, shift_id=request.query_params.get('shift_id'))
        
@@ -616,17 +654,20 @@ def finance_overview(request):
         if not any(request.query_params.get(param) for param in ['date', 'start_date', 'end_date', 'source', 'category', 'user', 'amount', 'description']):
             return Response({'error': 'يجب تحديد معايير البحث (تاريخ، مدة زمنية، مصدر، فئة، مستخدم، مبلغ، أو وصف).'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Apply common filters
-        income_qs = apply_common_filters(income_qs, request, user_field='received_by', source_category_field='source')
-        expense_qs = apply_common_filters(expense_qs, request, user_field='paid_by', source_category_field='category')
-        
-        # Order by date ascending
-        income_qs = income_qs.order_by('date')
-        expense_qs = expense_qs.order_by('date')
-        
-        # Calculate totals
-        total_income = calculate_totals(income_qs)
-        total_expense = calculate_totals(expense_qs)
+        income_rows = period_rows(request, 'income')
+        expense_rows = period_rows(request, 'expense')
+        if income_rows is not None and expense_rows is not None:
+            # الأشهر المغلقة من اللقطات الشهرية والباقي من الإجماليات اليومية
+            total_income = float(income_rows.totals()['total'])
+            total_expense = float(expense_rows.totals()['total'])
+        else:
+            # Apply common filters
+            income_qs = apply_common_filters(income_qs, request, user_field='received_by', source_category_field='source')
+            expense_qs = apply_common_filters(expense_qs, request, user_field='paid_by', source_category_field='category')
+
+            # Calculate totals
+            total_income = calculate_totals(income_qs)
+            total_expense = calculate_totals(expense_qs)
         net = total_income - total_expense
         
         response_data = {
@@ -676,9 +717,7 @@ def income_all_api(request):
         return Response({'error': 'غير مسموح: المستخدم ليس مرتبط بنادي.'}, status=status.HTTP_403_FORBIDDEN)
     
     try:
-        incomes = Income.objects.select_related('source', 'received_by').filter(club=request.user.club).only(
-            'id', 'amount', 'date', 'source__name', 'received_by__username', 'description'
-        )
+        incomes = Income.objects.select_related(*INCOME_LIST_RELATED).filter(club=request.user.club)
         
         # Require at least one filter to proceed
         if not any(request.query_params.get(param) for param in ['date', 'start_date', 'end_date', 'source', 'user', 'amount', 'description']):
@@ -690,18 +729,94 @@ def income_all_api(request):
         incomes = incomes.order_by('date')  # Order by date ascending
         serializer = IncomeSerializer(incomes, many=True)
         
-        # Translate source names to Arabic
-        translated_data = serializer.data
-        for income in translated_data:
-            if income['source']:
-                source_name = IncomeSource.objects.get(id=income['source']).name
-                income['source'] = SOURCE_TRANSLATIONS.get(source_name, source_name)
+        # Translate source and payment method names to Arabic
+        translated_data = apply_income_labels(serializer.data, request.user.club.id)
         
         return Response(translated_data, status=status.HTTP_200_OK)
     
     except ValueError as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def expense_export_api(request):
+    """Stream filtered expenses as CSV or NDJSON."""
+    if not request.user.club:
+        logger.error(f"User {request.user.username} has no associated club")
+        return Response({'error': 'غير مسموح: المستخدم ليس مرتبط بنادي.'}, status=status.HTTP_403_FORBIDDEN)
+
+    export_format = request.query_params.get('export_format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return Response({'error': 'صيغة التصدير غير مدعومة (csv أو ndjson).'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        if not any(request.query_params.get(param) for param in ['date', 'start_date', 'end_date', 'category', 'user', 'amount', 'description']):
+            return Response({'error': 'يجب تحديد معايير البحث (تاريخ، مدة زمنية، فئة، مستخدم، مبلغ، أو وصف).'}, status=status.HTTP_400_BAD_REQUEST)
+
+        expenses = Expense.objects.filter(club=request.user.club)
+        expenses = apply_common_filters(expenses, request, user_field='paid_by', source_category_field='category')
+        expenses = expenses.order_by('date', 'id')
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    columns = [
+        ('id', 'id'),
+        ('date', 'التاريخ'),
+        ('amount', 'المبلغ'),
+        ('category__name', 'الفئة'),
+        ('paid_by__username', 'دفع بواسطة'),
+        ('related_employee__username', 'الموظف المرتبط'),
+        ('description', 'الوصف'),
+        ('invoice_number', 'رقم الفاتورة'),
+        ('stock_item__name', 'عنصر المخزون'),
+        ('stock_quantity', 'الكمية'),
+    ]
+    rows = iter_values(expenses, [key for key, _ in columns])
+    return streaming_export(rows, columns, f"expenses_{timezone.localdate().isoformat()}", export_format)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def income_export_api(request):
+    """Stream filtered incomes as CSV or NDJSON."""
+    if not request.user.club:
+        logger.error(f"User {request.user.username} has no associated club")
+        return Response({'error': 'غير مسموح: المستخدم ليس مرتبط بنادي.'}, status=status.HTTP_403_FORBIDDEN)
+
+    export_format = request.query_params.get('export_format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return Response({'error': 'صيغة التصدير غير مدعومة (csv أو ndjson).'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        if not any(request.query_params.get(param) for param in ['date', 'start_date', 'end_date', 'source', 'user', 'amount', 'description']):
+            return Response({'error': 'يجب تحديد معايير البحث (تاريخ، مدة زمنية، مصدر، مستخدم، مبلغ، أو وصف).'}, status=status.HTTP_400_BAD_REQUEST)
+
+        incomes = Income.objects.filter(club=request.user.club)
+        incomes = apply_common_filters(incomes, request, user_field='received_by', source_category_field='source')
+        incomes = incomes.order_by('date', 'id')
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    columns = [
+        ('id', 'id'),
+        ('date', 'التاريخ'),
+        ('amount', 'المبلغ'),
+        ('source__name', 'المصدر'),
+        ('payment_method__name', 'طريقة الدفع'),
+        ('received_by__username', 'استلم بواسطة'),
+        ('description', 'الوصف'),
+        ('quantity', 'الكمية'),
+    ]
+
+    def translated(rows):
+        for row in rows:
+            row['source__name'] = translate_source(row['source__name'])
+            row['payment_method__name'] = translate_payment_method(row['payment_method__name'])
+            yield row
+
+    rows = translated(iter_values(incomes, [key for key, _ in columns]))
+    return streaming_export(rows, columns, f"incomes_{timezone.localdate().isoformat()}", export_format)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def daily_summary_api(request):
@@ -719,6 +834,7 @@ def daily_summary_api(request):
             return Response({'error': 'يجب تحديد معايير البحث (تاريخ، شهر، أو اسم مستخدم).'}, status=status.HTTP_400_BAD_REQUEST)
         
         date_filter = {}
+        rollup_filter = {}
         if date_str:
             try:
                 # Try parsing as full datetime
@@ -729,12 +845,14 @@ def daily_summary_api(request):
                     # Fallback to date only, filter for the whole day
                     filter_date = datetime.strptime(date_str, '%Y-%m-%d').date()
                     date_filter = {'date__date': filter_date}
+                rollup_filter = {'day': date_filter['date__date']}
             except ValueError:
                 return Response({'error': 'صيغة التاريخ غير صحيحة (YYYY-MM-DD أو YYYY-MM-DD HH:MM:SS)'}, status=status.HTTP_400_BAD_REQUEST)
         elif month_str:
             try:
                 year, month = map(int, month_str.split('-'))
                 date_filter = {'date__year': year, 'date__month': month}
+                rollup_filter = {'day__year': year, 'day__month': month}
             except ValueError:
                 return Response({'error': 'صيغة الشهر غير صحيحة (YYYY-MM)'}, status=status.HTTP_400_BAD_REQUEST)
         
@@ -745,37 +863,64 @@ def daily_summary_api(request):
                 return Response({'error': 'الموظف غير موجود في ناديك.'}, status=status.HTTP_404_NOT_FOUND)
         else:
             employees = User.objects.filter(**club_filter)
-        
+
+        # الترقيم على الموظفين أولا ثم كل البيانات لموظفي الصفحة في استعلامات ثابتة العدد
+        paginator = StandardPagination()
+        page_employees = paginator.paginate_queryset(employees.order_by('id'), request)
+        employee_ids = [employee.id for employee in page_employees]
+
+        # الإجماليات مجمعة حسب (الموظف، المصدر/الفئة) من جدول التجميع اليومي في استعلام واحد
+        labels = club_labels(request.user.club.id)
+        employee_totals = {}
+        breakdowns = {}
+        grouped = FinanceDailyRollup.objects.filter(
+            **club_filter, employee_id__in=employee_ids, **rollup_filter
+        ).values('kind', 'employee_id', 'source_id', 'category__name').annotate(total=Sum('total')).order_by()
+        for row in grouped:
+            key = (row['kind'], row['employee_id'])
+            total = float(row['total'] or 0)
+            employee_totals[key] = employee_totals.get(key, 0.0) + total
+            if row['kind'] == 'income':
+                name = labels['source'].get(row['source_id'], UNSPECIFIED)
+            else:
+                name = row['category__name'] or UNSPECIFIED
+            group = breakdowns.setdefault(key, {})
+            group[name] = group.get(name, 0.0) + total
+
+        # التفاصيل في استعلام واحد لكل نوع ثم تجميعها حسب الموظف
+        expense_rows = list(
+            Expense.objects.select_related('category', 'related_employee')
+            .filter(**club_filter, paid_by_id__in=employee_ids, **date_filter).order_by('date')
+        )
+        income_rows = list(
+            Income.objects.select_related('source')
+            .filter(**club_filter, received_by_id__in=employee_ids, **date_filter).order_by('date')
+        )
+        expense_details = {}
+        for expense, data in zip(expense_rows, ExpenseDetailSerializer(expense_rows, many=True).data):
+            expense_details.setdefault(expense.paid_by_id, []).append(data)
+        income_data = apply_income_labels(IncomeDetailSerializer(income_rows, many=True).data, request.user.club.id)
+        income_details = {}
+        for income, data in zip(income_rows, income_data):
+            income_details.setdefault(income.received_by_id, []).append(data)
+
         summary = []
-        for employee in employees:
-            expenses = Expense.objects.filter(**club_filter, paid_by=employee, **date_filter)
-            incomes = Income.objects.filter(**club_filter, received_by=employee, **date_filter)
-            
-            total_expenses = calculate_totals(expenses)
-            total_incomes = calculate_totals(incomes)
-            expense_details = ExpenseDetailSerializer(expenses.order_by('date'), many=True).data
-            income_details = IncomeDetailSerializer(incomes.order_by('date'), many=True).data
-            
-            # Translate source names in income details
-            for income in income_details:
-                if income['source']:
-                    source_name = IncomeSource.objects.get(id=income['source']).name
-                    income['source'] = SOURCE_TRANSLATIONS.get(source_name, source_name)
-            
-            employee_summary = {
+        for employee in page_employees:
+            total_expenses = employee_totals.get(('expense', employee.id), 0.0)
+            total_incomes = employee_totals.get(('income', employee.id), 0.0)
+            summary.append({
                 'employee_id': employee.id,
                 'employee_name': employee.username,
                 'total_expenses': total_expenses,
                 'total_incomes': total_incomes,
                 'net': total_incomes - total_expenses,
-                'expenses': expense_details,
-                'incomes': income_details
-            }
-            summary.append(employee_summary)
-        
-        paginator = StandardPagination()
-        page = paginator.paginate_queryset(summary, request)
-        return paginator.get_paginated_response(page)
+                'incomes_by_source': breakdowns.get(('income', employee.id), {}),
+                'expenses_by_category': breakdowns.get(('expense', employee.id), {}),
+                'expenses': expense_details.get(employee.id, []),
+                'incomes': income_details.get(employee.id, [])
+            })
+
+        return paginator.get_paginated_response(summary)
     
     except ValueError as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -859,28 +1004,38 @@ def employee_daily_report_api(request):
                     end_date = custom_end
 
         # Query incomes
-        incomes = Income.objects.select_related('source', 'received_by', 'payment_method').filter(
+        incomes = Income.objects.select_related(*INCOME_LIST_RELATED).filter(
             club=request.user.club, received_by=employee, date__range=[start_date, end_date]
-        ).only('id', 'amount', 'date', 'source__name', 'received_by__username', 'description', 'quantity', 'payment_method__name')
+        )
         
         # Check for incomes with no payment method
-        null_payment_methods = incomes.filter(payment_method__isnull=True).count()
-        if null_payment_methods > 0:
-            logger.warning(f"Found {null_payment_methods} income records with no payment method for employee {employee.username}")
+        record_missing_payment_methods(request, incomes, f"employee {employee.username}")
         
         # Query expenses
         expenses = Expense.objects.select_related('category', 'paid_by').filter(
             club=request.user.club, paid_by=employee, date__range=[start_date, end_date]
         ).only('id', 'amount', 'date', 'category__name', 'paid_by__username', 'description')
         
-        # Group incomes by payment method
-        income_by_payment_method = incomes.values('payment_method__name').annotate(
-            total_income=Sum('amount')
-        ).order_by('payment_method__name')
-        
-        # Calculate total incomes and expenses
-        total_income = incomes.aggregate(total=Sum('amount'))['total'] or Decimal('0.0')
-        total_expense = expenses.aggregate(total=Sum('amount'))['total'] or Decimal('0.0')
+        days = whole_day_range(start_date, end_date)
+        if days:
+            # الفترة أيام كاملة: الإجماليات من جدول التجميع اليومي
+            rollup = FinanceDailyRollup.objects.filter(
+                club=request.user.club, employee=employee, day__gte=days[0], day__lte=days[1]
+            )
+            income_by_payment_method = rollup.filter(kind='income').values('payment_method__name').annotate(
+                total_income=Sum('total')
+            ).order_by('payment_method__name')
+            total_income = rollup_totals(rollup.filter(kind='income'))['total'] or Decimal('0.0')
+            total_expense = rollup_totals(rollup.filter(kind='expense'))['total'] or Decimal('0.0')
+        else:
+            # Group incomes by payment method
+            income_by_payment_method = incomes.values('payment_method__name').annotate(
+                total_income=Sum('amount')
+            ).order_by('payment_method__name')
+
+            # Calculate total incomes and expenses
+            total_income = incomes.aggregate(total=Sum('amount'))['total'] or Decimal('0.0')
+            total_expense = expenses.aggregate(total=Sum('amount'))['total'] or Decimal('0.0')
         net_profit = total_income - total_expense
         
         # Prepare data for each payment method
@@ -893,23 +1048,16 @@ def employee_daily_report_api(request):
             method_net_profit = method_income - method_expense
             logger.debug(f"Payment method {method_name}: income={method_income}, expense={method_expense}, net_profit={method_net_profit}")
             payment_methods_data.append({
-                'payment_method': PAYMENT_METHOD_TRANSLATIONS.get(method_name, method_name),
+                'payment_method': translate_payment_method(item['payment_method__name']),
                 'total_income': float(method_income),
                 'total_expense': float(method_expense),
                 'net_profit': float(method_net_profit)
             })
         
         # Prepare detailed data
-        income_details = IncomeSerializer(incomes.order_by('date'), many=True).data
-        for income in income_details:
-            if income['source']:
-                source_name = Income.objects.get(id=income['id']).source.name
-                income['source'] = SOURCE_TRANSLATIONS.get(source_name, source_name)
-            income_obj = Income.objects.get(id=income['id'])
-            income['payment_method'] = PAYMENT_METHOD_TRANSLATIONS.get(
-                income_obj.payment_method.name if income_obj.payment_method else None,
-                'غير محدد'
-            )
+        income_details = apply_income_labels(
+            IncomeSerializer(incomes.order_by('date'), many=True).data, request.user.club.id
+        )
         expense_details = ExpenseSerializer(expenses.order_by('date'), many=True, context={'request': request}).data
         
         # Prepare response
@@ -943,82 +1091,16 @@ def employee_daily_report_api(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def generate_daily_report_pdf(request):
-    """Generate a daily report PDF with required filters."""
+    """Generate a daily report PDF with required filters (served from the report cache when unchanged)."""
     if not request.user.club:
         logger.error(f"User {request.user.username} has no associated club")
         return Response({'error': 'غير مسموح: المستخدم ليس مرتبط بنادي.'}, status=status.HTTP_403_FORBIDDEN)
     
     try:
-        employee_id = request.query_params.get('employee_id')
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date')
-        
-        # Require at least start_date and end_date
-        if not (start_date and end_date):
-            return Response({'error': 'يجب تحديد تاريخ البداية وتاريخ النهاية.'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        try:
-            start_date_obj = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-            end_date_obj = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-        except ValueError:
-            return Response({'error': 'صيغة التاريخ غير صحيحة (ISO format)'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        expenses = Expense.objects.filter(club=request.user.club, date__gte=start_date_obj, date__lte=end_date_obj)
-        incomes = Income.objects.filter(club=request.user.club, date__gte=start_date_obj, date__lte=end_date_obj)
-        
-        if employee_id:
-            employee = get_object_or_404(User, id=employee_id, club=request.user.club)
-            expenses = expenses.filter(paid_by=employee)
-            incomes = incomes.filter(received_by=employee)
-        
-        total_expenses = calculate_totals(expenses)
-        total_incomes = calculate_totals(incomes)
-        net_profit = total_incomes - total_expenses
-        expenses_count = expenses.count()
-        incomes_count = incomes.count()
-        
-        report_data = {
-            'employee_name': employee.username if employee_id else 'جميع الموظفين',
-            'start_date': start_date_obj.strftime('%Y-%m-%d %H:%M:%S'),
-            'end_date': end_date_obj.strftime('%Y-%m-%d %H:%M:%S'),
-            'shift_date': 'غير محدد',
-            'print_date': timezone.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'expenses': [
-                {'date': expense.date.strftime('%Y-%m-%d %H:%M:%S'), 'category': expense.category.name, 'amount': f"{expense.amount:.2f}"}
-                for expense in expenses.order_by('date')
-            ],
-            'incomes': [
-                {'date': income.date.strftime('%Y-%m-%d %H:%M:%S'), 'source': SOURCE_TRANSLATIONS.get(income.source.name, income.source.name), 'amount': f"{income.amount:.2f}"}
-                for income in incomes.order_by('date')
-            ],
-            'expenses_count': expenses_count,
-            'incomes_count': incomes_count,
-            'total_expenses': f"{total_expenses:.2f}",
-            'total_incomes': f"{total_incomes:.2f}",
-            'net_profit': f"{net_profit:.2f}"
-        }
-        
-        latex_template_path = os.path.join(os.path.dirname(__file__), 'templates', 'daily_report.tex')
-        with open(latex_template_path, 'r', encoding='utf-8') as file:
-            template = Template(file.read())
-        latex_content = template.render(**report_data)
-        with tempfile.TemporaryDirectory() as tmpdirname:
-            latex_file_path = os.path.join(tmpdirname, 'report.tex')
-            with open(latex_file_path, 'w', encoding='utf-8') as f:
-                f.write(latex_content)
-            result = subprocess.run(
-                ['pdflatex', '-output-directory', tmpdirname, latex_file_path], capture_output=True, text=True
-            )
-            if result.returncode != 0:
-                return Response({'error': 'فشل إنشاء PDF: ' + result.stderr}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            pdf_file_path = os.path.join(tmpdirname, 'report.pdf')
-            with open(pdf_file_path, 'rb') as pdf_file:
-                response = FileResponse(pdf_file, content_type='application/pdf')
-                response['Content-Disposition'] = f'attachment; filename="daily_report_{employee_id or "all"}_{start_date_obj.strftime("%Y%m%d")}.pdf"'
-                return response
-    
+        job = render_report_now(request.user.club, request.user, 'daily_report', request.query_params)
     except ValueError as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return _report_file_response(job)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -1036,6 +1118,7 @@ def financial_analysis_api(request):
         category_param = request.query_params.get('category')
         source_param = request.query_params.get('source')
         details = request.query_params.get('details', 'false').lower() == 'true'
+        trends = request.query_params.get('trends', 'false').lower() == 'true'
         valid_periods = ['daily', 'weekly', 'monthly', 'yearly']
         if period_type not in valid_periods:
             return Response({'error': f'نوع الفترة غير صالح. استخدم: {", ".join(valid_periods)}'}, status=status.HTTP_400_BAD_REQUEST)
@@ -1050,8 +1133,6 @@ def financial_analysis_api(request):
                 end_date = datetime.strptime(end, '%Y-%m-%d').date()
                 if start_date > end_date:
                     raise ValueError('تاريخ البداية يجب أن يكون قبل تاريخ النهاية.')
-                income_qs = income_qs.filter(date__range=[start_date, end_date])
-                expense_qs = expense_qs.filter(date__range=[start_date, end_date])
             except ValueError:
                 raise ValueError('صيغة التاريخ غير صحيحة (YYYY-MM-DD)')
         else:
@@ -1064,21 +1145,39 @@ def financial_analysis_api(request):
                 start_date = end_date - relativedelta(months=12)
             else:
                 start_date = end_date - relativedelta(years=5)
-            income_qs = income_qs.filter(date__range=[start_date, end_date])
-            expense_qs = expense_qs.filter(date__range=[start_date, end_date])
-        
-        income_qs = apply_common_filters(income_qs, request, user_field='received_by', source_category_field='source')
-        expense_qs = apply_common_filters(expense_qs, request, user_field='paid_by', source_category_field='category')
+        # المدة من بداية يوم البداية حتى بداية يوم النهاية (كما كانت فلترة التواريخ دائما)
+        date_range = [day_start(start_date), day_start(end_date)]
+        income_qs = income_qs.filter(date__range=date_range)
+        expense_qs = expense_qs.filter(date__range=date_range)
         
         trunc_func = {
             'daily': TruncDay, 'weekly': TruncWeek, 'monthly': TruncMonth, 'yearly': TruncYear
         }[period_type]
-        income_by_period = income_qs.annotate(period=trunc_func('date')).values('period').annotate(
-            total_income=Sum('amount')
-        ).order_by('period')
-        expense_by_period = expense_qs.annotate(period=trunc_func('date')).values('period').annotate(
-            total_expense=Sum('amount')
-        ).order_by('period')
+
+        # الأشهر المغلقة بالكامل داخل المدة تقرأ من اللقطات الشهرية (لا تصلح للتقسيم اليومي/الأسبوعي)
+        closed = period_type in ('monthly', 'yearly')
+        days = range_days(request.user.club.id, *date_range)
+        income_rows = period_rows(request, 'income', *days, closed=closed) if days else None
+        expense_rows = period_rows(request, 'expense', *days, closed=closed) if days else None
+        use_rollup = income_rows is not None and expense_rows is not None
+        if use_rollup:
+            # التجميع من جدول الإجماليات اليومية بدلا من صفوف الإيرادات والمصروفات
+            income_by_period = [
+                {'period': day_start(period), 'total_income': total} for period, total in income_rows.by_period(trunc_func)
+            ]
+            expense_by_period = [
+                {'period': day_start(period), 'total_expense': total} for period, total in expense_rows.by_period(trunc_func)
+            ]
+        else:
+            income_qs = apply_common_filters(income_qs, request, user_field='received_by', source_category_field='source')
+            expense_qs = apply_common_filters(expense_qs, request, user_field='paid_by', source_category_field='category')
+
+            income_by_period = income_qs.annotate(period=trunc_func('date')).values('period').annotate(
+                total_income=Sum('amount')
+            ).order_by('period')
+            expense_by_period = expense_qs.annotate(period=trunc_func('date')).values('period').annotate(
+                total_expense=Sum('amount')
+            ).order_by('period')
         periods = {}
         for item in income_by_period:
             period_str = item['period']
@@ -1091,8 +1190,12 @@ def financial_analysis_api(request):
             else:
                 periods[period_str] = {'total_income': 0, 'total_expense': float(item['total_expense']), 'net_profit': -float(item['total_expense'])}
         
-        total_income = calculate_totals(income_qs)
-        total_expense = calculate_totals(expense_qs)
+        if use_rollup:
+            total_income = float(income_rows.totals()['total'])
+            total_expense = float(expense_rows.totals()['total'])
+        else:
+            total_income = calculate_totals(income_qs)
+            total_expense = calculate_totals(expense_qs)
         net_profit = total_income - total_expense
         
         financial_position = {
@@ -1105,8 +1208,18 @@ def financial_analysis_api(request):
         
         prev_start_date = start_date - (end_date - start_date)
         prev_end_date = start_date - timedelta(days=1)
-        prev_income = calculate_totals(Income.objects.filter(club=request.user.club, date__range=[prev_start_date, prev_end_date]))
-        prev_expense = calculate_totals(Expense.objects.filter(club=request.user.club, date__range=[prev_start_date, prev_end_date]))
+        prev_range = [day_start(prev_start_date), day_start(prev_end_date)]
+        prev_days = range_days(request.user.club.id, *prev_range) if use_rollup else None
+        if prev_days:
+            previous = FinanceDailyRollup.objects.filter(
+                club=request.user.club, day__gte=prev_days[0], day__lte=prev_days[1]
+            ).values('kind').annotate(total=Sum('total')).order_by()
+            previous = {row['kind']: float(row['total'] or 0) for row in previous}
+            prev_income = previous.get('income', 0.0)
+            prev_expense = previous.get('expense', 0.0)
+        else:
+            prev_income = calculate_totals(Income.objects.filter(club=request.user.club, date__range=prev_range))
+            prev_expense = calculate_totals(Expense.objects.filter(club=request.user.club, date__range=prev_range))
         prev_net = prev_income - prev_expense
         
         results = {
@@ -1124,21 +1237,31 @@ def financial_analysis_api(request):
             'next_period_net': float(avg_income - avg_expense)
         }
 
-        expense_by_category = expense_qs.values('category__name').annotate(total_amount=Sum('amount')).order_by('-total_amount')
+        if use_rollup:
+            expense_by_category = [
+                {'category__name': name, 'total_amount': total} for name, total in expense_rows.by_field('category__name')
+            ]
+        else:
+            expense_by_category = expense_qs.values('category__name').annotate(total_amount=Sum('amount')).order_by('-total_amount')
         expense_category_analysis = [
             {
                 'category': item['category__name'],
                 'total_amount': float(item['total_amount']),
-                'percentage': float(Decimal(item['total_amount']) / total_expense * 100) if total_expense > 0 else 0
+                'percentage': float(item['total_amount']) / total_expense * 100 if total_expense > 0 else 0
             } for item in expense_by_category
         ]
         
-        income_by_source = income_qs.values('source__name').annotate(total_amount=Sum('amount')).order_by('-total_amount')
+        if use_rollup:
+            income_by_source = [
+                {'source__name': name, 'total_amount': total} for name, total in income_rows.by_field('source__name')
+            ]
+        else:
+            income_by_source = income_qs.values('source__name').annotate(total_amount=Sum('amount')).order_by('-total_amount')
         income_source_analysis = [
             {
                 'source': item['source__name'],
                 'total_amount': float(item['total_amount']),
-                'percentage': float(Decimal(item['total_amount']) / total_income * 100) if total_income > 0 else 0
+                'percentage': float(item['total_amount']) / total_income * 100 if total_income > 0 else 0
             } for item in income_by_source
         ]
         
@@ -1183,7 +1306,12 @@ def financial_analysis_api(request):
             'alerts': alerts,
             'recommendations': recommendations
         }
+        if trends:
+            # متوسطات متحركة، مقارنة سنوية، حصص المصادر/الفئات وتوقع الشهرين القادمين (numpy)
+            response_data['trends'] = financial_trends(request, end_date)
         
+        if details and use_rollup:
+            income_qs = apply_common_filters(income_qs, request, user_field='received_by', source_category_field='source')
         return handle_response(
             response_data,
             details_queryset=income_qs if details else None,
@@ -1243,30 +1371,9 @@ def stock_inventory_api(request):
         return Response(report_data, status=status.HTTP_200_OK)
     
     elif request.method == 'POST':
-        inventory_data = request.data.get('inventory', [])
         try:
-            discrepancies = []
-            with transaction.atomic():
-                for item in inventory_data:
-                    stock_item_id = item.get('stock_item_id')
-                    actual_quantity = item.get('actual_quantity')
-                    if not stock_item_id or actual_quantity is None:
-                        return Response({'error': 'معرف عنصر المخزون والكمية الفعلية مطلوبان'}, status=status.HTTP_400_BAD_REQUEST)
-                    stock_item = StockItem.objects.get(id=stock_item_id, club=request.user.club)
-                    expected_quantity = stock_item.current_quantity
-                    if actual_quantity != expected_quantity:
-                        difference = actual_quantity - expected_quantity
-                        transaction_type = 'ADD' if difference > 0 else 'CONSUME'
-                        quantity = abs(difference)
-                        StockTransaction.objects.create(
-                            stock_item=stock_item, transaction_type=transaction_type, quantity=quantity,
-                            description=f'تعديل الجرد اليومي: {"زيادة" if difference > 0 else "نقص"} بمقدار {quantity}',
-                            created_by=request.user
-                        )
-                        discrepancies.append({
-                            'stock_item': stock_item.name, 'expected_quantity': expected_quantity,
-                            'actual_quantity': actual_quantity, 'difference': difference
-                        })
+            counts = parse_inventory_counts(request.data.get('inventory', []))
+            discrepancies = reconcile_inventory(request.user.club, counts, request.user)
             return Response({'message': 'تم تسجيل الجرد بنجاح', 'discrepancies': discrepancies}, status=status.HTTP_200_OK)
         except StockItem.DoesNotExist:
             return Response({'error': 'عنصر المخزون غير موجود'}, status=status.HTTP_404_NOT_FOUND)
@@ -1279,7 +1386,7 @@ def stock_inventory_api(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def stock_profit_api(request):
-    """Calculate stock profit."""
+    """Stock profit per item, with FIFO and weighted average cost of goods sold."""
     if not request.user.club:
         logger.error(f"User {request.user.username} has no associated club")
         return Response({'error': 'غير مسموح: المستخدم ليس مرتبط بنادي.'}, status=status.HTTP_403_FORBIDDEN)
@@ -1288,9 +1395,6 @@ def stock_profit_api(request):
         stock_item_id = request.query_params.get('stock_item_id')
         start_date = request.query_params.get('start_date')
         end_date = request.query_params.get('end_date')
-        stock_items = StockItem.objects.filter(club=request.user.club)
-        if stock_item_id:
-            stock_items = stock_items.filter(id=stock_item_id)
         if start_date and end_date:
             try:
                 start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
@@ -1300,25 +1404,9 @@ def stock_profit_api(request):
         else:
             start_date_obj = None
             end_date_obj = None
-        report_data = []
-        for item in stock_items:
-            purchase_transactions = StockTransaction.objects.filter(stock_item=item, transaction_type='ADD')
-            if start_date_obj and end_date_obj:
-                purchase_transactions = purchase_transactions.filter(date__date__range=[start_date_obj, end_date_obj])
-            total_purchase_cost = sum(tx.related_expense.amount if tx.related_expense else 0 for tx in purchase_transactions)
-            total_purchase_quantity = sum(tx.quantity for tx in purchase_transactions)
-            sale_transactions = StockTransaction.objects.filter(stock_item=item, transaction_type='CONSUME', related_income__isnull=False)
-            if start_date_obj and end_date_obj:
-                sale_transactions = sale_transactions.filter(date__date__range=[start_date_obj, end_date_obj])
-            total_sale_revenue = sum(tx.related_income.amount if tx.related_income else 0 for tx in sale_transactions)
-            total_sale_quantity = sum(tx.quantity for tx in sale_transactions)
-            profit = total_sale_revenue - total_purchase_cost
-            profit_per_unit = profit / total_sale_quantity if total_sale_quantity > 0 else 0
-            report_data.append({
-                'stock_item_id': item.id, 'stock_item_name': item.name, 'total_purchase_quantity': total_purchase_quantity,
-                'total_purchase_cost': float(total_purchase_cost), 'total_sale_quantity': total_sale_quantity,
-                'total_sale_revenue': float(total_sale_revenue), 'profit': float(profit), 'profit_per_unit': float(profit_per_unit)
-            })
+        if stock_item_id and not str(stock_item_id).isdigit():
+            return Response({'error': 'معرف عنصر المخزون غير صالح'}, status=status.HTTP_400_BAD_REQUEST)
+        report_data = stock_valuation(request.user.club, start_date_obj, end_date_obj, stock_item_id)
         return Response(report_data, status=status.HTTP_200_OK)
     
     except ValueError as e:
@@ -1327,7 +1415,7 @@ def stock_profit_api(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def stock_sales_analysis_api(request):
-    """Generate stock sales analysis."""
+    """Stock sales analysis per item: periods, hour of day profile, sale gaps."""
     if not request.user.club:
         logger.error(f"User {request.user.username} has no associated club")
         return Response({'error': 'غير مسموح: المستخدم ليس مرتبط بنادي.'}, status=status.HTTP_403_FORBIDDEN)
@@ -1340,9 +1428,8 @@ def stock_sales_analysis_api(request):
         valid_periods = ['daily', 'weekly', 'monthly', 'yearly']
         if period_type not in valid_periods:
             return Response({'error': f'نوع الفترة غير صالح. استخدم: {", ".join(valid_periods)}'}, status=status.HTTP_400_BAD_REQUEST)
-        stock_items = StockItem.objects.filter(club=request.user.club)
-        if stock_item_id:
-            stock_items = stock_items.filter(id=stock_item_id)
+        if stock_item_id and not str(stock_item_id).isdigit():
+            return Response({'error': 'معرف عنصر المخزون غير صالح'}, status=status.HTTP_400_BAD_REQUEST)
         if start_date and end_date:
             try:
                 start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
@@ -1361,57 +1448,7 @@ def stock_sales_analysis_api(request):
                 start_date_obj = end_date_obj - relativedelta(months=12)
             else:
                 start_date_obj = end_date_obj - relativedelta(years=5)
-        analysis_data = []
-        for item in stock_items:
-            transactions = StockTransaction.objects.filter(
-                stock_item=item, transaction_type='CONSUME', related_income__isnull=False,
-                date__date__range=[start_date_obj, end_date_obj]
-            ).prefetch_related('related_income')
-            trunc_func = {'daily': TruncDay, 'weekly': TruncWeek, 'monthly': TruncMonth, 'yearly': TruncYear}[period_type]
-            sales_by_period = transactions.annotate(period=trunc_func('date')).values('period').annotate(
-                total_quantity=Sum('quantity'), total_revenue=Sum('related_income__amount')
-            ).order_by('period')
-            sales_by_hour = transactions.annotate(hour=TruncHour('date')).values('hour').annotate(
-                total_quantity=Sum('quantity'), total_revenue=Sum('related_income__amount')
-            ).order_by('hour')
-            total_quantity_sold = transactions.aggregate(total=Sum('quantity'))['total'] or 0
-            total_revenue = transactions.aggregate(total=Sum('related_income__amount'))['total'] or 0
-            days_in_period = (end_date_obj - start_date_obj).days + 1
-            avg_daily_sales = total_quantity_sold / days_in_period if days_in_period > 0 else 0
-            sales_status = 'غير معروف'
-            if avg_daily_sales == 0:
-                sales_status = 'لا مبيعات'
-            elif avg_daily_sales < 1:
-                sales_status = 'ضعيف (مبيعات نادرة)'
-            elif avg_daily_sales < 5:
-                sales_status = 'متوسط (مبيعات متقلبة)'
-            else:
-                sales_status = 'قوي (مبيعات مستمرة)'
-            sale_gaps = []
-            transaction_dates = transactions.values('date__date').distinct().order_by('date__date')
-            prev_date = None
-            for tx_date in transaction_dates:
-                current_date = tx_date['date__date']
-                if prev_date:
-                    gap_days = (current_date - prev_date).days
-                    if gap_days > 7:
-                        sale_gaps.append({
-                            'start_date': prev_date.isoformat(), 'end_date': current_date.isoformat(), 'gap_days': gap_days
-                        })
-                prev_date = current_date
-            analysis_data.append({
-                'stock_item_id': item.id, 'stock_item_name': item.name, 'total_quantity_sold': total_quantity_sold,
-                'total_revenue': float(total_revenue), 'sales_status': sales_status, 'avg_daily_sales': float(avg_daily_sales),
-                'sales_by_period': [
-                    {'period': period['period'].isoformat(), 'total_quantity': period['total_quantity'],
-                     'total_revenue': float(period['total_revenue'] or 0)} for period in sales_by_period
-                ],
-                'sales_by_hour': [
-                    {'hour': hour['hour'].strftime('%Y-%m-%d %H:00:00'), 'total_quantity': hour['total_quantity'],
-                     'total_revenue': float(hour['total_revenue'] or 0)} for hour in sales_by_hour
-                ],
-                'sale_gaps': sale_gaps
-            })
+        analysis_data = sales_analysis(request.user.club, start_date_obj, end_date_obj, period_type, stock_item_id)
         return Response(analysis_data, status=status.HTTP_200_OK)
     
     except ValueError as e:
@@ -1420,43 +1457,118 @@ def stock_sales_analysis_api(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def generate_inventory_pdf(request):
-    """Generate inventory report PDF."""
+    """Generate inventory report PDF (served from the report cache when unchanged)."""
     if not request.user.club:
         logger.error(f"User {request.user.username} has no associated club")
         return Response({'error': 'غير مسموح: المستخدم ليس مرتبط بنادي.'}, status=status.HTTP_403_FORBIDDEN)
     
     try:
-        stock_items = StockItem.objects.filter(club=request.user.club)
-        if request.query_params.get('stock_item_id'):
-            stock_items = stock_items.filter(id=request.query_params.get('stock_item_id'))
-        report_data = {
-            'items': [
-                {'name': item.name, 'unit': item.unit, 'quantity': item.current_quantity}
-                for item in stock_items
-            ],
-            'print_date': timezone.now().strftime('%Y-%m-%d %H:%M:%S'),
-        }
-        latex_template_path = os.path.join(os.path.dirname(__file__), 'templates', 'inventory_report.tex')
-        with open(latex_template_path, 'r', encoding='utf-8') as file:
-            template = Template(file.read())
-        latex_content = template.render(**report_data)
-        with tempfile.TemporaryDirectory() as tmpdirname:
-            latex_file_path = os.path.join(tmpdirname, 'report.tex')
-            with open(latex_file_path, 'w', encoding='utf-8') as f:
-                f.write(latex_content)
-            result = subprocess.run(
-                ['pdflatex', '-output-directory', tmpdirname, latex_file_path], capture_output=True, text=True
-            )
-            if result.returncode != 0:
-                return Response({'error': 'فشل إنشاء PDF'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            pdf_file_path = os.path.join(tmpdirname, 'report.pdf')
-            with open(pdf_file_path, 'rb') as pdf_file:
-                response = FileResponse(pdf_file, content_type='application/pdf')
-                response['Content-Disposition'] = f'attachment; filename="inventory_report_{timezone.now().strftime("%Y%m%d")}.pdf"'
-                return response
-    
+        job = render_report_now(request.user.club, request.user, 'inventory', request.query_params)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return _report_file_response(job)
+
+
+def _report_file_response(job):
+    if job.status != 'done':
+        return Response({'error': 'فشل إنشاء PDF: ' + job.error}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    response = FileResponse(job.file.open('rb'), content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="{job.filename}"'
+    return response
+
+
+def _report_job_data(job, request):
+    data = {
+        'job_id': str(job.id),
+        'kind': job.kind,
+        'params': job.params,
+        'status': job.status,
+        'error': job.error or None,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'download_url': None,
+    }
+    if job.status == 'done':
+        data['download_url'] = request.build_absolute_uri(reverse('report_job_download', args=[job.id]))
+    return data
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def report_job_api(request):
+    """Queue a PDF report ({kind, params}); returns at once with a job id, or the cached result."""
+    if not request.user.club:
+        logger.error(f"User {request.user.username} has no associated club")
+        return Response({'error': 'غير مسموح: المستخدم ليس مرتبط بنادي.'}, status=status.HTTP_403_FORBIDDEN)
+
+    params = request.data.get('params') or {}
+    if not isinstance(params, dict):
+        return Response({'error': 'params يجب أن يكون كائن JSON.'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        job, cached = submit_report(request.user.club, request.user, request.data.get('kind'), params)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    data = _report_job_data(job, request)
+    data['cached'] = cached
+    return Response(data, status=status.HTTP_200_OK if job.status == 'done' else status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def report_job_detail_api(request, job_id):
+    """Status of a report job."""
+    if not request.user.club:
+        logger.error(f"User {request.user.username} has no associated club")
+        return Response({'error': 'غير مسموح: المستخدم ليس مرتبط بنادي.'}, status=status.HTTP_403_FORBIDDEN)
+    job = get_object_or_404(ReportJob, id=job_id, club=request.user.club)
+    return Response(_report_job_data(job, request), status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def report_job_download_api(request, job_id):
+    """Download the PDF of a finished report job."""
+    if not request.user.club:
+        logger.error(f"User {request.user.username} has no associated club")
+        return Response({'error': 'غير مسموح: المستخدم ليس مرتبط بنادي.'}, status=status.HTTP_403_FORBIDDEN)
+    job = get_object_or_404(ReportJob, id=job_id, club=request.user.club)
+    if job.status in ('pending', 'running'):
+        return Response({'error': 'التقرير لم يكتمل بعد.', 'status': job.status}, status=status.HTTP_409_CONFLICT)
+    return _report_file_response(job)
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def finance_period_api(request):
+    """List closed financial months or close one ({month: 'YYYY-MM'}, Owner/Admin only)."""
+    if not request.user.club:
+        logger.error(f"User {request.user.username} has no associated club")
+        return Response({'error': 'غير مسموح: المستخدم ليس مرتبط بنادي.'}, status=status.HTTP_403_FORBIDDEN)
+
+    if request.method == 'GET':
+        periods = FinancePeriodClose.objects.filter(club=request.user.club).select_related('closed_by')
+        return Response([
+            {
+                'month': period.month.strftime('%Y-%m'),
+                'closed_at': period.closed_at.isoformat(),
+                'closed_by': period.closed_by.username if period.closed_by else None,
+                'total_income': float(period.total_income),
+                'total_expense': float(period.total_expense),
+                'net_profit': float(period.total_income - period.total_expense),
+            } for period in periods
+        ], status=status.HTTP_200_OK)
+
+    if request.user.role not in FULL_ACCESS_ROLES:
+        return Response({'error': 'غير مسموح بإغلاق الفترات. يجب أن تكون Owner أو Admin.'}, status=status.HTTP_403_FORBIDDEN)
+    try:
+        period = close_period(request.user.club, parse_month(request.data.get('month')), request.user)
     except ValueError as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({
+        'message': f'تم إغلاق الفترة {period.month:%Y-%m} بنجاح',
+        'month': period.month.strftime('%Y-%m'),
+        'total_income': float(period.total_income),
+        'total_expense': float(period.total_expense),
+    }, status=status.HTTP_201_CREATED)
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
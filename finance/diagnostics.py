@@ -0,0 +1,58 @@
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# قيم باراميتر diagnostics في الطلب
+MODES = ('true', 'explain')
+SAMPLE_SIZE = 5
+
+
+def _club_enabled(club_id):
+    # FINANCE_QUERY_DIAGNOSTICS = True لكل الأندية أو قائمة بمعرفات أندية محددة
+    value = getattr(settings, 'FINANCE_QUERY_DIAGNOSTICS', False)
+    if isinstance(value, (list, tuple, set)):
+        return club_id in value
+    return bool(value)
+
+
+def diagnostics_mode(request):
+    """
+    None when finance query diagnostics are off (the default), 'log' or 'explain' otherwise.
+    Enabled per club from settings, or per request with ?diagnostics=true|explain (owner/admin).
+    """
+    if hasattr(request, '_finance_diagnostics'):
+        return request._finance_diagnostics
+    mode = None
+    value = (request.query_params.get('diagnostics') or '').lower()
+    if value in MODES and request.user.role in ['owner', 'admin']:
+        mode = 'explain' if value == 'explain' else 'log'
+    elif request.user.club and _club_enabled(request.user.club.id):
+        mode = 'log'
+    request._finance_diagnostics = mode
+    return mode
+
+
+def record_queryset(request, queryset, filters, sample_fields=()):
+    """Log the applied filters, row count, a few sample rows and optionally the EXPLAIN plan."""
+    mode = diagnostics_mode(request)
+    if not mode:
+        return
+    model = queryset.model.__name__
+    logger.info(f"[{model}] applied filters: {', '.join(filters) if filters else 'none'}", extra={'force': True})
+    logger.info(f"[{model}] rows after filtering: {queryset.count()}", extra={'force': True})
+    if sample_fields:
+        sample = list(queryset[:SAMPLE_SIZE].values(*sample_fields))
+        logger.info(f"[{model}] sample rows: {sample}", extra={'force': True})
+    if mode == 'explain':
+        logger.info(f"[{model}] query plan:\n{queryset.explain()}", extra={'force': True})
+
+
+def record_missing_payment_methods(request, incomes, owner):
+    """Warn about incomes without a payment method (diagnostics only, it costs a count query)."""
+    if not diagnostics_mode(request):
+        return
+    missing = incomes.filter(payment_method__isnull=True).count()
+    if missing > 0:
+        logger.warning(f"Found {missing} income records with no payment method for {owner}", extra={'force': True})
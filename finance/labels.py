@@ -0,0 +1,80 @@
+import logging
+
+from django.core.cache import cache
+
+from subscriptions.models import PaymentMethod
+from .models import IncomeSource
+
+logger = logging.getLogger(__name__)
+
+SOURCE_TRANSLATIONS = {
+    "Refund": "استرداد",
+    "Renewal": "تجديد",
+    "Subscription": "اشتراك"
+}
+
+PAYMENT_METHOD_TRANSLATIONS = {
+    "Cash": "كاش",
+    "Visa": "فيزا"
+}
+
+UNSPECIFIED = 'غير محدد'
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def translate_source(name):
+    return SOURCE_TRANSLATIONS.get(name, name)
+
+
+def translate_payment_method(name):
+    return PAYMENT_METHOD_TRANSLATIONS.get(name, name) if name else UNSPECIFIED
+
+
+def _version_key(club_id):
+    return f"finance_labels_version:{club_id}"
+
+
+def invalidate_labels(club_id):
+    """Drop the cached labels of a club (called when its sources or payment methods change)."""
+    if not club_id:
+        return
+    try:
+        cache.incr(_version_key(club_id))
+    except ValueError:
+        cache.set(_version_key(club_id), 1, timeout=None)
+
+
+def club_labels(club_id):
+    """Translated income source and payment method names of a club, keyed by id."""
+    version = cache.get(_version_key(club_id), 0)
+    key = f"finance_labels:{club_id}:{version}"
+    labels = cache.get(key)
+    if labels is None:
+        labels = {
+            'source': {
+                source_id: translate_source(name)
+                for source_id, name in IncomeSource.objects.filter(club_id=club_id).values_list('id', 'name')
+            },
+            'payment_method': {
+                method_id: translate_payment_method(name)
+                for method_id, name in PaymentMethod.objects.filter(club_id=club_id).values_list('id', 'name')
+            },
+        }
+        cache.set(key, labels, timeout=CACHE_TIMEOUT)
+    return labels
+
+
+def apply_income_labels(rows, club_id, source_key='source', payment_method_key='payment_method'):
+    """
+    Replace source and payment method ids in serialized income rows with their translated
+    labels in one pass. Keys missing from the rows are left alone.
+    """
+    labels = club_labels(club_id)
+    sources, methods = labels['source'], labels['payment_method']
+    for row in rows:
+        if source_key in row and row[source_key] is not None:
+            row[source_key] = sources.get(row[source_key], row[source_key])
+        if payment_method_key in row:
+            method_id = row[payment_method_key]
+            row[payment_method_key] = methods.get(method_id, UNSPECIFIED) if method_id is not None else UNSPECIFIED
+    return rows
@@ -0,0 +1,160 @@
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+
+from django.conf import settings
+from jinja2 import Environment, TemplateError
+
+logger = logging.getLogger(__name__)
+
+LATEX_SPECIAL_CHARS = {
+    '\\': r'\textbackslash{}', '&': r'\&', '%': r'\%', '$': r'\$', '#': r'\#',
+    '_': r'\_', '{': r'\{', '}': r'\}', '~': r'\textasciitilde{}', '^': r'\textasciicircum{}',
+}
+BEGIN_DOCUMENT = r'\begin{document}'
+END_DOCUMENT = r'\end{document}'
+# فاصل الصفحات بين التقارير في ملف الدفعة الواحد
+REPORT_SEPARATOR = '\n\\clearpage\n'
+ERROR_TAIL = 2000
+
+
+def latex_escape(value):
+    if value is None:
+        return ''
+    return ''.join(LATEX_SPECIAL_CHARS.get(char, char) for char in str(value))
+
+
+# {# يبدأ تعليق في jinja لكنه يظهر في LaTeX مثل {#1} فنغير علامات التعليق، وكل قيمة تطبع بعد الهروب
+LATEX_ENV = Environment(comment_start_string='((#', comment_end_string='#))', finalize=latex_escape)
+
+
+class ReportRenderError(Exception):
+    """The template or LaTeX failed; the message holds the output."""
+
+
+def _command():
+    return getattr(settings, 'REPORT_LATEX_COMMAND', 'pdflatex')
+
+
+def _workspace():
+    path = getattr(settings, 'REPORT_LATEX_WORKDIR', None) or os.path.join(tempfile.gettempdir(), 'report-latex')
+    os.makedirs(os.path.join(path, 'formats'), exist_ok=True)
+    os.makedirs(os.path.join(path, 'texmf-var'), exist_ok=True)
+    return path
+
+
+def _environment(workspace):
+    env = os.environ.copy()
+    # كاش الخطوط والصيغ في مجلد دائم قابل للكتابة بدلا من HOME لكل تشغيل
+    env['TEXMFVAR'] = os.path.join(workspace, 'texmf-var')
+    env['TEXFORMATS'] = os.path.join(workspace, 'formats') + os.pathsep
+    return env
+
+
+def _run(args, cwd, env):
+    result = subprocess.run(args, cwd=cwd, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise ReportRenderError(result.stderr or result.stdout[-ERROR_TAIL:])
+    return result
+
+
+def split_document(source):
+    """(preamble, body) of a LaTeX document; body runs from \\begin{document} to \\end{document}."""
+    start = source.find(BEGIN_DOCUMENT)
+    end = source.rfind(END_DOCUMENT)
+    if start < 0 or end < start:
+        raise ReportRenderError('LaTeX template has no document environment')
+    return source[:start], source[start + len(BEGIN_DOCUMENT):end]
+
+
+class FormatCache:
+    """
+    Precompiled LaTeX formats keyed by a hash of the preamble. Building a format runs the
+    preamble once in ini mode and dumps it, so every later compile skips package and font loading.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # صيغ فشل بناؤها في هذه العملية حتى لا نعيد المحاولة مع كل تقرير
+        self._failed = set()
+
+    def format_for(self, preamble, workspace, env):
+        """Format name for the preamble, building it if needed; None if it can't be built."""
+        command = _command()
+        name = f"report-{hashlib.sha256((command + preamble).encode('utf-8')).hexdigest()[:16]}"
+        formats_dir = os.path.join(workspace, 'formats')
+        if os.path.exists(os.path.join(formats_dir, f'{name}.fmt')):
+            return name
+        if name in self._failed:
+            return None
+        with self._lock:
+            if os.path.exists(os.path.join(formats_dir, f'{name}.fmt')):
+                return name
+            build_dir = tempfile.mkdtemp(dir=workspace)
+            try:
+                with open(os.path.join(build_dir, f'{name}.tex'), 'w', encoding='utf-8') as f:
+                    f.write(preamble + '\n\\dump\n')
+                _run(
+                    [command, '-ini', '-interaction=nonstopmode', '-halt-on-error', f'-jobname={name}',
+                     f'&{command}', f'{name}.tex'],
+                    build_dir, env
+                )
+                # نقل ذري حتى لا تقرأ عملية أخرى صيغة نصف مكتوبة
+                os.replace(os.path.join(build_dir, f'{name}.fmt'), os.path.join(formats_dir, f'{name}.fmt'))
+                logger.info(f"Built LaTeX format {name}")
+                return name
+            except (ReportRenderError, OSError) as e:
+                logger.warning(f"Could not build LaTeX format {name}, compiling without it: {str(e)[:300]}")
+                self._failed.add(name)
+                return None
+            finally:
+                shutil.rmtree(build_dir, ignore_errors=True)
+
+
+format_cache = FormatCache()
+
+
+def render_template(template_path, data):
+    with open(template_path, 'r', encoding='utf-8') as file:
+        try:
+            return LATEX_ENV.from_string(file.read()).render(**data)
+        except TemplateError as e:
+            raise ReportRenderError(f"Template {os.path.basename(template_path)}: {str(e)}")
+
+
+def compile_documents(sources):
+    """
+    Compile one or more rendered documents of the same template into a single PDF with one
+    LaTeX run: the shared preamble comes from a precompiled format and each document's body
+    starts on a new page. Returns the PDF bytes.
+    """
+    if not sources:
+        raise ReportRenderError('No documents to render')
+    parts = [split_document(source) for source in sources]
+    preamble = parts[0][0]
+    if any(part[0] != preamble for part in parts):
+        raise ReportRenderError('Batched documents must share the same preamble')
+    body = REPORT_SEPARATOR.join(part[1] for part in parts)
+
+    workspace = _workspace()
+    env = _environment(workspace)
+    fmt = format_cache.format_for(preamble, workspace, env)
+    job_dir = tempfile.mkdtemp(dir=workspace)
+    try:
+        with open(os.path.join(job_dir, 'report.tex'), 'w', encoding='utf-8') as f:
+            if fmt:
+                f.write(f'{BEGIN_DOCUMENT}{body}{END_DOCUMENT}\n')
+            else:
+                f.write(f'{preamble}{BEGIN_DOCUMENT}{body}{END_DOCUMENT}\n')
+        args = [_command(), '-interaction=nonstopmode', '-halt-on-error']
+        if fmt:
+            args.append(f'-fmt={fmt}')
+        _run(args + ['report.tex'], job_dir, env)
+        with open(os.path.join(job_dir, 'report.pdf'), 'rb') as pdf_file:
+            return pdf_file.read()
+    finally:
+        shutil.rmtree(job_dir, ignore_errors=True)
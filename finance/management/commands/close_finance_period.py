@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Club
+from finance.periods import close_period, parse_month
+
+
+class Command(BaseCommand):
+    help = "Close a finished month: freeze its income/expense totals and block edits to its rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', required=True, help="Month to close (YYYY-MM)")
+        parser.add_argument('--club', type=int, help="Only this club id (default: every club)")
+
+    def handle(self, *args, **options):
+        try:
+            month = parse_month(options['month'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        clubs = Club.objects.order_by('id')
+        if options['club']:
+            clubs = clubs.filter(id=options['club'])
+
+        closed = 0
+        for club in clubs:
+            try:
+                close_period(club, month)
+                closed += 1
+            except ValueError as e:
+                self.stderr.write(f"Club {club.id}: {e}")
+        self.stdout.write(self.style.SUCCESS(f"Closed {month:%Y-%m} for {closed} clubs"))
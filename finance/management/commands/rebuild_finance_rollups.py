@@ -0,0 +1,39 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Club
+from finance.rollups import KINDS, rebuild_club, rebuild_range
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily finance rollup table from the raw income and expense rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--club', type=int, help="Only rebuild this club id")
+        parser.add_argument('--start', help="First day to rebuild (YYYY-MM-DD); default is the whole history")
+        parser.add_argument('--end', help="Last day to rebuild (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        clubs = Club.objects.order_by('id')
+        if options['club']:
+            clubs = clubs.filter(id=options['club'])
+
+        if bool(options['start']) != bool(options['end']):
+            raise CommandError("--start and --end must be given together")
+        try:
+            start = datetime.strptime(options['start'], '%Y-%m-%d').date() if options['start'] else None
+            end = datetime.strptime(options['end'], '%Y-%m-%d').date() if options['end'] else None
+        except ValueError:
+            raise CommandError("Dates must be YYYY-MM-DD")
+
+        total = 0
+        for club_id in clubs.values_list('id', flat=True):
+            if start:
+                created = sum(rebuild_range(club_id, kind, start, end) for kind in KINDS)
+            else:
+                created = rebuild_club(club_id)
+            total += created
+            self.stdout.write(f"club {club_id}: {created} rollup rows")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} rollup rows"))
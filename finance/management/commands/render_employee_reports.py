@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Club
+from finance.report_jobs import render_report_now
+
+
+class Command(BaseCommand):
+    help = "Render the daily report of every employee of a club for a date range into one PDF (one LaTeX run)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--club', type=int, required=True, help="Club id")
+        parser.add_argument('--start', required=True, help="Start date/time (ISO format)")
+        parser.add_argument('--end', required=True, help="End date/time (ISO format)")
+        parser.add_argument('--employees', help="Comma separated employee ids (default: all with activity)")
+
+    def handle(self, *args, **options):
+        club = Club.objects.filter(id=options['club']).first()
+        if club is None:
+            raise CommandError(f"Club {options['club']} not found")
+        params = {'start_date': options['start'], 'end_date': options['end'], 'employee_ids': options['employees']}
+        try:
+            job = render_report_now(club, None, 'employee_reports', params)
+        except ValueError as e:
+            raise CommandError(str(e))
+        if job.status != 'done':
+            raise CommandError(f"Rendering failed: {job.error[:500]}")
+        self.stdout.write(self.style.SUCCESS(f"{job.filename}: {job.file.path}"))
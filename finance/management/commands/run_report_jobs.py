@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from finance.models import ReportJob
+from finance.report_jobs import purge_jobs, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "Render pending PDF report jobs (e.g. left over after a restart) and clean up old ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale-minutes', type=int, default=30,
+                            help="Requeue jobs that have been 'running' longer than this")
+        parser.add_argument('--purge-days', type=int, help="Delete finished jobs and their files older than this")
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale_jobs(options['stale_minutes'])
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale jobs")
+
+        done = failed = 0
+        for job_id in ReportJob.objects.filter(status='pending').order_by('created_at').values_list('id', flat=True):
+            job = run_job(job_id)
+            if job is None:
+                continue
+            if job.status == 'done':
+                done += 1
+            else:
+                failed += 1
+                self.stderr.write(f"Job {job.id} failed: {job.error[:200]}")
+
+        if options['purge_days']:
+            self.stdout.write(f"Purged {purge_jobs(options['purge_days'])} old jobs")
+        self.stdout.write(self.style.SUCCESS(f"Rendered {done} reports, {failed} failed"))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from finance.models import ShiftFinanceSnapshot
+from finance.shifts import snapshot_shift
+from staff.models import StaffAttendance
+
+
+class Command(BaseCommand):
+    help = "Create the financial snapshot of closed staff shifts that don't have one yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--club', type=int, help="Only snapshot shifts of this club id")
+
+    def handle(self, *args, **options):
+        shifts = StaffAttendance.objects.filter(check_out__isnull=False).exclude(
+            id__in=ShiftFinanceSnapshot.objects.values('attendance_id')
+        ).order_by('check_in')
+        if options['club']:
+            shifts = shifts.filter(club_id=options['club'])
+
+        created = 0
+        for attendance in shifts.iterator(chunk_size=500):
+            snapshot_shift(attendance)
+            created += 1
+        self.stdout.write(self.style.SUCCESS(f"Created {created} shift snapshots"))
@@ -1,4 +1,6 @@
-from django.db import models
+import uuid
+from django.db import models, transaction
+from django.db.models import F
 from utils.generate_invoice import generate_invoice_number
 from core.models import Club
 from django.utils import timezone
@@ -108,6 +110,146 @@ class Income(models.Model):
         ordering = ['-date', 'id']
 
 
+class FinanceDailyRollup(models.Model):
+    """
+    Totals of incomes/expenses per club, local day, source/category, payment method and employee.
+    Kept current by finance.signals and rebuilt with the rebuild_finance_rollups command.
+    """
+    KIND_CHOICES = (
+        ('income', 'إيراد'),
+        ('expense', 'مصروف'),
+    )
+    club = models.ForeignKey('core.Club', on_delete=models.CASCADE)
+    day = models.DateField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    source = models.ForeignKey('IncomeSource', on_delete=models.SET_NULL, null=True, blank=True)
+    category = models.ForeignKey('ExpenseCategory', on_delete=models.SET_NULL, null=True, blank=True)
+    payment_method = models.ForeignKey(PaymentMethod, on_delete=models.SET_NULL, null=True, blank=True)
+    employee = models.ForeignKey('accounts.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='finance_rollups')
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+    quantity = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.club_id} {self.day} {self.kind}: {self.total} ({self.count})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['club', 'kind', 'day']),
+            models.Index(fields=['club', 'employee', 'day']),
+        ]
+
+
+class FinancePeriodClose(models.Model):
+    """A closed accounting month: its totals are frozen in FinanceMonthlySnapshot and its rows can't change."""
+    club = models.ForeignKey('core.Club', on_delete=models.CASCADE, related_name='finance_period_closes')
+    month = models.DateField()
+    closed_at = models.DateTimeField(auto_now_add=True)
+    closed_by = models.ForeignKey('accounts.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='closed_finance_periods')
+    total_income = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_expense = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.club_id} {self.month:%Y-%m}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['club', 'month'], name='unique_finance_period_close'),
+        ]
+        ordering = ['-month']
+
+
+class FinanceMonthlySnapshot(models.Model):
+    """Frozen totals of a closed month, with the same breakdown as FinanceDailyRollup."""
+    club = models.ForeignKey('core.Club', on_delete=models.CASCADE)
+    month = models.DateField()
+    kind = models.CharField(max_length=10, choices=FinanceDailyRollup.KIND_CHOICES)
+    source = models.ForeignKey('IncomeSource', on_delete=models.SET_NULL, null=True, blank=True)
+    category = models.ForeignKey('ExpenseCategory', on_delete=models.SET_NULL, null=True, blank=True)
+    payment_method = models.ForeignKey(PaymentMethod, on_delete=models.SET_NULL, null=True, blank=True)
+    employee = models.ForeignKey('accounts.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='finance_month_snapshots')
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+    quantity = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.club_id} {self.month:%Y-%m} {self.kind}: {self.total} ({self.count})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['club', 'kind', 'month']),
+        ]
+
+
+class ShiftFinanceSnapshot(models.Model):
+    """
+    Income/expense totals of a staff shift, written once when the shift is closed so
+    shift reports don't aggregate the raw rows again.
+    """
+    attendance = models.OneToOneField('staff.StaffAttendance', on_delete=models.CASCADE, related_name='finance_snapshot')
+    club = models.ForeignKey('core.Club', on_delete=models.CASCADE)
+    staff = models.ForeignKey('accounts.User', on_delete=models.CASCADE, related_name='shift_snapshots')
+    check_in = models.DateTimeField()
+    check_out = models.DateTimeField()
+    total_income = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_expense = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    income_count = models.PositiveIntegerField(default=0)
+    expense_count = models.PositiveIntegerField(default=0)
+    # [{'payment_method_id', 'name', 'total', 'count'}] والمبالغ كنصوص حتى لا تفقد الدقة
+    payment_methods = models.JSONField(default=list, blank=True)
+    # [{'category_id', 'name', 'total', 'count'}]
+    expense_categories = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.staff_id} {self.check_in:%Y-%m-%d %H:%M}: {self.total_income} / {self.total_expense}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['club', 'check_in']),
+            models.Index(fields=['staff', 'check_in']),
+        ]
+
+
+class ReportJob(models.Model):
+    """
+    A PDF report rendered in the background. Finished jobs double as the artifact cache:
+    a request with the same cache_key (club, kind, params, data version) reuses the file.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'في الانتظار'),
+        ('running', 'جاري التنفيذ'),
+        ('done', 'مكتمل'),
+        ('failed', 'فشل'),
+    )
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    club = models.ForeignKey('core.Club', on_delete=models.CASCADE)
+    requested_by = models.ForeignKey('accounts.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='report_jobs')
+    kind = models.CharField(max_length=30)
+    params = models.JSONField(default=dict, blank=True)
+    cache_key = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    file = models.FileField(upload_to='reports/', null=True, blank=True)
+    filename = models.CharField(max_length=150, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.id} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['club', 'cache_key', 'status']),
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+
+class InsufficientStock(ValueError):
+    pass
+
+
 class StockItem(models.Model):
     club = models.ForeignKey('core.Club', on_delete=models.CASCADE)
     name = models.CharField(max_length=100)
@@ -120,6 +262,19 @@ class StockItem(models.Model):
     def __str__(self):
         return f"{self.name} ({self.current_quantity} {self.unit})"
 
+    def apply_movement(self, transaction_type, quantity):
+        """
+        Add or consume stock with one conditional UPDATE in the database, so concurrent sales
+        can't overwrite each other. Raises InsufficientStock if there isn't enough to consume.
+        """
+        items = StockItem.objects.filter(id=self.id)
+        if transaction_type == 'ADD':
+            items.update(current_quantity=F('current_quantity') + quantity)
+        elif transaction_type == 'CONSUME':
+            if not items.filter(current_quantity__gte=quantity).update(current_quantity=F('current_quantity') - quantity):
+                raise InsufficientStock('الكمية المستهلكة أكبر من الكمية المتاحة')
+        self.refresh_from_db(fields=['current_quantity'])
+
     class Meta:
         indexes = [
             models.Index(fields=['club']),
@@ -142,14 +297,12 @@ class StockTransaction(models.Model):
     created_by = models.ForeignKey('accounts.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_transactions')
 
     def save(self, *args, **kwargs):
-        if self.transaction_type == 'ADD':
-            self.stock_item.current_quantity += self.quantity
-        elif self.transaction_type == 'CONSUME':
-            if self.quantity > self.stock_item.current_quantity:
-                raise ValueError('الكمية المستهلكة أكبر من الكمية المتاحة')
-            self.stock_item.current_quantity -= self.quantity
-        self.stock_item.save()
-        super().save(*args, **kwargs)
+        # الحركة تطبق على المخزون مرة واحدة عند الإنشاء فقط، وتلغى إذا فشل حفظ الحركة
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            self.stock_item.apply_movement(self.transaction_type, self.quantity)
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.transaction_type} - {self.stock_item.name} ({self.quantity})"
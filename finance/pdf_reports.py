@@ -0,0 +1,219 @@
+import hashlib
+import json
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from accounts.models import User
+from .labels import translate_source
+from .latex import compile_documents, render_template
+from .models import Expense, Income, StockItem
+
+logger = logging.getLogger(__name__)
+
+# مجلدات البحث عن قوالب LaTeX: قوالب التطبيق ثم قوالب المشروع
+TEMPLATE_DIRS = (
+    os.path.join(os.path.dirname(__file__), 'templates'),
+    os.path.join(settings.BASE_DIR, 'templates'),
+)
+# حقول لا تدخل في نسخة البيانات لأنها تتغير مع كل طلب
+VOLATILE_FIELDS = ('print_date',)
+
+
+def _parse_iso(value):
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        raise ValueError('صيغة التاريخ غير صحيحة (ISO format)')
+
+
+def _daily_payload(employee_name, start_date_obj, end_date_obj, expense_rows, income_rows):
+    total_expenses = sum((amount for _, _, amount in expense_rows), 0)
+    total_incomes = sum((amount for _, _, amount in income_rows), 0)
+    return {
+        'employee_name': employee_name,
+        'start_date': start_date_obj.strftime('%Y-%m-%d %H:%M:%S'),
+        'end_date': end_date_obj.strftime('%Y-%m-%d %H:%M:%S'),
+        'shift_date': 'غير محدد',
+        'print_date': timezone.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'expenses': [
+            {'date': date.strftime('%Y-%m-%d %H:%M:%S'), 'category': category, 'amount': f"{amount:.2f}"}
+            for date, category, amount in expense_rows
+        ],
+        'incomes': [
+            {'date': date.strftime('%Y-%m-%d %H:%M:%S'), 'source': translate_source(source), 'amount': f"{amount:.2f}"}
+            for date, source, amount in income_rows
+        ],
+        'expenses_count': len(expense_rows),
+        'incomes_count': len(income_rows),
+        'total_expenses': f"{total_expenses:.2f}",
+        'total_incomes': f"{total_incomes:.2f}",
+        'net_profit': f"{total_incomes - total_expenses:.2f}",
+    }
+
+
+def _date_range(params):
+    if not (params.get('start_date') and params.get('end_date')):
+        raise ValueError('يجب تحديد تاريخ البداية وتاريخ النهاية.')
+    return _parse_iso(params['start_date']), _parse_iso(params['end_date'])
+
+
+def daily_report_data(club, params):
+    """Incomes and expenses of a club (optionally one employee) between start_date and end_date."""
+    employee_id = params.get('employee_id')
+    start_date_obj, end_date_obj = _date_range(params)
+
+    expenses = Expense.objects.filter(club=club, date__gte=start_date_obj, date__lte=end_date_obj)
+    incomes = Income.objects.filter(club=club, date__gte=start_date_obj, date__lte=end_date_obj)
+    employee = None
+    if employee_id:
+        employee = User.objects.filter(id=employee_id, club=club).first()
+        if employee is None:
+            raise ValueError('الموظف غير موجود في ناديك.')
+        expenses = expenses.filter(paid_by=employee)
+        incomes = incomes.filter(received_by=employee)
+
+    expense_rows = list(expenses.order_by('date', 'id').values_list('date', 'category__name', 'amount'))
+    income_rows = list(incomes.order_by('date', 'id').values_list('date', 'source__name', 'amount'))
+    return _daily_payload(
+        employee.username if employee else 'جميع الموظفين', start_date_obj, end_date_obj, expense_rows, income_rows
+    )
+
+
+def daily_report_filename(params):
+    start = _parse_iso(params['start_date'])
+    return f"daily_report_{params.get('employee_id') or 'all'}_{start.strftime('%Y%m%d')}.pdf"
+
+
+def employee_reports_data(club, params):
+    """
+    One daily report per employee with activity between start_date and end_date (or only the
+    comma separated employee_ids), built from two queries for the whole club.
+    """
+    start_date_obj, end_date_obj = _date_range(params)
+    employees = User.objects.filter(club=club).order_by('username', 'id')
+    if params.get('employee_ids'):
+        try:
+            ids = [int(value) for value in params['employee_ids'].split(',') if value.strip()]
+        except ValueError:
+            raise ValueError('employee_ids يجب أن تكون أرقام مفصولة بفواصل.')
+        employees = employees.filter(id__in=ids)
+
+    expenses_by_employee = defaultdict(list)
+    incomes_by_employee = defaultdict(list)
+    expense_rows = (
+        Expense.objects.filter(club=club, date__gte=start_date_obj, date__lte=end_date_obj, paid_by__isnull=False)
+        .order_by('date', 'id').values_list('paid_by_id', 'date', 'category__name', 'amount')
+    )
+    for employee_id, *row in expense_rows:
+        expenses_by_employee[employee_id].append(row)
+    income_rows = (
+        Income.objects.filter(club=club, date__gte=start_date_obj, date__lte=end_date_obj, received_by__isnull=False)
+        .order_by('date', 'id').values_list('received_by_id', 'date', 'source__name', 'amount')
+    )
+    for employee_id, *row in income_rows:
+        incomes_by_employee[employee_id].append(row)
+
+    reports = [
+        _daily_payload(username, start_date_obj, end_date_obj, expenses_by_employee[employee_id], incomes_by_employee[employee_id])
+        for employee_id, username in employees.values_list('id', 'username')
+        if employee_id in expenses_by_employee or employee_id in incomes_by_employee
+    ]
+    if not reports:
+        raise ValueError('لا توجد حركات لأي موظف في هذه الفترة.')
+    return {'reports': reports}
+
+
+def employee_reports_filename(params):
+    start, end = _date_range(params)
+    return f"employee_reports_{start.strftime('%Y%m%d')}_{end.strftime('%Y%m%d')}.pdf"
+
+
+def inventory_report_data(club, params):
+    stock_items = StockItem.objects.filter(club=club).order_by('name', 'id')
+    if params.get('stock_item_id'):
+        stock_items = stock_items.filter(id=params['stock_item_id'])
+    return {
+        'items': [
+            {'name': name, 'unit': unit, 'quantity': quantity}
+            for name, unit, quantity in stock_items.values_list('name', 'unit', 'current_quantity')
+        ],
+        'print_date': timezone.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def inventory_report_filename(params):
+    return f"inventory_report_{timezone.localdate().strftime('%Y%m%d')}.pdf"
+
+
+# batch: البيانات {'reports': [...]} وكل عنصر يطبع بنفس القالب في صفحات مستقلة داخل ملف واحد
+REPORT_KINDS = {
+    'daily_report': {
+        'template': 'daily_report.tex', 'build': daily_report_data, 'filename': daily_report_filename,
+        'params': ('employee_id', 'start_date', 'end_date'),
+    },
+    'employee_reports': {
+        'template': 'daily_report.tex', 'build': employee_reports_data, 'filename': employee_reports_filename,
+        'params': ('employee_ids', 'start_date', 'end_date'), 'batch': True,
+    },
+    'inventory': {
+        'template': 'inventory_report.tex', 'build': inventory_report_data, 'filename': inventory_report_filename,
+        'params': ('stock_item_id',),
+    },
+}
+
+
+def clean_params(kind, params):
+    """Only the parameters the report kind uses, as strings, so equal requests get equal keys."""
+    if kind not in REPORT_KINDS:
+        raise ValueError(f'نوع التقرير غير مدعوم. استخدم: {", ".join(REPORT_KINDS)}')
+    allowed = REPORT_KINDS[kind]['params']
+    return {name: str(params[name]) for name in allowed if params.get(name) not in (None, '')}
+
+
+def _stable(value):
+    if isinstance(value, dict):
+        return {key: _stable(item) for key, item in value.items() if key not in VOLATILE_FIELDS}
+    if isinstance(value, list):
+        return [_stable(item) for item in value]
+    return value
+
+
+def data_version(data):
+    """Hash of the report data without volatile fields: changes only when the printed content changes."""
+    return hashlib.sha256(json.dumps(_stable(data), sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def artifact_key(club_id, kind, params, version):
+    raw = json.dumps([club_id, kind, params, version], sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def template_path(name):
+    for directory in TEMPLATE_DIRS:
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"LaTeX template {name} not found")
+
+
+def render_pdf(template_name, data):
+    """Render a LaTeX template with jinja2 and compile it; returns the PDF bytes."""
+    return render_batch_pdf(template_name, [data])
+
+
+def render_batch_pdf(template_name, reports):
+    """Many reports of one template in a single PDF, compiled by one LaTeX run."""
+    path = template_path(template_name)
+    return compile_documents([render_template(path, data) for data in reports])
+
+
+def render_report(kind, data):
+    spec = REPORT_KINDS[kind]
+    if spec.get('batch'):
+        return render_batch_pdf(spec['template'], data['reports'])
+    return render_pdf(spec['template'], data)
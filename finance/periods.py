@@ -0,0 +1,168 @@
+import logging
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from dateutil.relativedelta import relativedelta
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import FinanceDailyRollup, FinanceMonthlySnapshot, FinancePeriodClose
+from .rollups import KINDS, NO_ROWS, day_start, local_day, rollup_filters
+
+logger = logging.getLogger(__name__)
+
+
+class ClosedPeriodError(ValueError):
+    pass
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def month_end(month):
+    return month + relativedelta(months=1) - relativedelta(days=1)
+
+
+def parse_month(value):
+    """date of the first day of a 'YYYY-MM' month; raises ValueError."""
+    try:
+        year, month = str(value).split('-')[:2]
+        return date(int(year), int(month), 1)
+    except (TypeError, ValueError):
+        raise ValueError('صيغة الشهر غير صحيحة (YYYY-MM)')
+
+
+def closed_months(club_id):
+    """Set of the first days of the club's closed months."""
+    return set(FinancePeriodClose.objects.filter(club_id=club_id).values_list('month', flat=True))
+
+
+def check_open(club_id, value):
+    """
+    Raise ClosedPeriodError if the date/datetime falls in a closed month of the club.
+    Always asks the database (no cache): a close made by another process applies at once.
+    """
+    if not club_id or value is None:
+        return
+    day = local_day(value) if hasattr(value, 'hour') else value
+    if FinancePeriodClose.objects.filter(club_id=club_id, month=month_start(day)).exists():
+        raise ClosedPeriodError(f'الفترة المالية {day:%Y-%m} مغلقة ولا يمكن تعديل حركاتها.')
+
+
+def close_period(club, month, user=None):
+    """
+    Freeze a finished month: its incomes and expenses are summed from the raw rows into
+    FinanceMonthlySnapshot (per source/category, payment method and employee) and the month
+    is marked closed. Raises ValueError for the current or a future month or one already closed.
+    """
+    month = month_start(month)
+    if month >= month_start(timezone.localdate()):
+        raise ValueError('لا يمكن إغلاق الشهر الحالي أو شهر مستقبلي.')
+    start, end = day_start(month), day_start(month + relativedelta(months=1))
+
+    snapshots = []
+    totals = {}
+    for kind, (model, group_field, employee_field) in KINDS.items():
+        group_by = [f'{group_field}_id', f'{employee_field}_id']
+        aggregates = {'total': Sum('amount'), 'count': Count('id')}
+        if kind == 'income':
+            group_by.append('payment_method_id')
+            aggregates['quantity'] = Sum('quantity')
+        rows = model.objects.filter(club=club, date__gte=start, date__lt=end).values(*group_by).annotate(**aggregates).order_by()
+        totals[kind] = Decimal('0')
+        for row in rows:
+            totals[kind] += row['total'] or 0
+            snapshots.append(FinanceMonthlySnapshot(
+                club=club, month=month, kind=kind,
+                source_id=row.get('source_id'), category_id=row.get('category_id'),
+                payment_method_id=row.get('payment_method_id'), employee_id=row[f'{employee_field}_id'],
+                total=row['total'] or 0, count=row['count'], quantity=row.get('quantity') or 0,
+            ))
+
+    try:
+        with transaction.atomic():
+            period = FinancePeriodClose.objects.create(
+                club=club, month=month, closed_by=user, total_income=totals['income'], total_expense=totals['expense']
+            )
+            FinanceMonthlySnapshot.objects.bulk_create(snapshots, batch_size=1000)
+    except IntegrityError:
+        raise ValueError(f'الشهر {month:%Y-%m} مغلق بالفعل.')
+    logger.info(f"Closed finance period {month:%Y-%m} of club {club.id} ({len(snapshots)} snapshot rows)")
+    return period
+
+
+class PeriodRows:
+    """
+    Totals for a request split in two: frozen snapshot rows of the closed months that lie
+    entirely inside the range and live daily rollup rows of every other day.
+    """
+
+    def __init__(self, rollup, snapshots):
+        self.rollup = rollup
+        self.snapshots = snapshots
+
+    def _parts(self):
+        return ((self.rollup, 'day'), (self.snapshots, 'month'))
+
+    def totals(self):
+        result = {'total': Decimal('0'), 'count': 0, 'quantity': 0}
+        for queryset, _ in self._parts():
+            row = queryset.aggregate(total=Sum('total'), count=Sum('count'), quantity=Sum('quantity'))
+            for key in result:
+                result[key] += row[key] or 0
+        return result
+
+    def by_field(self, field):
+        """[(value, total)] grouped by field, largest first."""
+        grouped = defaultdict(Decimal)
+        for queryset, _ in self._parts():
+            for row in queryset.values(field).annotate(amount=Sum('total')).order_by():
+                grouped[row[field]] += row['amount'] or 0
+        return sorted(grouped.items(), key=lambda item: item[1], reverse=True)
+
+    def by_period(self, trunc_func):
+        """[(period date, total)] with trunc_func (TruncMonth/TruncYear) applied to the day or month."""
+        grouped = defaultdict(Decimal)
+        for queryset, day_field in self._parts():
+            for row in queryset.annotate(period=trunc_func(day_field)).values('period').annotate(amount=Sum('total')).order_by():
+                grouped[row['period']] += row['amount'] or 0
+        return sorted(grouped.items())
+
+
+def period_rows(request, kind, start_day=None, end_day=None, closed=True):
+    """
+    PeriodRows for the request's finance filters, optionally limited to start_day..end_day,
+    or None if the rollup can't answer the request. closed=False keeps every day on the daily
+    rollup (for daily/weekly breakdowns that don't align with months).
+    """
+    filters = rollup_filters(request, kind)
+    if filters is None:
+        return None
+    club = request.user.club
+    rollup = FinanceDailyRollup.objects.filter(club=club, kind=kind)
+    snapshots = FinanceMonthlySnapshot.objects.filter(club=club, kind=kind)
+    if filters is NO_ROWS:
+        return PeriodRows(rollup.none(), snapshots.none())
+    rollup = rollup.filter(**filters)
+    if start_day:
+        rollup = rollup.filter(day__gte=start_day)
+    if end_day:
+        rollup = rollup.filter(day__lte=end_day)
+
+    lower = max((day for day in (start_day, filters.get('day__gte')) if day), default=None)
+    upper = min((day for day in (end_day, filters.get('day__lte')) if day), default=None)
+    months = []
+    if closed and 'day' not in filters:
+        months = sorted(
+            month for month in closed_months(club.id)
+            if (lower is None or month >= lower) and (upper is None or month_end(month) <= upper)
+        )
+    if months:
+        rollup = rollup.exclude(reduce(or_, [Q(day__gte=month, day__lte=month_end(month)) for month in months]))
+    dimensions = {key: value for key, value in filters.items() if not key.startswith('day')}
+    return PeriodRows(rollup, snapshots.filter(month__in=months, **dimensions))
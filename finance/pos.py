@@ -0,0 +1,122 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from subscriptions.models import PaymentMethod
+from utils.sequences import allocate, format_daily_number
+from .labels import translate_payment_method, translate_source
+from .models import Income, IncomeSource, InsufficientStock, StockItem, StockTransaction
+from .rollups import apply_to_rollup, local_day
+from .shifts import refresh_shift_snapshots
+from .valuation import invalidate_valuation
+
+
+def parse_cart(items):
+    """[(source_id, quantity)] from the [{source, quantity}] payload; raises ValueError."""
+    if not isinstance(items, list) or not items:
+        raise ValueError('السلة فارغة')
+    lines = []
+    for item in items:
+        if not isinstance(item, dict) or not item.get('source'):
+            raise ValueError('مصدر الإيراد مطلوب لكل عنصر')
+        try:
+            source_id, quantity = int(item['source']), int(item.get('quantity', 1))
+        except (TypeError, ValueError):
+            raise ValueError('سعر أو كمية غير صالحة')
+        if quantity <= 0:
+            raise ValueError('الكمية يجب أن تكون أكبر من صفر')
+        lines.append((source_id, quantity))
+    return lines
+
+
+def _consume_stock(needed):
+    """
+    Decrement every stock item in one conditional UPDATE; raises InsufficientStock when any of
+    them didn't have enough. Runs inside the checkout transaction, which the error rolls back.
+    """
+    quantity_for = Case(*[When(id=item_id, then=Value(quantity)) for item_id, quantity in needed.items()],
+                        output_field=IntegerField())
+    updated = (
+        StockItem.objects.filter(id__in=needed, current_quantity__gte=quantity_for)
+        .update(current_quantity=F('current_quantity') - quantity_for)
+    )
+    if updated != len(needed):
+        raise InsufficientStock('الكمية المطلوبة غير متوفرة في المخزون')
+
+
+def checkout(club, user, payment_method_id, lines, description=''):
+    """
+    Sell a cart of income sources in one transaction: one income per line, one CONSUME stock
+    transaction per stock-backed line and one atomic stock decrement for the whole cart.
+    Returns the receipt. Raises ValueError for bad input and InsufficientStock when an item
+    ran out.
+    """
+    try:
+        payment_method = PaymentMethod.objects.get(id=payment_method_id, club=club, is_active=True)
+    except (PaymentMethod.DoesNotExist, ValueError, TypeError):
+        raise ValueError('معرف طريقة الدفع غير صالح')
+    sources = IncomeSource.objects.select_related('stock_item').in_bulk({source_id for source_id, _ in lines})
+    if any(source_id not in sources or sources[source_id].club_id != club.id for source_id, _ in lines):
+        raise ValueError('معرف مصدر غير صالح')
+
+    needed = Counter()
+    for source_id, quantity in lines:
+        stock_item = sources[source_id].stock_item
+        if stock_item:
+            if not stock_item.is_sellable:
+                raise ValueError(f'عنصر المخزون غير قابل للبيع: {stock_item.name}')
+            needed[stock_item.id] += quantity
+    # فحص أولي برسالة واضحة؛ الخصم الفعلي أدناه مشروط في قاعدة البيانات
+    short = [
+        sources[source_id].stock_item.name for source_id, _ in lines
+        if sources[source_id].stock_item and needed[sources[source_id].stock_item_id] > sources[source_id].stock_item.current_quantity
+    ]
+    if short:
+        raise InsufficientStock(f'الكمية المطلوبة غير متوفرة في المخزون: {", ".join(dict.fromkeys(short))}')
+
+    now = timezone.now()
+    day = local_day(now)
+    with transaction.atomic():
+        receipt_number = format_daily_number(
+            f"POS-{day.strftime('%y%m%d')}", allocate('pos_receipt', day, club=club)[0], width=4, separator='-'
+        )
+        if needed:
+            _consume_stock(needed)
+        note = f'فاتورة {receipt_number}' + (f' - {description}' if description else '')
+        incomes = Income.objects.bulk_create([
+            Income(
+                club=club, source=sources[source_id], amount=sources[source_id].price * quantity, quantity=quantity,
+                description=note, date=now, received_by=user, payment_method=payment_method
+            )
+            for source_id, quantity in lines
+        ])
+        StockTransaction.objects.bulk_create([
+            StockTransaction(
+                stock_item_id=income.source.stock_item_id, transaction_type='CONSUME', quantity=income.quantity,
+                description=f'بيع عبر الإيراد #{income.id} - {note}', related_income=income, created_by=user
+            )
+            for income in incomes if income.source.stock_item_id
+        ])
+        # bulk_create لا يرسل إشارات: نضيف الإيرادات للملخص اليومي ولقطة الشيفت ونلغي كاش تقييم المخزون
+        apply_to_rollup(incomes)
+        refresh_shift_snapshots(user.id, now)
+        if needed:
+            transaction.on_commit(lambda: invalidate_valuation(club.id))
+
+    return {
+        'receipt_number': receipt_number,
+        'date': timezone.localtime(now).strftime('%Y-%m-%d %H:%M:%S'),
+        'received_by': user.username,
+        'payment_method': translate_payment_method(payment_method.name),
+        'items': [
+            {
+                'income_id': income.id, 'source_id': income.source_id, 'source': translate_source(income.source.name),
+                'quantity': income.quantity, 'unit_price': float(income.source.price), 'amount': float(income.amount),
+            }
+            for income in incomes
+        ],
+        'total_quantity': sum(income.quantity for income in incomes),
+        'total_amount': float(sum(income.amount for income in incomes)),
+    }
@@ -0,0 +1,137 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ReportJob
+from .latex import ReportRenderError
+from .pdf_reports import REPORT_KINDS, artifact_key, clean_params, data_version, render_report
+
+logger = logging.getLogger(__name__)
+
+MAX_ERROR_LENGTH = 4000
+
+_executor = ThreadPoolExecutor(max_workers=getattr(settings, 'REPORT_WORKERS', 2), thread_name_prefix='report-jobs')
+
+
+def _prepare(club, kind, params):
+    """Cleaned params, report data and artifact key of a request; raises ValueError for bad input."""
+    params = clean_params(kind, params)
+    data = REPORT_KINDS[kind]['build'](club, params)
+    return params, data, artifact_key(club.id, kind, params, data_version(data))
+
+
+def cached_artifact(club_id, cache_key):
+    """Latest finished job with this key whose file still exists, or None."""
+    job = (
+        ReportJob.objects.filter(club_id=club_id, cache_key=cache_key, status='done')
+        .exclude(file='').order_by('-finished_at').first()
+    )
+    if job and job.file.storage.exists(job.file.name):
+        return job
+    return None
+
+
+def _create_job(club, user, kind, params, cache_key):
+    return ReportJob.objects.create(
+        club=club, requested_by=user, kind=kind, params=params, cache_key=cache_key,
+        filename=REPORT_KINDS[kind]['filename'](params)
+    )
+
+
+def submit_report(club, user, kind, params):
+    """
+    Queue a report and return (job, cached). An unchanged report returns the finished job
+    of the earlier request; an identical report still being rendered returns that job.
+    """
+    params, data, cache_key = _prepare(club, kind, params)
+    cached = cached_artifact(club.id, cache_key)
+    if cached:
+        return cached, True
+    in_flight = ReportJob.objects.filter(club=club, cache_key=cache_key, status__in=['pending', 'running']).first()
+    if in_flight:
+        return in_flight, False
+    job = _create_job(club, user, kind, params, cache_key)
+    schedule_job(job.id, data)
+    return job, False
+
+
+def render_report_now(club, user, kind, params):
+    """Render in the current thread (for the old synchronous endpoints), reusing a cached artifact."""
+    params, data, cache_key = _prepare(club, kind, params)
+    cached = cached_artifact(club.id, cache_key)
+    if cached:
+        return cached
+    job = _create_job(club, user, kind, params, cache_key)
+    return run_job(job.id, data)
+
+
+def run_job(job_id, data=None):
+    """Render a pending job. Returns the job, or None if another worker already took it."""
+    claimed = ReportJob.objects.filter(id=job_id, status='pending').update(status='running', started_at=timezone.now())
+    if not claimed:
+        return None
+    job = ReportJob.objects.select_related('club').get(id=job_id)
+    try:
+        if data is None:
+            # البيانات ربما تغيرت منذ الطلب فنحدث المفتاح ليطابق محتوى الملف
+            data = REPORT_KINDS[job.kind]['build'](job.club, job.params)
+            job.cache_key = artifact_key(job.club_id, job.kind, job.params, data_version(data))
+        content = render_report(job.kind, data)
+    except (ReportRenderError, ValueError, OSError) as e:
+        logger.error(f"Report job {job.id} ({job.kind}) failed: {str(e)[:500]}")
+        job.status = 'failed'
+        job.error = str(e)[:MAX_ERROR_LENGTH]
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'cache_key', 'finished_at'])
+        return job
+
+    job.file.save(f"{job.club_id}/{job.cache_key}.pdf", ContentFile(content), save=False)
+    job.status = 'done'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['file', 'status', 'cache_key', 'finished_at'])
+    logger.info(f"Report job {job.id} ({job.kind}) rendered in {(job.finished_at - job.started_at).total_seconds():.1f}s")
+    return job
+
+
+def _run_in_background(job_id, data):
+    try:
+        run_job(job_id, data)
+    except Exception as e:
+        logger.error(f"Report job {job_id} crashed: {str(e)}", exc_info=True)
+        ReportJob.objects.filter(id=job_id, status='running').update(
+            status='failed', error=str(e)[:MAX_ERROR_LENGTH], finished_at=timezone.now()
+        )
+    finally:
+        connection.close()
+
+
+def schedule_job(job_id, data=None):
+    """Render the job on the worker pool after the current transaction commits."""
+    if getattr(settings, 'REPORT_JOBS_ASYNC', True):
+        transaction.on_commit(lambda: _executor.submit(_run_in_background, job_id, data))
+    else:
+        transaction.on_commit(lambda: run_job(job_id, data))
+
+
+def requeue_stale_jobs(minutes):
+    """Jobs left 'running' by a worker process that died go back to pending."""
+    cutoff = timezone.now() - timedelta(minutes=minutes)
+    return ReportJob.objects.filter(status='running', started_at__lt=cutoff).update(status='pending', started_at=None)
+
+
+def purge_jobs(days):
+    """Delete finished/failed jobs older than `days` together with their files."""
+    cutoff = timezone.now() - timedelta(days=days)
+    jobs = ReportJob.objects.filter(status__in=['done', 'failed'], created_at__lt=cutoff)
+    deleted = 0
+    for job in jobs.iterator():
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        deleted += 1
+    return deleted
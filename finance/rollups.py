@@ -0,0 +1,261 @@
+import logging
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Min, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from accounts.models import User
+from utils.convert_to_name import get_object_from_id_or_name
+from .models import Expense, ExpenseCategory, FinanceDailyRollup, Income, IncomeSource
+
+logger = logging.getLogger(__name__)
+
+# kind -> (model, حقل المصدر/الفئة, حقل الموظف)
+KINDS = {
+    'income': (Income, 'source', 'received_by'),
+    'expense': (Expense, 'category', 'paid_by'),
+}
+ROLLUP_FILTER_PARAMS = {'date', 'start_date', 'end_date', 'user', 'source', 'category'}
+# باراميترات لا تؤثر على الصفوف المجمعة
+NEUTRAL_PARAMS = {'details', 'page', 'page_size', 'period_type', 'format', 'diagnostics', 'trends'}
+DAY_FORMATS = ('%Y-%m-%d', '%d-%m-%Y')
+
+
+def kind_for(model):
+    return 'income' if model is Income else 'expense'
+
+
+def local_day(value):
+    if timezone.is_aware(value):
+        return timezone.localdate(value)
+    return value.date()
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _bucket(instance, kind):
+    _, group_field, employee_field = KINDS[kind]
+    return {
+        'club_id': instance.club_id,
+        'day': local_day(instance.date),
+        'kind': kind,
+        'source_id': instance.source_id if kind == 'income' else None,
+        'category_id': instance.category_id if kind == 'expense' else None,
+        'payment_method_id': instance.payment_method_id if kind == 'income' else None,
+        'employee_id': getattr(instance, f'{employee_field}_id'),
+    }
+
+
+def _apply_delta(bucket, total, count, quantity):
+    """Add (or subtract, with negative values) totals to one row of the bucket."""
+    rows = FinanceDailyRollup.objects.filter(**bucket)
+    target = rows if count > 0 else rows.filter(count__gte=-count, quantity__gte=-quantity)
+    # صف واحد فقط: لو وجد صفان لنفس المجموعة (إنشاء متزامن) لا نضيف الفرق مرتين
+    updated = FinanceDailyRollup.objects.filter(pk__in=target.values('pk')[:1]).update(
+        total=F('total') + total, count=F('count') + count, quantity=F('quantity') + quantity
+    )
+    if count > 0 and not updated:
+        # لو أنشأ طلبان نفس الصف معا تبقى المجاميع صحيحة لأن القراءة دائما Sum
+        FinanceDailyRollup.objects.create(total=total, count=count, quantity=quantity, **bucket)
+    elif count < 0:
+        if not updated:
+            logger.warning(f"Rollup bucket {bucket} is missing the rows being removed; run rebuild_finance_rollups")
+        else:
+            rows.filter(count=0).delete()
+
+
+def apply_to_rollup(instances, sign=1):
+    """
+    Add (sign=1) or remove (sign=-1) incomes/expenses from their buckets with one
+    UPDATE per bucket, so a save or a bulk insert never re-aggregates the whole day.
+    """
+    deltas = {}
+    for instance in instances:
+        kind = kind_for(type(instance))
+        bucket = _bucket(instance, kind)
+        key = tuple(sorted(bucket.items()))
+        total, count, quantity = deltas.get(key, (0, 0, 0))
+        deltas[key] = (
+            total + instance.amount,
+            count + 1,
+            quantity + ((instance.quantity or 0) if kind == 'income' else 0),
+        )
+    with transaction.atomic():
+        for key, (total, count, quantity) in deltas.items():
+            _apply_delta(dict(key), sign * total, sign * count, sign * quantity)
+
+
+def add_to_rollup(instance):
+    """Add a newly created income/expense to its bucket (update in place, create if missing)."""
+    apply_to_rollup([instance])
+
+
+def remove_from_rollup(instance):
+    """Remove a deleted income/expense (or the stored version of an edited one) from its bucket."""
+    apply_to_rollup([instance], sign=-1)
+
+
+def rebuild_range(club_id, kind, start_day, end_day):
+    """Recompute the rollup rows of one club and kind for start_day..end_day from the raw rows."""
+    model, group_field, employee_field = KINDS[kind]
+    aggregates = {'total': Sum('amount'), 'count': Count('id')}
+    group_by = ['rollup_day', f'{group_field}_id', f'{employee_field}_id']
+    if kind == 'income':
+        aggregates['quantity'] = Sum('quantity')
+        group_by.append('payment_method_id')
+
+    rows = (
+        model.objects.filter(club_id=club_id, date__gte=day_start(start_day), date__lt=day_start(end_day + timedelta(days=1)))
+        .annotate(rollup_day=TruncDate('date'))
+        .values(*group_by)
+        .annotate(**aggregates)
+        .order_by()
+    )
+    buckets = [
+        FinanceDailyRollup(
+            club_id=club_id,
+            day=row['rollup_day'],
+            kind=kind,
+            source_id=row.get('source_id'),
+            category_id=row.get('category_id'),
+            payment_method_id=row.get('payment_method_id'),
+            employee_id=row[f'{employee_field}_id'],
+            total=row['total'] or 0,
+            count=row['count'],
+            quantity=row.get('quantity') or 0,
+        )
+        for row in rows
+    ]
+    with transaction.atomic():
+        FinanceDailyRollup.objects.filter(club_id=club_id, kind=kind, day__gte=start_day, day__lte=end_day).delete()
+        FinanceDailyRollup.objects.bulk_create(buckets, batch_size=1000)
+    return len(buckets)
+
+
+def rebuild_club(club_id, chunk_days=31):
+    """Rebuild every rollup row of a club, one month-sized window at a time."""
+    created = 0
+    for kind, (model, _, _) in KINDS.items():
+        bounds = model.objects.filter(club_id=club_id).aggregate(first=Min('date'), last=Max('date'))
+        FinanceDailyRollup.objects.filter(club_id=club_id, kind=kind).delete()
+        if not bounds['first']:
+            continue
+        start, last = local_day(bounds['first']), local_day(bounds['last'])
+        while start <= last:
+            end = min(start + timedelta(days=chunk_days - 1), last)
+            created += rebuild_range(club_id, kind, start, end)
+            start = end + timedelta(days=1)
+    return created
+
+
+def rollup_totals(queryset):
+    """Summed total/count/quantity of rollup rows."""
+    totals = queryset.aggregate(total=Sum('total'), count=Sum('count'), quantity=Sum('quantity'))
+    return {key: value or 0 for key, value in totals.items()}
+
+
+def _parse_day(value):
+    value = value.split('+')[0].split('%2B')[0]
+    for fmt in DAY_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+# rollup_filters: الطلب يطابق صفوف لا شيء
+NO_ROWS = object()
+
+
+def rollup_filters(request, kind, extra_params=()):
+    """
+    Field lookups (day range, employee, source, category) for the request's finance filters.
+    None when the request uses a filter the rollup can't answer (time of day, amount,
+    description, shift...); NO_ROWS when nothing can match.
+    """
+    params = request.query_params
+    allowed = ROLLUP_FILTER_PARAMS | NEUTRAL_PARAMS | set(extra_params)
+    if any(params.get(name) for name in params if name not in allowed):
+        return None
+
+    filters = {}
+    if params.get('date'):
+        if params.get('start_date') or params.get('end_date'):
+            return None
+        day = _parse_day(params['date'])
+        if not day:
+            return None
+        filters['day'] = day
+    elif params.get('start_date') or params.get('end_date'):
+        start_day = _parse_day(params.get('start_date') or '')
+        end_day = _parse_day(params.get('end_date') or '')
+        if not start_day or not end_day or start_day > end_day:
+            return None
+        filters['day__gte'] = start_day
+        filters['day__lte'] = end_day
+
+    if params.get('user'):
+        user_obj = get_object_from_id_or_name(User, params.get('user'), ['id'])
+        if not user_obj or user_obj.club != request.user.club:
+            return NO_ROWS
+        if request.user.role not in ['owner', 'admin'] and user_obj != request.user:
+            return NO_ROWS
+        filters['employee'] = user_obj
+
+    if kind == 'income' and params.get('source'):
+        source_obj = get_object_from_id_or_name(IncomeSource, params.get('source'), ['id', 'name'])
+        if not source_obj or source_obj.club != request.user.club:
+            return None
+        filters['source'] = source_obj
+    if kind == 'expense' and params.get('category'):
+        category_obj = get_object_from_id_or_name(ExpenseCategory, params.get('category'), ['id', 'name'])
+        if not category_obj or category_obj.club != request.user.club:
+            return None
+        filters['category'] = category_obj
+    return filters
+
+
+def rollup_for_request(request, kind, extra_params=()):
+    """
+    Rollup rows matching the request's finance filters, or None when the request uses a
+    filter the rollup can't answer so the caller falls back to the raw rows.
+    """
+    filters = rollup_filters(request, kind, extra_params)
+    if filters is None:
+        return None
+    queryset = FinanceDailyRollup.objects.filter(club=request.user.club, kind=kind)
+    if filters is NO_ROWS:
+        return queryset.none()
+    return queryset.filter(**filters)
+
+
+def whole_day_range(start, end):
+    """(first_day, last_day) if start..end covers whole local days, else None."""
+    start, end = timezone.localtime(start), timezone.localtime(end)
+    if start.time() != time.min or end.time().replace(microsecond=0) != time(23, 59, 59):
+        return None
+    if start.date() > end.date():
+        return None
+    return start.date(), end.date()
+
+
+def range_days(club_id, start, end):
+    """
+    (first_day, last_day) of rollup days giving the same rows as date__range=[start, end],
+    else None. A range ending at local midnight covers the days before it plus that one
+    instant, so it qualifies only while no income/expense sits exactly on the instant.
+    """
+    days = whole_day_range(start, end)
+    if days:
+        return days
+    start, end = timezone.localtime(start), timezone.localtime(end)
+    if start.time() != time.min or end.time() != time.min or start.date() >= end.date():
+        return None
+    if any(model.objects.filter(club_id=club_id, date=end).exists() for model, _, _ in KINDS.values()):
+        return None
+    return start.date(), end.date() - timedelta(days=1)
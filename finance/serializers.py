@@ -90,8 +90,11 @@ class IncomeSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'club', 'club_details', 'source', 'source_details',
             'amount', 'description', 'date', 'received_by', 'received_by_details',
-            'stock_transaction', 'stock_transaction_details', 'quantity', 'payment_method_name'
+            'stock_transaction', 'stock_transaction_details', 'quantity', 'payment_method', 'payment_method_name'
         ]
+        extra_kwargs = {
+            'payment_method': {'required': False, 'allow_null': True},
+        }
 
     def get_stock_transaction_details(self, obj):
         if obj.stock_transaction:
@@ -113,6 +116,16 @@ class IncomeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('لا يمكن تسجيل إيراد في المستقبل.')
         return value
 
+    def validate(self, attrs):
+        # طريقة الدفع والمصدر يجب أن يتبعا نادي الإيراد (الحقول تقبل أي معرف)
+        club = attrs.get('club') or getattr(self.instance, 'club', None)
+        if club:
+            for field, message in (('payment_method', 'طريقة الدفع لا تتبع هذا النادي.'), ('source', 'مصدر الإيراد لا يتبع هذا النادي.')):
+                value = attrs.get(field)
+                if value is not None and value.club_id != club.id:
+                    raise serializers.ValidationError({field: message})
+        return attrs
+
 class StockItemSerializer(serializers.ModelSerializer):
     club_details = ClubSerializer(source='club', read_only=True)
 
@@ -146,7 +159,7 @@ class IncomeSummarySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Income
-        fields = ['id', 'amount', 'date', 'source', 'source_name', 'received_by', 'received_by_name', 'payment_method_name']
+        fields = ['id', 'amount', 'date', 'source', 'source_name', 'received_by', 'received_by_name', 'payment_method', 'payment_method_name']
 
 class ExpenseDetailSerializer(serializers.ModelSerializer):
     date = serializers.DateTimeField(format='%Y-%m-%d %H:%M:%S')
@@ -163,7 +176,7 @@ class IncomeDetailSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Income
-        fields = ['id', 'amount', 'date', 'source_name']
+        fields = ['id', 'amount', 'date', 'source', 'source_name']
 
 class ScheduleSerializer(serializers.ModelSerializer):
     start = serializers.DateTimeField(format='%Y-%m-%d %H:%M:%S', input_formats=['%Y-%m-%d %H:%M:%S', 'iso8601'])
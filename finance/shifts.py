@@ -0,0 +1,160 @@
+import logging
+from decimal import Decimal
+
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from staff.models import StaffAttendance
+from .labels import translate_payment_method
+from .models import Expense, Income, ShiftFinanceSnapshot
+
+logger = logging.getLogger(__name__)
+
+
+def shift_totals(staff_id, start, end):
+    """Income totals by payment method and expense totals by category of one staff member in start..end (2 queries)."""
+    incomes = (
+        Income.objects.filter(received_by_id=staff_id, date__range=[start, end])
+        .values('payment_method_id', 'payment_method__name')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by('payment_method__name')
+    )
+    expenses = (
+        Expense.objects.filter(paid_by_id=staff_id, date__range=[start, end])
+        .values('category_id', 'category__name')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by('category__name')
+    )
+    payment_methods = [
+        {
+            'payment_method_id': row['payment_method_id'],
+            'name': row['payment_method__name'],
+            'total': row['total'] or Decimal('0.0'),
+            'count': row['count'],
+        }
+        for row in incomes
+    ]
+    expense_categories = [
+        {
+            'category_id': row['category_id'],
+            'name': row['category__name'],
+            'total': row['total'] or Decimal('0.0'),
+            'count': row['count'],
+        }
+        for row in expenses
+    ]
+    return {
+        'total_income': sum((row['total'] for row in payment_methods), Decimal('0.0')),
+        'total_expense': sum((row['total'] for row in expense_categories), Decimal('0.0')),
+        'income_count': sum(row['count'] for row in payment_methods),
+        'expense_count': sum(row['count'] for row in expense_categories),
+        'payment_methods': payment_methods,
+        'expense_categories': expense_categories,
+    }
+
+
+def _serialize_rows(rows):
+    return [{**row, 'total': str(row['total'])} for row in rows]
+
+
+def _snapshot_totals(snapshot):
+    return {
+        'total_income': snapshot.total_income,
+        'total_expense': snapshot.total_expense,
+        'income_count': snapshot.income_count,
+        'expense_count': snapshot.expense_count,
+        'payment_methods': [{**row, 'total': Decimal(row['total'])} for row in snapshot.payment_methods],
+        'expense_categories': [{**row, 'total': Decimal(row['total'])} for row in snapshot.expense_categories],
+    }
+
+
+def snapshot_shift(attendance):
+    """
+    Store (or recompute) the financial snapshot of a closed shift. An open shift has no
+    snapshot: a stored one is removed and None is returned.
+    """
+    if attendance.check_out is None:
+        ShiftFinanceSnapshot.objects.filter(attendance_id=attendance.id).delete()
+        return None
+
+    totals = shift_totals(attendance.staff_id, attendance.check_in, attendance.check_out)
+    values = {
+        'club_id': attendance.club_id,
+        'staff_id': attendance.staff_id,
+        'check_in': attendance.check_in,
+        'check_out': attendance.check_out,
+        'total_income': totals['total_income'],
+        'total_expense': totals['total_expense'],
+        'income_count': totals['income_count'],
+        'expense_count': totals['expense_count'],
+        'payment_methods': _serialize_rows(totals['payment_methods']),
+        'expense_categories': _serialize_rows(totals['expense_categories']),
+    }
+    try:
+        with transaction.atomic():
+            snapshot, _ = ShiftFinanceSnapshot.objects.update_or_create(attendance_id=attendance.id, defaults=values)
+            return snapshot
+    except IntegrityError:
+        # أغلق طلب آخر نفس الشيفت في نفس اللحظة بنفس الصفوف
+        return ShiftFinanceSnapshot.objects.get(attendance_id=attendance.id)
+
+
+def close_shift_snapshot(attendance):
+    """snapshot_shift for the check-out endpoints: a failure is logged, the report computes it live."""
+    try:
+        return snapshot_shift(attendance)
+    except DatabaseError as e:
+        logger.error(f"Could not snapshot shift {attendance.id}: {str(e)}", exc_info=True)
+        return None
+
+
+def refresh_shift_snapshots(staff_id, moment):
+    """Recompute the stored snapshots of the staff member's closed shifts that include moment."""
+    if not staff_id or moment is None:
+        return 0
+    shifts = StaffAttendance.objects.filter(
+        staff_id=staff_id, check_in__lte=moment, check_out__gte=moment, finance_snapshot__isnull=False
+    )
+    refreshed = 0
+    for attendance in shifts:
+        snapshot_shift(attendance)
+        refreshed += 1
+    return refreshed
+
+
+def shift_finance_totals(attendances):
+    """
+    Totals of each attendance keyed by id, without writing anything. Closed shifts read their
+    snapshot; open shifts (up to the current time) and closed shifts without one yet
+    (snapshot_shifts command) are computed from the raw rows.
+    Select `finance_snapshot` on the attendances to avoid a query per shift.
+    """
+    now = timezone.now()
+    results = {}
+    for attendance in attendances:
+        if attendance.check_out is None:
+            results[attendance.id] = shift_totals(attendance.staff_id, attendance.check_in, now)
+            continue
+        try:
+            results[attendance.id] = _snapshot_totals(attendance.finance_snapshot)
+        except ShiftFinanceSnapshot.DoesNotExist:
+            results[attendance.id] = shift_totals(attendance.staff_id, attendance.check_in, attendance.check_out)
+    return results
+
+
+def payment_method_breakdown(totals):
+    """Per payment method income, proportional share of the shift's expenses and net profit."""
+    total_income = totals['total_income']
+    total_expense = totals['total_expense']
+    breakdown = []
+    for row in totals['payment_methods']:
+        method_income = row['total']
+        method_expense = (method_income / total_income * total_expense) if total_income > 0 else Decimal('0.0')
+        breakdown.append({
+            'payment_method': translate_payment_method(row['name']),
+            'total_income': float(method_income),
+            'total_expense': float(method_expense),
+            'net_profit': float(method_income - method_expense),
+        })
+    return breakdown
@@ -0,0 +1,121 @@
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+from staff.models import StaffAttendance
+from subscriptions.models import PaymentMethod
+from .labels import invalidate_labels
+from .models import Expense, Income, IncomeSource, ShiftFinanceSnapshot, StockItem, StockTransaction
+from .periods import check_open
+from .rollups import add_to_rollup, remove_from_rollup
+from .shifts import refresh_shift_snapshots, snapshot_shift
+from .valuation import invalidate_valuation
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(pre_save, sender=Income)
+@receiver(pre_save, sender=Expense)
+def remember_rollup_bucket(sender, instance, raw=False, **kwargs):
+    """Remember the stored version of an edited row so its old totals leave the rollup."""
+    instance._rollup_previous = None
+    if raw or not instance.pk:
+        return
+    instance._rollup_previous = sender.objects.filter(pk=instance.pk).first()
+
+
+@receiver(pre_save, sender=Income)
+@receiver(pre_save, sender=Expense)
+def protect_closed_period_save(sender, instance, raw=False, **kwargs):
+    """Incomes/expenses of a closed month can't be added, edited or moved out of it."""
+    if raw:
+        return
+    check_open(instance.club_id, instance.date)
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous:
+        check_open(previous.club_id, previous.date)
+
+
+@receiver(pre_delete, sender=Income)
+@receiver(pre_delete, sender=Expense)
+def protect_closed_period_delete(sender, instance, **kwargs):
+    check_open(instance.club_id, instance.date)
+
+
+@receiver(post_save, sender=Income)
+@receiver(post_save, sender=Expense)
+def update_rollup(sender, instance, created, raw=False, **kwargs):
+    """Keep FinanceDailyRollup current for the saved income/expense."""
+    if raw:
+        return
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous is not None:
+        remove_from_rollup(previous)
+    add_to_rollup(instance)
+
+
+@receiver(post_delete, sender=Income)
+@receiver(post_delete, sender=Expense)
+def rollup_row_deleted(sender, instance, **kwargs):
+    remove_from_rollup(instance)
+
+
+def _shift_moments(instance):
+    employee_field = 'received_by_id' if isinstance(instance, Income) else 'paid_by_id'
+    return {(getattr(instance, employee_field), instance.date)}
+
+
+@receiver(post_save, sender=Income)
+@receiver(post_save, sender=Expense)
+def update_shift_snapshots(sender, instance, raw=False, **kwargs):
+    """Recompute the snapshots of closed shifts the saved row falls in (before and after an edit)."""
+    if raw:
+        return
+    moments = _shift_moments(instance)
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous is not None:
+        moments |= _shift_moments(previous)
+    for staff_id, moment in moments:
+        refresh_shift_snapshots(staff_id, moment)
+
+
+@receiver(post_delete, sender=Income)
+@receiver(post_delete, sender=Expense)
+def shift_row_deleted(sender, instance, **kwargs):
+    for staff_id, moment in _shift_moments(instance):
+        refresh_shift_snapshots(staff_id, moment)
+
+
+@receiver(post_save, sender=StaffAttendance)
+def shift_times_changed(sender, instance, created, raw=False, **kwargs):
+    """Recompute (or drop, if reopened) a stored snapshot when the shift's staff or times are edited."""
+    if raw or created:
+        return
+    stored = ShiftFinanceSnapshot.objects.filter(attendance_id=instance.id).values_list(
+        'staff_id', 'check_in', 'check_out'
+    ).first()
+    if stored and stored != (instance.staff_id, instance.check_in, instance.check_out):
+        snapshot_shift(instance)
+
+
+@receiver(post_save, sender=IncomeSource)
+@receiver(post_delete, sender=IncomeSource)
+@receiver(post_save, sender=PaymentMethod)
+@receiver(post_delete, sender=PaymentMethod)
+def label_changed(sender, instance, raw=False, **kwargs):
+    invalidate_labels(instance.club_id)
+
+
+@receiver(post_save, sender=StockItem)
+@receiver(post_delete, sender=StockItem)
+def stock_item_changed(sender, instance, raw=False, **kwargs):
+    invalidate_valuation(instance.club_id)
+
+
+@receiver(post_save, sender=StockTransaction)
+@receiver(post_delete, sender=StockTransaction)
+def stock_movement_changed(sender, instance, raw=False, **kwargs):
+    try:
+        club_id = instance.stock_item.club_id
+    except StockItem.DoesNotExist:
+        return
+    invalidate_valuation(club_id)
@@ -0,0 +1,165 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, IntegerField, Sum, Value, When
+from django.db.models.functions import ExtractHour, TruncDate, TruncDay, TruncMonth, TruncWeek, TruncYear
+
+from .models import StockItem, StockTransaction
+from .valuation import invalidate_valuation
+
+
+def parse_inventory_counts(inventory):
+    """{stock_item_id: actual_quantity} from the [{stock_item_id, actual_quantity}] payload; raises ValueError."""
+    if not isinstance(inventory, list) or not inventory:
+        raise ValueError('قائمة الجرد مطلوبة')
+    counts = {}
+    for item in inventory:
+        stock_item_id = item.get('stock_item_id') if isinstance(item, dict) else None
+        actual_quantity = item.get('actual_quantity') if isinstance(item, dict) else None
+        if not stock_item_id or actual_quantity is None:
+            raise ValueError('معرف عنصر المخزون والكمية الفعلية مطلوبان')
+        try:
+            stock_item_id, actual_quantity = int(stock_item_id), int(actual_quantity)
+        except (TypeError, ValueError):
+            raise ValueError('معرف عنصر المخزون والكمية الفعلية يجب أن يكونا أرقاما صحيحة')
+        if actual_quantity < 0:
+            raise ValueError('الكمية الفعلية لا يمكن أن تكون سالبة')
+        if stock_item_id in counts:
+            raise ValueError(f'عنصر المخزون {stock_item_id} مكرر في الجرد')
+        counts[stock_item_id] = actual_quantity
+    return counts
+
+
+def reconcile_inventory(club, counts, user):
+    """
+    Apply a full inventory count: one adjustment transaction per item whose counted quantity
+    differs (bulk_create) and one UPDATE that sets every changed item to its counted quantity.
+    The items are locked while the count is applied. Raises StockItem.DoesNotExist for an
+    item outside the club. Returns the discrepancies.
+    """
+    with transaction.atomic():
+        items = list(
+            StockItem.objects.select_for_update().filter(club=club, id__in=counts)
+            .order_by('id').only('id', 'name', 'current_quantity')
+        )
+        if len(items) != len(counts):
+            raise StockItem.DoesNotExist('عنصر المخزون غير موجود')
+
+        adjustments = []
+        discrepancies = []
+        for stock_item in items:
+            expected_quantity = stock_item.current_quantity
+            actual_quantity = counts[stock_item.id]
+            difference = actual_quantity - expected_quantity
+            if difference == 0:
+                continue
+            quantity = abs(difference)
+            # bulk_create لا يستدعي save() فلا تطبق الحركة مرتين؛ الكمية تضبط بالتحديث التالي
+            adjustments.append(StockTransaction(
+                stock_item=stock_item, transaction_type='ADD' if difference > 0 else 'CONSUME', quantity=quantity,
+                description=f'تعديل الجرد اليومي: {"زيادة" if difference > 0 else "نقص"} بمقدار {quantity}',
+                created_by=user
+            ))
+            discrepancies.append({
+                'stock_item': stock_item.name, 'expected_quantity': expected_quantity,
+                'actual_quantity': actual_quantity, 'difference': difference
+            })
+
+        if adjustments:
+            StockTransaction.objects.bulk_create(adjustments)
+            changed = [adjustment.stock_item_id for adjustment in adjustments]
+            StockItem.objects.filter(id__in=changed).update(current_quantity=Case(
+                *[When(id=item_id, then=Value(counts[item_id])) for item_id in changed],
+                output_field=IntegerField()
+            ))
+            # bulk_create والتحديث لا يرسلان إشارات
+            transaction.on_commit(lambda: invalidate_valuation(club.id))
+    return discrepancies
+
+
+PERIOD_FUNCTIONS = {'daily': TruncDay, 'weekly': TruncWeek, 'monthly': TruncMonth, 'yearly': TruncYear}
+SALE_GAP_DAYS = 7
+
+
+def sales_status(avg_daily_sales):
+    if avg_daily_sales == 0:
+        return 'لا مبيعات'
+    if avg_daily_sales < 1:
+        return 'ضعيف (مبيعات نادرة)'
+    if avg_daily_sales < 5:
+        return 'متوسط (مبيعات متقلبة)'
+    return 'قوي (مبيعات مستمرة)'
+
+
+def sale_gaps(dates):
+    """Runs of more than SALE_GAP_DAYS days without a sale between consecutive sorted sale dates."""
+    return [
+        {'start_date': previous.isoformat(), 'end_date': current.isoformat(), 'gap_days': (current - previous).days}
+        for previous, current in zip(dates, dates[1:])
+        if (current - previous).days > SALE_GAP_DAYS
+    ]
+
+
+def sales_analysis(club, start_date, end_date, period_type, stock_item_id=None):
+    """
+    Sales of each stock item between start_date and end_date (local dates): totals, status,
+    breakdown by period and by hour of day (24 buckets) and gaps between sales. Three queries
+    whatever the number of items: the items, sales grouped by (item, period) and sales grouped
+    by (item, date, hour).
+    """
+    items = StockItem.objects.filter(club=club).order_by('id')
+    if stock_item_id:
+        items = items.filter(id=stock_item_id)
+    items = list(items.values_list('id', 'name'))
+
+    sales = StockTransaction.objects.filter(
+        stock_item_id__in=[item_id for item_id, _ in items], transaction_type='CONSUME', related_income__isnull=False,
+        date__date__range=[start_date, end_date]
+    )
+    by_period = defaultdict(list)
+    period_rows = (
+        sales.annotate(period=PERIOD_FUNCTIONS[period_type]('date')).values('stock_item_id', 'period')
+        .annotate(total_quantity=Sum('quantity'), total_revenue=Sum('related_income__amount'))
+        .order_by('stock_item_id', 'period')
+    )
+    for row in period_rows:
+        by_period[row['stock_item_id']].append(row)
+
+    by_day = defaultdict(list)
+    by_hour = defaultdict(lambda: [[0, Decimal('0')] for _ in range(24)])
+    day_rows = (
+        sales.annotate(day=TruncDate('date'), hour=ExtractHour('date')).values('stock_item_id', 'day', 'hour')
+        .annotate(total_quantity=Sum('quantity'), total_revenue=Sum('related_income__amount'))
+        .order_by('stock_item_id', 'day', 'hour')
+    )
+    for row in day_rows:
+        days = by_day[row['stock_item_id']]
+        if not days or days[-1] != row['day']:
+            days.append(row['day'])
+        bucket = by_hour[row['stock_item_id']][row['hour']]
+        bucket[0] += row['total_quantity']
+        bucket[1] += row['total_revenue'] or 0
+
+    days_in_period = (end_date - start_date).days + 1
+    analysis = []
+    for item_id, name in items:
+        periods = by_period[item_id]
+        total_quantity_sold = sum(row['total_quantity'] for row in periods)
+        total_revenue = sum((row['total_revenue'] or 0 for row in periods), Decimal('0'))
+        avg_daily_sales = total_quantity_sold / days_in_period if days_in_period > 0 else 0
+        analysis.append({
+            'stock_item_id': item_id, 'stock_item_name': name, 'total_quantity_sold': total_quantity_sold,
+            'total_revenue': float(total_revenue), 'sales_status': sales_status(avg_daily_sales),
+            'avg_daily_sales': float(avg_daily_sales),
+            'sales_by_period': [
+                {'period': row['period'].isoformat(), 'total_quantity': row['total_quantity'],
+                 'total_revenue': float(row['total_revenue'] or 0)} for row in periods
+            ],
+            'sales_by_hour': [
+                {'hour': f'{hour:02d}:00', 'total_quantity': quantity, 'total_revenue': float(revenue)}
+                for hour, (quantity, revenue) in enumerate(by_hour[item_id])
+            ],
+            'sale_gaps': sale_gaps(by_day[item_id]),
+        })
+    return analysis
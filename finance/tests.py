@@ -1,3 +1,738 @@
-from django.test import TestCase
+import importlib.util
+import json
+import os
+import tempfile
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from dateutil.relativedelta import relativedelta
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from accounts.models import User
+from core.models import Club
+from staff.models import StaffAttendance
+from subscriptions.models import PaymentMethod
+from utils.intervals import IntervalSet, merge_intervals
+from utils.reports import get_employee_report_data
+from .api import (
+    apply_common_filters, daily_summary_api, financial_analysis_api, income_api, income_detail_api, income_export_api,
+    pos_checkout_api, stock_inventory_api,
+)
+from .latex import FormatCache, ReportRenderError, compile_documents, split_document
+from .models import (
+    Expense, ExpenseCategory, FinanceDailyRollup, FinancePeriodClose, Income, IncomeSource, InsufficientStock,
+    ReportJob, ShiftFinanceSnapshot, StockItem, StockTransaction,
+)
+from .periods import ClosedPeriodError, closed_months
+from .pos import allocate
+from .report_jobs import render_report_now, submit_report
+from .rollups import rebuild_club
+from .shifts import close_shift_snapshot, shift_finance_totals
+from .stock import sales_analysis
+from .valuation import stock_valuation
+
+
+class FinanceTestMixin:
+    def setUp(self):
+        self.club = Club.objects.create(name='Club')
+        self.user = User.objects.create(username='owner', club=self.club, role='owner')
+        self.payment_method = PaymentMethod.objects.create(club=self.club, name='Cash', is_active=True)
+        self.factory = APIRequestFactory()
+
+    def call(self, view, method='get', data=None, **kwargs):
+        request = getattr(self.factory, method)('/', data or {}, format='json' if method != 'get' else None)
+        force_authenticate(request, user=self.user)
+        return view(request, **kwargs)
+
+
+class QueryDiagnosticsTests(FinanceTestMixin, TestCase):
+    def filtered(self, user=None, **params):
+        request = Request(self.factory.get('/', dict({'date': timezone.localdate().isoformat()}, **params)))
+        request.user = user or self.user
+        return apply_common_filters(Income.objects.filter(club=self.club), request, user_field='received_by', source_category_field='source')
+
+    def test_diagnostics_are_off_by_default(self):
+        with self.assertNumQueries(0), self.assertNoLogs('finance.diagnostics'):
+            self.filtered()
+        reception = User.objects.create(username='reception', club=self.club, role='reception')
+        with self.assertNumQueries(0), self.assertNoLogs('finance.diagnostics'):
+            self.filtered(user=reception, diagnostics='explain')
+
+    def test_diagnostics_on_request_or_for_configured_clubs(self):
+        with self.assertLogs('finance.diagnostics', 'INFO') as logs:
+            self.filtered(diagnostics='explain')
+        self.assertTrue(any('rows after filtering: 0' in line for line in logs.output))
+        self.assertTrue(any('query plan' in line for line in logs.output))
+
+        with override_settings(FINANCE_QUERY_DIAGNOSTICS=[self.club.id]), self.assertLogs('finance.diagnostics', 'INFO') as logs:
+            self.filtered()
+        self.assertFalse(any('query plan' in line for line in logs.output))
+
+
+class ClosedPeriodTests(FinanceTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.source = IncomeSource.objects.create(club=self.club, name='Bar', price=Decimal('10'))
+        self.month = timezone.localdate().replace(day=1) - relativedelta(months=1)
+        self.income = Income.objects.create(
+            club=self.club, source=self.source, amount=Decimal('10'), received_by=self.user,
+            payment_method=self.payment_method,
+            date=timezone.make_aware(datetime(self.month.year, self.month.month, 10, 12)),
+        )
+
+    def test_edit_rejected_after_close_by_another_process(self):
+        self.assertEqual(closed_months(self.club.id), set())
+        # إغلاق من عملية أخرى (أمر الإدارة) لا يمر بأي كاش في هذه العملية
+        FinancePeriodClose.objects.create(club=self.club, month=self.month)
+
+        self.income.amount = Decimal('20')
+        with self.assertRaises(ClosedPeriodError), transaction.atomic():
+            self.income.save()
+        with self.assertRaises(ClosedPeriodError), transaction.atomic():
+            self.income.delete()
+
+        response = self.call(income_detail_api, 'put', {'amount': '20'}, pk=self.income.id)
+        self.assertEqual(response.status_code, 400)
+        response = self.call(income_detail_api, 'delete', pk=self.income.id)
+        self.assertEqual(response.status_code, 400)
+        self.income.refresh_from_db()
+        self.assertEqual(self.income.amount, Decimal('10'))
+
+
+class IncomeUpdateTests(FinanceTestMixin, TestCase):
+    def test_payment_method_of_another_club_is_rejected(self):
+        source = IncomeSource.objects.create(club=self.club, name='Bar', price=Decimal('10'))
+        income = Income.objects.create(
+            club=self.club, source=source, amount=Decimal('10'), received_by=self.user,
+            payment_method=self.payment_method,
+        )
+        other_club = Club.objects.create(name='Other')
+        other_method = PaymentMethod.objects.create(club=other_club, name='Other Cash', is_active=True)
+        other_source = IncomeSource.objects.create(club=other_club, name='Gym', price=Decimal('10'))
+
+        response = self.call(income_detail_api, 'put', {'payment_method': other_method.id}, pk=income.id)
+        self.assertEqual(response.status_code, 400)
+        response = self.call(income_detail_api, 'put', {'source': other_source.id}, pk=income.id)
+        self.assertEqual(response.status_code, 400)
+        income.refresh_from_db()
+        self.assertEqual((income.payment_method_id, income.source_id), (self.payment_method.id, source.id))
+
+        response = self.call(income_detail_api, 'put', {'amount': '15'}, pk=income.id)
+        self.assertEqual(response.status_code, 200)
+
+
+@skipUnless(importlib.util.find_spec('numpy'), 'numpy is not installed')
+class FinancialTrendsTests(FinanceTestMixin, TestCase):
+    def test_forecast_income_without_expense_history(self):
+        source = IncomeSource.objects.create(club=self.club, name='Bar', price=Decimal('10'))
+        first = timezone.localdate().replace(day=1) - relativedelta(months=26)
+        for i in range(26):
+            month = first + relativedelta(months=i)
+            Income.objects.create(
+                club=self.club, source=source, amount=Decimal(1000 + 50 * i), received_by=self.user,
+                payment_method=self.payment_method,
+                date=timezone.make_aware(datetime(month.year, month.month, 15, 12)),
+            )
+
+        response = self.call(financial_analysis_api, data={'period_type': 'monthly', 'trends': 'true'})
+        self.assertEqual(response.status_code, 200)
+        forecast = response.data['trends']['forecast']
+        self.assertIsNotNone(forecast['method']['income'])
+        self.assertIsNone(forecast['method']['expense'])
+        for period in forecast['periods']:
+            self.assertGreater(period['income'], 0)
+            self.assertIsNone(period['expense'])
+            self.assertIsNone(period['net'])
+
+
+class RollupTests(FinanceTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.sources = [
+            IncomeSource.objects.create(club=self.club, name=name, price=Decimal('10')) for name in ('Bar', 'Gym')
+        ]
+        self.category = ExpenseCategory.objects.create(club=self.club, name='Rent')
+
+    def rollup(self):
+        return sorted(FinanceDailyRollup.objects.values_list(
+            'day', 'kind', 'source_id', 'category_id', 'payment_method_id', 'employee_id', 'total', 'count', 'quantity',
+        ))
+
+    def assertMatchesRebuild(self):
+        kept = self.rollup()
+        rebuild_club(self.club.id)
+        self.assertEqual(kept, self.rollup())
+
+    def test_edits_and_deletes_apply_deltas(self):
+        now = timezone.now()
+        incomes = [
+            Income.objects.create(
+                club=self.club, source=self.sources[i % 2], amount=Decimal(10 * (i + 1)), quantity=i + 1,
+                received_by=self.user, payment_method=self.payment_method, date=now,
+            )
+            for i in range(3)
+        ]
+        expense = Expense.objects.create(club=self.club, category=self.category, amount=Decimal('50'), paid_by=self.user)
+        self.assertMatchesRebuild()
+
+        incomes[0].amount, incomes[0].quantity = Decimal('15'), 4
+        incomes[0].save()
+        incomes[1].source = self.sources[0]
+        incomes[1].save()
+        incomes[2].date = now - relativedelta(days=2)
+        incomes[2].save()
+        expense.amount = Decimal('70')
+        expense.save()
+        self.assertMatchesRebuild()
+
+        incomes[0].delete()
+        expense.delete()
+        self.assertMatchesRebuild()
+        self.assertEqual(FinanceDailyRollup.objects.filter(kind='expense').count(), 0)
+
+    def test_update_touches_only_the_changed_buckets(self):
+        income = Income.objects.create(
+            club=self.club, source=self.sources[0], amount=Decimal('10'), received_by=self.user,
+            payment_method=self.payment_method,
+        )
+        income.amount = Decimal('25')
+        with mock.patch('finance.rollups.rebuild_range') as rebuild:
+            income.save()
+        rebuild.assert_not_called()
+        self.assertEqual(self.rollup()[0][6:], (Decimal('25'), 1, 1))
+
+    def test_financial_analysis_keeps_the_datetime_range(self):
+        start, end = timezone.localdate() - timedelta(days=10), timezone.localdate() - timedelta(days=5)
+
+        def income(day, at, amount):
+            Income.objects.create(
+                club=self.club, source=self.sources[0], amount=Decimal(amount), received_by=self.user,
+                payment_method=self.payment_method, date=timezone.make_aware(datetime.combine(day, at)),
+            )
+
+        def total_income():
+            response = self.call(financial_analysis_api, data={
+                'period_type': 'daily', 'start_date': start.isoformat(), 'end_date': end.isoformat(),
+            })
+            self.assertEqual(response.status_code, 200)
+            return response.data['financial_position']['total_income']
+
+        income(start, time(12), 10)
+        income(end, time(12), 20)
+        # المدة تنتهي عند بداية يوم النهاية: إيراد ظهر يوم النهاية خارجها
+        self.assertEqual(total_income(), 10.0)
+        income(end, time.min, 5)
+        self.assertEqual(total_income(), 15.0)
+
+    def test_pos_checkout_adds_to_rollup(self):
+        Income.objects.create(
+            club=self.club, source=self.sources[0], amount=Decimal('10'), received_by=self.user,
+            payment_method=self.payment_method,
+        )
+        response = self.call(pos_checkout_api, 'post', {
+            'payment_method': self.payment_method.id,
+            'items': [{'source': self.sources[0].id, 'quantity': 2}, {'source': self.sources[1].id, 'quantity': 1}],
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            sorted((row[2], row[6], row[7], row[8]) for row in self.rollup()),
+            [(self.sources[0].id, Decimal('30'), 2, 3), (self.sources[1].id, Decimal('10'), 1, 1)],
+        )
+        self.assertMatchesRebuild()
+
+
+class DailySummaryTests(FinanceTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.source = IncomeSource.objects.create(club=self.club, name='Subscription', price=Decimal('10'))
+        self.category = ExpenseCategory.objects.create(club=self.club, name='Rent')
+        self.day = timezone.localdate()
+
+    def add_employee(self, username, incomes, expenses):
+        employee = User.objects.create(username=username, club=self.club, role='reception')
+        for amount in incomes:
+            Income.objects.create(
+                club=self.club, source=self.source, amount=Decimal(amount), received_by=employee,
+                payment_method=self.payment_method,
+            )
+        for amount in expenses:
+            Expense.objects.create(club=self.club, category=self.category, amount=Decimal(amount), paid_by=employee)
+        return employee
+
+    def summary(self, **params):
+        return self.call(daily_summary_api, data=dict({'date': self.day.isoformat()}, **params))
+
+    def test_totals_and_breakdowns_per_employee(self):
+        self.add_employee('reception1', ['30', '20'], ['15'])
+        self.add_employee('reception2', ['40'], [])
+
+        response = self.summary()
+        self.assertEqual(response.status_code, 200)
+        rows = {row['employee_name']: row for row in response.data['results']}
+        self.assertEqual(set(rows), {'owner', 'reception1', 'reception2'})
+        first = rows['reception1']
+        self.assertEqual((first['total_incomes'], first['total_expenses'], first['net']), (50.0, 15.0, 35.0))
+        self.assertEqual(first['incomes_by_source'], {'اشتراك': 50.0})
+        self.assertEqual(first['expenses_by_category'], {'Rent': 15.0})
+        self.assertEqual((len(first['incomes']), len(first['expenses'])), (2, 1))
+        self.assertEqual(rows['reception2']['net'], 40.0)
+        self.assertEqual(rows['owner']['incomes'], [])
+
+        response = self.summary(username='reception2')
+        self.assertEqual([row['employee_name'] for row in response.data['results']], ['reception2'])
+
+    def test_query_count_does_not_grow_with_employees(self):
+        self.add_employee('reception1', ['30'], ['15'])
+        self.summary()
+        with CaptureQueriesContext(connection) as few:
+            self.summary()
+        for i in range(2, 6):
+            self.add_employee(f'reception{i}', ['10', '20'], ['5'])
+        with CaptureQueriesContext(connection) as many:
+            response = self.summary()
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertEqual(len(many), len(few))
+
+    def test_invalid_filters(self):
+        self.assertEqual(self.call(daily_summary_api).status_code, 400)
+        self.assertEqual(self.summary(date='19-10-2026').status_code, 400)
+        self.assertEqual(self.summary(username='missing').status_code, 404)
+
+
+class EmployeeReportTests(FinanceTestMixin, TestCase):
+    def test_merge_intervals_and_membership(self):
+        self.assertEqual(merge_intervals([(5, 7), (1, 3), (3, 4), (2, 2), (9, 8)]), [(1, 4), (5, 7)])
+        windows = IntervalSet([(10, 20), (1, 5), (15, 25)])
+        self.assertEqual(windows.intervals, [(1, 5), (10, 25)])
+        self.assertEqual(windows.bounds, (1, 25))
+        self.assertEqual([value in windows for value in (0, 1, 5, 7, 10, 25, 26)], [False, True, True, False, True, True, False])
+        self.assertIsNone(IntervalSet([]).bounds)
+
+    def test_reception_report_counts_only_shift_rows(self):
+        reception = User.objects.create(username='reception', club=self.club, role='reception')
+        source = IncomeSource.objects.create(club=self.club, name='Bar', price=Decimal('10'))
+        base = timezone.make_aware(datetime(2025, 3, 1, 8))
+        # شيفتان متداخلان (8-12 و 10-14) ثم شيفت منفصل 18-20
+        for start, end in ((0, 4), (2, 6), (10, 12)):
+            StaffAttendance.objects.create(
+                staff=reception, club=self.club, check_in=base + timedelta(hours=start), check_out=base + timedelta(hours=end),
+            )
+        for hours, amount in ((1, '10'), (5, '20'), (8, '40'), (11, '80'), (13, '160')):
+            Income.objects.create(
+                club=self.club, source=source, amount=Decimal(amount), received_by=reception,
+                payment_method=self.payment_method, date=base + timedelta(hours=hours),
+            )
+
+        data, status_code = get_employee_report_data(
+            reception, start_date='2025-03-01T00:00:00', end_date='2025-03-02T00:00:00',
+        )
+        self.assertEqual(status_code, 200)
+        self.assertEqual(data['total_income'], 110.0)
+
+        data, status_code = get_employee_report_data(
+            reception, start_date='2025-03-02T00:00:00', end_date='2025-03-03T00:00:00',
+        )
+        self.assertEqual(status_code, 404)
+
+
+@override_settings(REPORT_JOBS_ASYNC=False)
+class ReportJobTests(FinanceTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.render = self.enterContext(mock.patch('finance.report_jobs.render_report', return_value=b'%PDF-1.4'))
+        self.item = StockItem.objects.create(club=self.club, name='Water', current_quantity=5)
+
+    def test_unchanged_report_reuses_the_artifact(self):
+        first = render_report_now(self.club, self.user, 'inventory', {})
+        self.assertEqual(first.status, 'done')
+        second = render_report_now(self.club, self.user, 'inventory', {'unused': '1'})
+        self.assertEqual(second.id, first.id)
+        self.assertEqual(self.render.call_count, 1)
+
+        self.item.current_quantity = 4
+        self.item.save()
+        third = render_report_now(self.club, self.user, 'inventory', {})
+        self.assertNotEqual(third.id, first.id)
+        self.assertEqual(self.render.call_count, 2)
+
+    def test_identical_request_joins_the_job_in_flight(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            job, cached = submit_report(self.club, self.user, 'inventory', {})
+            self.assertFalse(cached)
+            again, cached = submit_report(self.club, self.user, 'inventory', {})
+            self.assertEqual((again.id, cached), (job.id, False))
+        self.assertEqual(ReportJob.objects.count(), 1)
+
+        done, cached = submit_report(self.club, self.user, 'inventory', {})
+        self.assertEqual((done.id, done.status, cached), (job.id, 'done', True))
+        self.assertEqual(self.render.call_count, 1)
+
+
+class LatexBatchTests(TestCase):
+    PREAMBLE = '\\documentclass{article}\n'
+
+    def setUp(self):
+        workspace = tempfile.TemporaryDirectory()
+        self.addCleanup(workspace.cleanup)
+        self.enterContext(override_settings(REPORT_LATEX_WORKDIR=workspace.name))
+        self.enterContext(mock.patch('finance.latex.format_cache', FormatCache()))
+        self.calls = []
+        self.enterContext(mock.patch('finance.latex._run', side_effect=self.fake_latex))
+        self.fail_format = False
+
+    def fake_latex(self, args, cwd, env):
+        """Writes what pdflatex would: the .fmt in ini mode, otherwise a pdf holding the source."""
+        with open(os.path.join(cwd, args[-1]), encoding='utf-8') as f:
+            source = f.read()
+        self.calls.append((args, source))
+        if '-ini' in args:
+            if self.fail_format:
+                raise ReportRenderError('! fmt')
+            name = next(arg for arg in args if arg.startswith('-jobname=')).split('=', 1)[1]
+            open(os.path.join(cwd, f'{name}.fmt'), 'w').close()
+        else:
+            with open(os.path.join(cwd, 'report.pdf'), 'wb') as f:
+                f.write(source.encode('utf-8'))
+
+    def document(self, body, preamble=PREAMBLE):
+        return f'{preamble}\\begin{{document}}{body}\\end{{document}}\n'
+
+    def test_split_document(self):
+        self.assertEqual(split_document(self.document('A')), (self.PREAMBLE, 'A'))
+        with self.assertRaises(ReportRenderError):
+            split_document('no document here')
+
+    def test_batch_compiles_once_with_the_cached_format(self):
+        pdf = compile_documents([self.document('A'), self.document('B')]).decode('utf-8')
+        self.assertEqual(pdf, '\\begin{document}A\n\\clearpage\nB\\end{document}\n')
+        self.assertEqual(['-ini' in args for args, _ in self.calls], [True, False])
+        self.assertTrue(any(arg.startswith('-fmt=report-') for arg in self.calls[1][0]))
+
+        compile_documents([self.document('C')])
+        self.assertEqual(len(self.calls), 3)
+        with self.assertRaises(ReportRenderError):
+            compile_documents([self.document('A'), self.document('B', preamble='\\documentclass{report}\n')])
+
+    def test_failed_format_falls_back_to_the_full_source(self):
+        self.fail_format = True
+        with self.assertLogs('finance.latex', 'WARNING'):
+            pdf = compile_documents([self.document('A')]).decode('utf-8')
+        self.assertTrue(pdf.startswith(self.PREAMBLE))
+        compile_documents([self.document('B')])
+        # الصيغة الفاشلة لا يعاد بناؤها مع كل تقرير
+        self.assertEqual(['-ini' in args for args, _ in self.calls], [True, False, False])
+
+
+class ShiftSnapshotTests(FinanceTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.source = IncomeSource.objects.create(club=self.club, name='Bar', price=Decimal('10'))
+        self.check_in = timezone.now() - timedelta(hours=10)
+        self.shift = StaffAttendance.objects.create(
+            staff=self.user, club=self.club, check_in=self.check_in, check_out=self.check_in + timedelta(hours=8),
+        )
+
+    def income(self, hours, amount):
+        return Income.objects.create(
+            club=self.club, source=self.source, amount=Decimal(amount), received_by=self.user,
+            payment_method=self.payment_method, date=self.check_in + timedelta(hours=hours),
+        )
+
+    def snapshot_total(self):
+        return ShiftFinanceSnapshot.objects.get(attendance=self.shift).total_income
+
+    def test_report_computes_missing_snapshot_without_writing(self):
+        self.income(1, 10)
+        totals = shift_finance_totals([StaffAttendance.objects.select_related('finance_snapshot').get(id=self.shift.id)])
+        self.assertEqual(totals[self.shift.id]['total_income'], Decimal('10'))
+        self.assertFalse(ShiftFinanceSnapshot.objects.exists())
+
+    def test_snapshot_follows_backdated_rows_and_shift_edits(self):
+        first = self.income(1, 10)
+        close_shift_snapshot(self.shift)
+        self.assertEqual(self.snapshot_total(), Decimal('10'))
+
+        # إيراد بتاريخ سابق داخل الشيفت المغلق، ثم نقل إيراد خارج الشيفت
+        late = self.income(7, 25)
+        self.assertEqual(self.snapshot_total(), Decimal('35'))
+        first.date = self.check_in - timedelta(hours=1)
+        first.save()
+        self.assertEqual(self.snapshot_total(), Decimal('25'))
+        late.delete()
+        self.assertEqual(self.snapshot_total(), Decimal('0'))
+
+        self.income(3, 40)
+        self.shift.check_out = self.check_in + timedelta(hours=2)
+        self.shift.save()
+        self.assertEqual(self.snapshot_total(), Decimal('0'))
+        self.shift.check_out = self.check_in + timedelta(hours=4)
+        self.shift.save()
+        self.assertEqual(self.snapshot_total(), Decimal('40'))
+
+        self.shift.check_out = None
+        self.shift.save()
+        self.assertFalse(ShiftFinanceSnapshot.objects.exists())
+
+
+class IncomeExportTests(FinanceTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        source = IncomeSource.objects.create(club=self.club, name='Subscription', price=Decimal('10'))
+        day = timezone.localdate() - timedelta(days=1)
+        self.day = day.isoformat()
+        self.incomes = [
+            Income.objects.create(
+                club=self.club, source=source, amount=Decimal(amount), received_by=self.user, description='بار',
+                payment_method=self.payment_method, date=timezone.make_aware(datetime.combine(day, time(hour))),
+            )
+            for hour, amount in ((10, '12.50'), (9, '20'))
+        ]
+        Income.objects.create(club=self.club, source=source, amount=Decimal('99'), received_by=self.user)
+
+    def export(self, **params):
+        response = self.call(income_export_api, data=params)
+        if response.status_code != 200:
+            return response, None
+        return response, b''.join(response.streaming_content).decode('utf-8')
+
+    def test_csv_streams_filtered_rows_in_date_order(self):
+        response, content = self.export(date=self.day)
+        self.assertTrue(response.streaming)
+        self.assertIn('incomes_', response['Content-Disposition'])
+        lines = content.splitlines()
+        self.assertTrue(lines[0].startswith('\ufeffid,التاريخ,المبلغ'))
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines[1], f"{self.incomes[1].id},{self.day} 09:00:00,20.00,اشتراك,كاش,owner,بار,1")
+
+    def test_ndjson_and_validation(self):
+        response, content = self.export(date=self.day, export_format='ndjson')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.incomes[1].id, self.incomes[0].id])
+        self.assertEqual((rows[1]['amount'], rows[1]['date'], rows[1]['source__name']), ('12.50', f"{self.day} 10:00:00", 'اشتراك'))
+
+        self.assertEqual(self.export(date=self.day, export_format='xlsx')[0].status_code, 400)
+        self.assertEqual(self.export()[0].status_code, 400)
+
+
+class StockMovementTests(FinanceTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.item = StockItem.objects.create(club=self.club, name='Water', initial_quantity=5, current_quantity=5)
+        self.source = IncomeSource.objects.create(club=self.club, name='Water', price=Decimal('5'), stock_item=self.item)
+
+    def test_consume_beyond_stock_rolls_back_income(self):
+        # بيع آخر سحب المخزون بعد قراءة المصدر: الفحص الأولي يمر والتحديث المشروط يرفض
+        stale_source = IncomeSource.objects.select_related('stock_item').get(id=self.source.id)
+        StockItem.objects.filter(id=self.item.id).update(current_quantity=2)
+        with mock.patch.object(IncomeSource.objects, 'get', return_value=stale_source):
+            response = self.call(income_api, 'post', {
+                'source': self.source.id, 'payment_method': self.payment_method.id, 'quantity': 4,
+            })
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Income.objects.exists())
+        self.assertFalse(StockTransaction.objects.exists())
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.current_quantity, 2)
+
+    def test_consume_transaction_raises_insufficient_stock(self):
+        with self.assertRaises(InsufficientStock), transaction.atomic():
+            StockTransaction.objects.create(stock_item=self.item, transaction_type='CONSUME', quantity=6)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.current_quantity, 5)
+
+    def test_resaved_transaction_does_not_move_stock(self):
+        movement = StockTransaction.objects.create(stock_item=self.item, transaction_type='CONSUME', quantity=2)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.current_quantity, 3)
+
+        movement.description = 'edited'
+        movement.save()
+        StockTransaction.objects.get(id=movement.id).save()
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.current_quantity, 3)
+
+    def test_stale_items_do_not_lose_updates(self):
+        first, second = StockItem.objects.get(id=self.item.id), StockItem.objects.get(id=self.item.id)
+        first.apply_movement('CONSUME', 2)
+        second.apply_movement('ADD', 4)
+        self.assertEqual(second.current_quantity, 7)
+
+    def test_inventory_count_updates_changed_items(self):
+        other = StockItem.objects.create(club=self.club, name='Juice', initial_quantity=10, current_quantity=10)
+        same = StockItem.objects.create(club=self.club, name='Bar', initial_quantity=4, current_quantity=4)
+        response = self.call(stock_inventory_api, 'post', {'inventory': [
+            {'stock_item_id': self.item.id, 'actual_quantity': 8},
+            {'stock_item_id': other.id, 'actual_quantity': 7},
+            {'stock_item_id': same.id, 'actual_quantity': 4},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {row['stock_item']: row['difference'] for row in response.data['discrepancies']},
+            {'Water': 3, 'Juice': -3},
+        )
+        quantities = dict(StockItem.objects.values_list('name', 'current_quantity'))
+        self.assertEqual(quantities, {'Water': 8, 'Juice': 7, 'Bar': 4})
+        self.assertEqual(
+            sorted(StockTransaction.objects.values_list('stock_item__name', 'transaction_type', 'quantity')),
+            [('Juice', 'CONSUME', 3), ('Water', 'ADD', 3)],
+        )
+
+    def test_inventory_count_rejects_foreign_item(self):
+        foreign = StockItem.objects.create(club=Club.objects.create(name='Other'), name='Water', current_quantity=1)
+        response = self.call(stock_inventory_api, 'post', {'inventory': [
+            {'stock_item_id': self.item.id, 'actual_quantity': 1},
+            {'stock_item_id': foreign.id, 'actual_quantity': 9},
+        ]})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(list(StockItem.objects.order_by('id').values_list('current_quantity', flat=True)), [5, 1])
+
+
+class StockValuationTests(FinanceTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.item = StockItem.objects.create(club=self.club, name='Water', initial_quantity=2, current_quantity=2)
+        self.source = IncomeSource.objects.create(club=self.club, name='Water', price=Decimal('10'), stock_item=self.item)
+        self.category = ExpenseCategory.objects.create(club=self.club, name='Purchases')
+        self.first_day = timezone.localdate() - timedelta(days=10)
+
+    def move(self, day, kind, quantity, amount=None):
+        related = {}
+        if amount is not None and kind == 'ADD':
+            related['related_expense'] = Expense.objects.create(
+                club=self.club, category=self.category, amount=Decimal(amount), paid_by=self.user,
+            )
+        elif amount is not None:
+            related['related_income'] = Income.objects.create(
+                club=self.club, source=self.source, amount=Decimal(amount), quantity=quantity, received_by=self.user,
+            )
+        movement = StockTransaction.objects.create(stock_item=self.item, transaction_type=kind, quantity=quantity, **related)
+        StockTransaction.objects.filter(id=movement.id).update(
+            date=timezone.make_aware(datetime.combine(self.first_day + timedelta(days=day), time(12)))
+        )
+
+    def test_fifo_and_weighted_average_cost(self):
+        self.move(0, 'ADD', 10, 50)
+        self.move(1, 'ADD', 10, 80)
+        # 2 وحدات افتتاحية بدون تكلفة (تحسب بالمتوسط 6.5) + 3 من الدفعة الأولى بسعر 5
+        self.move(2, 'CONSUME', 5, 50)
+        # 7 من الدفعة الأولى بسعر 5 + 3 من الثانية بسعر 8
+        self.move(3, 'CONSUME', 10, 120)
+        # هالك بدون إيراد: يستهلك من الدفعات ولا يحسب في تكلفة المبيعات
+        self.move(3, 'CONSUME', 1)
+
+        row, = stock_valuation(self.club)
+        self.assertEqual(
+            {key: row[key] for key in (
+                'total_purchase_quantity', 'total_purchase_cost', 'total_sale_quantity', 'total_sale_revenue',
+                'profit', 'average_unit_cost', 'cogs_fifo', 'cogs_weighted_average', 'margin_fifo',
+            )},
+            {
+                'total_purchase_quantity': 20, 'total_purchase_cost': 130.0, 'total_sale_quantity': 15,
+                'total_sale_revenue': 170.0, 'profit': 40.0, 'average_unit_cost': 6.5, 'cogs_fifo': 87.0,
+                'cogs_weighted_average': 97.5, 'margin_fifo': 83.0,
+            },
+        )
+
+        # الفترة تبدأ بعد المشتريات: الدفعات السابقة تظل تحدد تكلفة FIFO
+        row, = stock_valuation(self.club, start_date=self.first_day + timedelta(days=3))
+        self.assertEqual(
+            (row['total_purchase_quantity'], row['total_sale_quantity'], row['cogs_fifo'], row['cogs_weighted_average']),
+            (0, 10, 59.0, 65.0),
+        )
+        row, = stock_valuation(self.club, end_date=self.first_day + timedelta(days=2))
+        self.assertEqual((row['total_sale_quantity'], row['cogs_fifo'], row['average_unit_cost']), (5, 28.0, 6.5))
+
+    def test_new_movement_invalidates_cached_valuation(self):
+        self.move(0, 'ADD', 10, 50)
+        self.assertEqual(stock_valuation(self.club)[0]['total_purchase_quantity'], 10)
+        self.move(1, 'ADD', 5, 40)
+        self.assertEqual(stock_valuation(self.club)[0]['total_purchase_quantity'], 15)
+
+
+class SalesAnalysisTests(FinanceTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.item = StockItem.objects.create(club=self.club, name='Water', current_quantity=20)
+        self.idle = StockItem.objects.create(club=self.club, name='Juice', current_quantity=5)
+        self.source = IncomeSource.objects.create(club=self.club, name='Water', price=Decimal('10'), stock_item=self.item)
+        self.first_day = timezone.localdate() - timedelta(days=20)
+
+    def sell(self, day, hour, quantity):
+        income = Income.objects.create(
+            club=self.club, source=self.source, amount=Decimal(10 * quantity), quantity=quantity, received_by=self.user,
+        )
+        movement = StockTransaction.objects.create(
+            stock_item=self.item, transaction_type='CONSUME', quantity=quantity, related_income=income,
+        )
+        StockTransaction.objects.filter(id=movement.id).update(
+            date=timezone.make_aware(datetime.combine(self.first_day + timedelta(days=day), time(hour)))
+        )
+
+    def test_hour_buckets_periods_and_gaps(self):
+        self.sell(0, 9, 2)
+        self.sell(0, 21, 1)
+        self.sell(9, 9, 3)
+        # هالك بدون إيراد لا يحسب كمبيعات
+        StockTransaction.objects.create(stock_item=self.item, transaction_type='CONSUME', quantity=1)
+
+        with self.assertNumQueries(3):
+            water, juice = sales_analysis(self.club, self.first_day, self.first_day + timedelta(days=9), 'daily')
+        self.assertEqual((water['total_quantity_sold'], water['total_revenue']), (6, 60.0))
+        self.assertEqual(water['avg_daily_sales'], 0.6)
+        self.assertEqual(water['sales_status'], 'ضعيف (مبيعات نادرة)')
+        self.assertEqual([row['total_quantity'] for row in water['sales_by_period']], [3, 3])
+        hours = {row['hour']: (row['total_quantity'], row['total_revenue']) for row in water['sales_by_hour'] if row['total_quantity']}
+        self.assertEqual(len(water['sales_by_hour']), 24)
+        self.assertEqual(hours, {'09:00': (5, 50.0), '21:00': (1, 10.0)})
+        self.assertEqual([gap['gap_days'] for gap in water['sale_gaps']], [9])
+
+        self.assertEqual((juice['total_quantity_sold'], juice['sales_status']), (0, 'لا مبيعات'))
+        self.assertEqual(sum(row['total_quantity'] for row in juice['sales_by_hour']), 0)
+
+
+class PosCheckoutTests(FinanceTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.water = StockItem.objects.create(club=self.club, name='Water', initial_quantity=5, current_quantity=5)
+        self.juice = StockItem.objects.create(club=self.club, name='Juice', initial_quantity=3, current_quantity=3)
+        self.sources = [
+            IncomeSource.objects.create(club=self.club, name=item.name, price=Decimal('10'), stock_item=item)
+            for item in (self.water, self.juice)
+        ]
+
+    def checkout(self, quantities):
+        return self.call(pos_checkout_api, 'post', {
+            'payment_method': self.payment_method.id,
+            'items': [{'source': source.id, 'quantity': quantity} for source, quantity in zip(self.sources, quantities)],
+        })
+
+    def test_checkout_consumes_stock(self):
+        response = self.checkout([2, 3])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['total_amount'], 50.0)
+        self.assertEqual(Income.objects.count(), 2)
+        self.assertEqual(StockTransaction.objects.count(), 2)
+        self.assertEqual(dict(StockItem.objects.values_list('name', 'current_quantity')), {'Water': 3, 'Juice': 0})
+
+    def test_item_running_out_mid_checkout_leaves_no_income(self):
+        def concurrent_sale(*args, **kwargs):
+            # بيع آخر يسحب العصير بعد الفحص الأولي وقبل الخصم
+            StockItem.objects.filter(id=self.juice.id).update(current_quantity=1)
+            return allocate(*args, **kwargs)
+
+        with mock.patch('finance.pos.allocate', side_effect=concurrent_sale):
+            response = self.checkout([2, 3])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Income.objects.exists())
+        self.assertFalse(StockTransaction.objects.exists())
+        # خصم الماء من نفس التحديث ألغي مع المعاملة (والبيع المحاكى داخلها ألغي معها أيضا)
+        self.assertEqual(StockItem.objects.get(id=self.water.id).current_quantity, 5)
@@ -0,0 +1,212 @@
+from functools import reduce
+from operator import or_
+
+from dateutil.relativedelta import relativedelta
+from django.db.models import Q, Sum
+
+from .labels import UNSPECIFIED, translate_source
+from .models import FinanceDailyRollup
+from .rollups import NO_ROWS, rollup_filters
+
+# 3 سنوات حتى يتوفر 24 شهرا مكتملا لمؤشر الموسمية
+HISTORY_MONTHS = 37
+TREND_MONTHS = 12
+MIN_FORECAST_MONTHS = 3
+ROLLING_WINDOWS = (7, 30)
+SERIES_DAYS = 90
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ValueError('التحليل الاتجاهي يتطلب تثبيت numpy.')
+    return numpy
+
+
+def _round(value):
+    """float rounded to 2 places, None for NaN/inf."""
+    value = float(value)
+    return round(value, 2) if value == value and abs(value) != float('inf') else None
+
+
+def _rolling_mean(np, values, window):
+    """Trailing mean over `window` days; the first window-1 days average what exists so far."""
+    sums = np.cumsum(np.insert(values, 0, 0.0))
+    counts = np.minimum(np.arange(1, len(values) + 1), window)
+    starts = np.arange(1, len(values) + 1) - counts
+    return (sums[1:] - sums[starts]) / counts
+
+
+def _pct_change(np, current, previous):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(previous > 0, (current - previous) / previous * 100, np.nan)
+
+
+def _shares(np, names, amounts, recent):
+    """Share of each name in the whole window and in the recent mask, largest first."""
+    if not len(names):
+        return []
+    labels, index = np.unique(names, return_inverse=True)
+    totals = np.bincount(index, weights=amounts, minlength=len(labels))
+    recent_totals = np.bincount(index[recent], weights=amounts[recent], minlength=len(labels))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        share = totals / totals.sum() * 100
+        recent_share = recent_totals / recent_totals.sum() * 100 if recent_totals.sum() else np.zeros(len(labels))
+    order = np.argsort(-totals)
+    return [
+        {
+            'name': str(labels[i]),
+            'total': _round(totals[i]),
+            'share': _round(share[i]),
+            'recent_share': _round(recent_share[i]),
+            'share_change': _round(recent_share[i] - share[i]),
+        }
+        for i in order
+    ]
+
+
+def _forecast(np, monthly, month_numbers):
+    """
+    Projection of the current (partial) month and the next month from the complete months:
+    a linear trend over the last TREND_MONTHS months, scaled by a month-of-year seasonal index
+    when two full years of history exist. Returns (method, [current, next]) or (None, None).
+    """
+    complete = monthly[:-1]
+    months = month_numbers[:-1]
+    active = np.flatnonzero(complete)
+    if not len(active):
+        return None, None
+    # نتجاهل الأشهر الأولى قبل بداية النشاط
+    complete, months = complete[active[0]:], months[active[0]:]
+    if len(complete) < MIN_FORECAST_MONTHS:
+        return None, None
+
+    method = 'linear'
+    seasonal = np.ones(12)
+    if len(complete) >= 24:
+        # مؤشر موسمي = متوسط نسبة كل شهر إلى خط الاتجاه (حتى لا يحسب النمو كموسمية)
+        last_two_years, their_months = complete[-24:], months[-24:]
+        x = np.arange(24)
+        trend = np.polyval(np.polyfit(x, last_two_years, 1), x)
+        if (trend > 0).all():
+            ratios = np.bincount(their_months, weights=last_two_years / trend, minlength=12) / 2
+            if ratios.all():
+                seasonal = ratios / ratios.mean()
+                method = 'linear_seasonal'
+
+    recent, recent_months = complete[-TREND_MONTHS:], months[-TREND_MONTHS:]
+    x = np.arange(len(recent))
+    slope, intercept = np.polyfit(x, recent / seasonal[recent_months], 1)
+    ahead = np.array([len(recent), len(recent) + 1])
+    ahead_months = (recent_months[-1] + np.array([1, 2])) % 12
+    return method, np.maximum((intercept + slope * ahead) * seasonal[ahead_months], 0)
+
+
+def financial_trends(request, end_date):
+    """
+    Daily income/expense series of the club (with the request's employee/source/category
+    filters) for the HISTORY_MONTHS months up to end_date, loaded from the daily rollup in one
+    query, and the analytics computed on them as arrays: rolling means, monthly totals with
+    year-over-year change, source/category shares and a linear/seasonal forecast.
+    Raises ValueError when numpy isn't installed or the filters can't be answered from the rollup.
+    """
+    np = _numpy()
+    filters = {kind: rollup_filters(request, kind) for kind in ('income', 'expense')}
+    if None in filters.values():
+        raise ValueError('التحليل الاتجاهي لا يدعم هذه الفلاتر.')
+
+    first_day = end_date.replace(day=1) - relativedelta(months=HISTORY_MONTHS - 1)
+    rows = FinanceDailyRollup.objects.filter(club=request.user.club, day__gte=first_day, day__lte=end_date)
+    if NO_ROWS in filters.values():
+        rows = rows.none()
+    else:
+        # نطاق التاريخ يحدده end_date؛ الموظف/المصدر/الفئة يطبق كل منها على نوعه
+        rows = rows.filter(reduce(or_, [
+            Q(kind=kind, **{key: value for key, value in kind_filters.items() if not key.startswith('day')})
+            for kind, kind_filters in filters.items()
+        ]))
+    data = list(
+        rows.values_list('day', 'kind', 'source__name', 'category__name').annotate(amount=Sum('total')).order_by()
+    )
+
+    days = np.arange(np.datetime64(first_day), np.datetime64(end_date) + np.timedelta64(1, 'D'))
+    month_index = (days.astype('datetime64[M]') - days[0].astype('datetime64[M]')).astype(int)
+    month_count = month_index[-1] + 1
+    first_month = np.datetime64(first_day, 'M')
+    month_starts = first_month + np.arange(month_count)
+    month_numbers = month_starts.astype(int) % 12
+
+    offsets = np.array([(row[0] - first_day).days for row in data], dtype=int)
+    amounts = np.array([float(row[4] or 0) for row in data])
+    is_income = np.array([row[1] == 'income' for row in data], dtype=bool)
+    income = np.bincount(offsets[is_income], weights=amounts[is_income], minlength=len(days))
+    expense = np.bincount(offsets[~is_income], weights=amounts[~is_income], minlength=len(days))
+    net = income - expense
+
+    monthly = {
+        'income': np.bincount(month_index, weights=income, minlength=month_count),
+        'expense': np.bincount(month_index, weights=expense, minlength=month_count),
+    }
+    monthly['net'] = monthly['income'] - monthly['expense']
+    yoy = {kind: _pct_change(np, values[12:], values[:-12]) for kind, values in monthly.items()}
+
+    rolling = {
+        f'{kind}_{window}d': _rolling_mean(np, series, window)
+        for kind, series in (('income', income), ('expense', expense), ('net', net))
+        for window in ROLLING_WINDOWS
+    }
+    series_days = days[-SERIES_DAYS:]
+
+    recent = offsets >= len(days) - 30
+    source_names = np.array([translate_source(row[2]) if row[2] else UNSPECIFIED for row in data], dtype=object)
+    category_names = np.array([row[3] or UNSPECIFIED for row in data], dtype=object)
+    year = offsets >= len(days) - 365
+
+    # كل نوع يتوقع وحده؛ None للنوع الذي ليس له تاريخ كاف
+    methods, projections = {}, {}
+    for kind in ('income', 'expense'):
+        methods[kind], projections[kind] = _forecast(np, monthly[kind], month_numbers)
+
+    def projected(kind, step):
+        return _round(projections[kind][step]) if projections[kind] is not None else None
+
+    forecast = {
+        'method': methods,
+        'periods': [
+            {
+                'month': str(first_month + month_count - 1 + step),
+                'income': projected('income', step),
+                'expense': projected('expense', step),
+                'net': (
+                    _round(projections['income'][step] - projections['expense'][step])
+                    if projections['income'] is not None and projections['expense'] is not None else None
+                ),
+            }
+            for step in range(2)
+        ],
+    }
+
+    return {
+        'as_of': end_date.isoformat(),
+        'rolling': {name: _round(values[-1]) for name, values in rolling.items()},
+        'rolling_series': [
+            dict({'date': str(day)}, **{name: _round(values[-SERIES_DAYS:][i]) for name, values in rolling.items()})
+            for i, day in enumerate(series_days)
+        ],
+        'monthly': [
+            {
+                'month': str(month_starts[i]),
+                'income': _round(monthly['income'][i]),
+                'expense': _round(monthly['expense'][i]),
+                'net': _round(monthly['net'][i]),
+                'income_yoy_pct': _round(yoy['income'][i - 12]) if i >= 12 else None,
+                'expense_yoy_pct': _round(yoy['expense'][i - 12]) if i >= 12 else None,
+                'net_yoy_pct': _round(yoy['net'][i - 12]) if i >= 12 else None,
+            }
+            for i in range(max(month_count - 12, 0), month_count)
+        ],
+        'income_source_shares': _shares(np, source_names[is_income & year], amounts[is_income & year], recent[is_income & year]),
+        'expense_category_shares': _shares(np, category_names[~is_income & year], amounts[~is_income & year], recent[~is_income & year]),
+        'forecast': forecast,
+    }
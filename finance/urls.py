@@ -20,6 +20,7 @@ urlpatterns = [
     path('api/income-sources/', api.income_source_api, name='api-income-source'),
     path('api/incomes/', api.income_api, name='api-income'),
     path('api/incomes/<int:pk>/', api.income_detail_api, name='api-income-detail'),
+    path('api/pos/checkout/', api.pos_checkout_api, name='api-pos-checkout'),
     path('api/daily-summary/', api.daily_summary_api, name='api_daily_summary'),
     path('api/income-summary/', api.income_summary, name='api-income-summary'),
     path('api/expense-summary/', api.expense_summary, name='api-expense-summary'),
@@ -28,6 +29,8 @@ urlpatterns = [
     path('api/employee/daily-report/pdf/', api.generate_daily_report_pdf, name='generate_daily_report_pdf'),
     path('api/expense/all/', api.expense_all_api, name='expense_all_api'),
     path('api/income/all/', api.income_all_api, name='income_all_api'),
+    path('api/expense/export/', api.expense_export_api, name='expense_export_api'),
+    path('api/income/export/', api.income_export_api, name='income_export_api'),
     path('api/financial-analysis/', api.financial_analysis_api, name='financial_analysis_api'),
     
     path('api/stock-items/', api.stock_item_api, name='api-stock-item'),
@@ -35,6 +38,10 @@ urlpatterns = [
     path('api/stock-profit/', api.stock_profit_api, name='api-stock-profit'),
     path('api/stock-sales-analysis/', api.stock_sales_analysis_api, name='api-stock-sales-analysis'),
     path('api/schedule/', api.schedule_api, name='schedule_api'),
+    path('api/periods/', api.finance_period_api, name='api-finance-period'),
     path('api/stock-inventory-pdf/', api.generate_inventory_pdf, name='generate_inventory_pdf'),
+    path('api/reports/jobs/', api.report_job_api, name='report_job'),
+    path('api/reports/jobs/<uuid:job_id>/', api.report_job_detail_api, name='report_job_detail'),
+    path('api/reports/jobs/<uuid:job_id>/download/', api.report_job_download_api, name='report_job_download'),
 
     ]
@@ -0,0 +1,139 @@
+import logging
+from collections import deque
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import StockItem, StockTransaction
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal('0')
+
+
+def _version_key(club_id):
+    return f"stock_valuation_version:{club_id}"
+
+
+def invalidate_valuation(club_id):
+    """Drop the cached stock valuations of a club (called on every stock movement)."""
+    if not club_id:
+        return
+    try:
+        cache.incr(_version_key(club_id))
+    except ValueError:
+        cache.set(_version_key(club_id), 1, timeout=None)
+
+
+def _in_period(day, start_date, end_date):
+    return (start_date is None or day >= start_date) and (end_date is None or day <= end_date)
+
+
+class _ItemLedger:
+    """Running figures of one stock item while its movements are replayed in date order."""
+
+    def __init__(self, initial_quantity):
+        # الكمية الافتتاحية بدون تكلفة معروفة
+        self.lots = deque([[initial_quantity, None]] if initial_quantity else [])
+        self.purchase_quantity = 0
+        self.purchase_cost = ZERO
+        self.sale_quantity = 0
+        self.sale_revenue = ZERO
+        self.fifo_cost = ZERO
+        self.costed_quantity = 0
+        self.costed_amount = ZERO
+
+    @property
+    def average_unit_cost(self):
+        return self.costed_amount / self.costed_quantity if self.costed_quantity else ZERO
+
+    def consume(self, quantity):
+        """Take quantity from the oldest lots; returns (known cost, units without a known cost)."""
+        cost, unknown = ZERO, 0
+        while quantity and self.lots:
+            lot = self.lots[0]
+            taken = min(quantity, lot[0])
+            if lot[1] is None:
+                unknown += taken
+            else:
+                cost += lot[1] * taken
+            lot[0] -= taken
+            quantity -= taken
+            if not lot[0]:
+                self.lots.popleft()
+        # استهلاك أكبر من الدفعات المسجلة (بيانات قديمة) يحسب بمتوسط التكلفة
+        return cost, unknown + quantity
+
+
+def stock_valuation(club, start_date=None, end_date=None, stock_item_id=None):
+    """
+    Purchase cost, sales revenue and quantities of the club's stock items in start_date..end_date
+    (local dates, both optional), with the cost of goods sold by FIFO and by weighted average
+    cost and the resulting margins. Two queries: the items and their movements up to end_date
+    in date order. Cached per club and period until the next stock movement.
+    """
+    version = cache.get(_version_key(club.id), 0)
+    key = f"stock_valuation:{club.id}:{version}:{stock_item_id or 'all'}:{start_date}:{end_date}"
+    report = cache.get(key)
+    if report is not None:
+        return report
+
+    items = StockItem.objects.filter(club=club).order_by('id')
+    if stock_item_id:
+        items = items.filter(id=stock_item_id)
+    items = list(items.values_list('id', 'name', 'initial_quantity'))
+
+    movements = StockTransaction.objects.filter(stock_item_id__in=[item[0] for item in items])
+    if end_date:
+        movements = movements.filter(date__date__lte=end_date)
+    rows = list(movements.order_by('date', 'id').values_list(
+        'stock_item_id', 'transaction_type', 'quantity', 'date', 'related_expense__amount', 'related_income__amount'
+    ))
+
+    ledgers = {item_id: _ItemLedger(initial_quantity) for item_id, _, initial_quantity in items}
+    # المتوسط المرجح من كل المشتريات ذات التكلفة حتى نهاية الفترة، يستخدم للدفعات بدون تكلفة
+    for item_id, kind, quantity, _, expense_amount, _ in rows:
+        if kind == 'ADD' and expense_amount is not None and quantity:
+            ledgers[item_id].costed_quantity += quantity
+            ledgers[item_id].costed_amount += expense_amount
+
+    for item_id, kind, quantity, date, expense_amount, income_amount in rows:
+        ledger = ledgers[item_id]
+        in_period = _in_period(timezone.localtime(date).date(), start_date, end_date)
+        if kind == 'ADD':
+            ledger.lots.append([quantity, expense_amount / quantity if expense_amount is not None and quantity else None])
+            if in_period:
+                ledger.purchase_quantity += quantity
+                ledger.purchase_cost += expense_amount or ZERO
+        elif kind == 'CONSUME':
+            cost, unknown = ledger.consume(quantity)
+            # السطر مرتبط بإيراد = بيع؛ غير ذلك هالك أو تسوية جرد
+            if in_period and income_amount is not None:
+                ledger.sale_quantity += quantity
+                ledger.sale_revenue += income_amount
+                ledger.fifo_cost += cost + ledger.average_unit_cost * unknown
+
+    report = []
+    for item_id, name, _ in items:
+        ledger = ledgers[item_id]
+        profit = ledger.sale_revenue - ledger.purchase_cost
+        average_cost = ledger.sale_quantity * ledger.average_unit_cost
+        report.append({
+            'stock_item_id': item_id,
+            'stock_item_name': name,
+            'total_purchase_quantity': ledger.purchase_quantity,
+            'total_purchase_cost': float(ledger.purchase_cost),
+            'total_sale_quantity': ledger.sale_quantity,
+            'total_sale_revenue': float(ledger.sale_revenue),
+            'profit': float(profit),
+            'profit_per_unit': float(profit / ledger.sale_quantity) if ledger.sale_quantity else 0,
+            'average_unit_cost': float(ledger.average_unit_cost),
+            'cogs_fifo': float(ledger.fifo_cost),
+            'margin_fifo': float(ledger.sale_revenue - ledger.fifo_cost),
+            'cogs_weighted_average': float(average_cost),
+            'margin_weighted_average': float(ledger.sale_revenue - average_cost),
+        })
+    cache.set(key, report, timeout=getattr(settings, 'STOCK_VALUATION_CACHE_TIMEOUT', 300))
+    return report
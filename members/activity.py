@@ -0,0 +1,90 @@
+import logging
+
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .models import Member
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_FIELDS = ['last_attendance_at', 'current_attendance_at', 'current_subscription_end', 'active_subscription_count']
+
+
+def refresh_member_activity(member_ids):
+    """Recompute the denormalized attendance/subscription fields for the given members."""
+    from attendance.models import Attendance, EntryLog
+    from subscriptions.models import Subscription
+
+    member_ids = {pk for pk in member_ids if pk}
+    if not member_ids:
+        return 0
+    today = timezone.now().date()
+
+    last_attendance = dict(
+        Attendance.objects.filter(subscription__member_id__in=member_ids)
+        .values('subscription__member_id')
+        .annotate(last=Max('timestamp'))
+        .values_list('subscription__member_id', 'last')
+    )
+    # سجلات الدخول تحسب حضورا أيضا
+    for member_id, last in (
+        EntryLog.objects.filter(member_id__in=member_ids)
+        .values('member_id')
+        .annotate(last=Max('timestamp'))
+        .values_list('member_id', 'last')
+    ):
+        if last and (last_attendance.get(member_id) is None or last > last_attendance[member_id]):
+            last_attendance[member_id] = last
+    current_attendance = dict(
+        Attendance.objects.filter(subscription__member_id__in=member_ids, subscription__end_date__gte=today)
+        .values('subscription__member_id')
+        .annotate(last=Max('timestamp'))
+        .values_list('subscription__member_id', 'last')
+    )
+    subscriptions = {
+        row['member_id']: row
+        for row in Subscription.objects.filter(member_id__in=member_ids)
+        .values('member_id')
+        .annotate(
+            last_end=Max('end_date'),
+            active=Count('id', filter=Q(is_cancelled=False, start_date__lte=today, end_date__gte=today)),
+        )
+    }
+
+    changed = []
+    for member in Member.objects.filter(id__in=member_ids).only('id', *ACTIVITY_FIELDS):
+        row = subscriptions.get(member.id, {})
+        values = (
+            last_attendance.get(member.id), current_attendance.get(member.id),
+            row.get('last_end'), row.get('active', 0),
+        )
+        if values != tuple(getattr(member, field) for field in ACTIVITY_FIELDS):
+            for field, value in zip(ACTIVITY_FIELDS, values):
+                setattr(member, field, value)
+            changed.append(member)
+
+    if changed:
+        Member.objects.bulk_update(changed, ACTIVITY_FIELDS, batch_size=500)
+    return len(changed)
+
+
+def record_attendance(member_id, timestamp, current=False):
+    """
+    Move last_attendance_at (and current_attendance_at for an attendance on a subscription that
+    hasn't ended) forward without recomputing everything. Returns True when last_attendance_at
+    moved to a later local day, the only change that can take the member out of the inactive segment.
+    """
+    if not member_id or not timestamp:
+        return False
+    members = Member.objects.filter(id=member_id)
+    if current:
+        members.filter(Q(current_attendance_at__isnull=True) | Q(current_attendance_at__lt=timestamp)).update(
+            current_attendance_at=timestamp
+        )
+    day_start = timezone.localtime(timestamp).replace(hour=0, minute=0, second=0, microsecond=0)
+    if members.filter(Q(last_attendance_at__isnull=True) | Q(last_attendance_at__lt=day_start)).update(
+        last_attendance_at=timestamp
+    ):
+        return True
+    members.filter(last_attendance_at__lt=timestamp).update(last_attendance_at=timestamp)
+    return False
@@ -1,6 +1,5 @@
 from datetime import timedelta
 from django.db import IntegrityError
-from django.db.models import Exists, OuterRef, Q
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from rest_framework import status
@@ -11,6 +10,13 @@ from rest_framework.response import Response
 from .models import Member
 from subscriptions.models import Subscription
 from .serializers import MemberSerializer
+from .search import matching_members, search_members
+from .importer import DEFAULT_CHUNK_SIZE as IMPORT_CHUNK_SIZE, import_members
+from .duplicates import find_possible_duplicates, duplicate_clusters, merge_members
+from .profile import DEFAULT_CALENDAR_DAYS, build_member_profile
+from .segments import SEGMENTS, get_segments, filter_segment, members_for_ids, iter_segment_values
+from utils.streaming import EXPORT_FORMATS, streaming_export
+from utils.tabular import iter_rows, parse_date
 from attendance.models import Attendance
 from utils.generate_membership_number import generate_membership_number
 import logging
@@ -20,6 +26,11 @@ logger = logging.getLogger(__name__)
 
 FULL_ACCESS_ROLES = ['owner', 'admin']
 
+
+def _is_true(value):
+    return str(value or '').lower() in ('1', 'true', 'yes')
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def member_list_api(request):
@@ -67,13 +78,9 @@ def member_list_api(request):
         members = members.filter(created_at__gte=last_24_hours)
 
     if search_term:
-        members = members.filter(
-            Q(name__icontains=search_term) |
-            Q(phone__icontains=search_term) |
-            Q(rfid_code__icontains=search_term)
-        )
-
-    members = members.order_by('-id')
+        members = search_members(request.user.club.id, search_term, queryset=members)
+    else:
+        members = members.order_by('-id')
     paginator = PageNumberPagination()
     result_page = paginator.paginate_queryset(members, request)
     serializer = MemberSerializer(result_page, many=True)
@@ -92,6 +99,24 @@ def member_detail_api(request, member_id):
     serializer = MemberSerializer(member)
     return Response(serializer.data)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def member_profile_api(request, member_id):
+    """Member 360 profile: details, subscriptions with payments/freezes, attendance calendar, invites and referrals."""
+    if not request.user.club:
+        logger.error(f"User {request.user.username} has no associated club")
+        return Response({'error': 'غير مسموح: المستخدم ليس مرتبط بنادي.'}, status=status.HTTP_403_FORBIDDEN)
+
+    try:
+        calendar_days = int(request.GET.get('calendar_days', DEFAULT_CALENDAR_DAYS))
+    except ValueError:
+        return Response({'error': 'عدد الأيام غير صالح.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    profile = build_member_profile(member_id, request.user.club, request=request, calendar_days=calendar_days)
+    if profile is None:
+        return Response({'error': 'العضو غير موجود.'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(profile)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def member_search_api(request):
@@ -99,21 +124,17 @@ def member_search_api(request):
         logger.error(f"User {request.user.username} has no associated club")
         return Response({'error': 'غير مسموح: المستخدم ليس مرتبط بنادي.'}, status=status.HTTP_403_FORBIDDEN)
     
-    search_term = request.GET.get('q', '')
+    search_term = request.GET.get('q', '').strip()
     gender = request.GET.get('gender', '')  # إضافة فلتر gender
-    search_filter = (
-        Q(name__icontains=search_term) |
-        Q(membership_number__icontains=search_term) |
-        Q(national_id__icontains=search_term) |
-        Q(rfid_code__icontains=search_term) |
-        Q(phone__icontains=search_term)
-    )
 
-    members = Member.objects.filter(Q(club=request.user.club) & search_filter)
+    members = Member.objects.filter(club=request.user.club)
     if gender:
         members = members.filter(gender=gender)  # تطبيق فلتر gender
 
-    members = members.order_by('-name')
+    if search_term:
+        members = search_members(request.user.club.id, search_term, queryset=members)
+    else:
+        members = members.order_by('-name')
     paginator = PageNumberPagination()
     result_page = paginator.paginate_queryset(members, request)
     serializer = MemberSerializer(result_page, many=True)
@@ -153,13 +174,29 @@ def create_member_api(request):
 
     serializer = MemberSerializer(data=mutable_data, context={'request': request})
     if serializer.is_valid():
+        validated = serializer.validated_data
+        possible_duplicates = find_possible_duplicates(
+            request.user.club.id,
+            name=validated.get('name'),
+            phone=validated.get('phone'),
+            phone2=validated.get('phone2'),
+            national_id=validated.get('national_id'),
+            birth_date=validated.get('birth_date'),
+        )
+        if possible_duplicates and _is_true(data.get('reject_duplicates')):
+            return Response(
+                {'error': 'يوجد أعضاء مسجلين ببيانات مشابهة.', 'possible_duplicates': possible_duplicates},
+                status=status.HTTP_409_CONFLICT
+            )
         try:
-            member = serializer.save()
             if 'photo' in request.FILES:
-                member.photo = request.FILES['photo']
-                member.save()
+                member = serializer.save(photo=request.FILES['photo'])
+            else:
+                member = serializer.save()
             logger.info(f"Member created: {member.id}, {member.name}")
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            response_data = dict(serializer.data)
+            response_data['possible_duplicates'] = possible_duplicates
+            return Response(response_data, status=status.HTTP_201_CREATED)
         except IntegrityError as e:
             logger.error(f"IntegrityError creating member: {str(e)}")
             return Response(
@@ -175,6 +212,122 @@ def create_member_api(request):
     logger.error(f"Serializer errors: {serializer.errors}")
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_create_members_api(request):
+    """
+    Register many members at once (Owner/Admin only).
+    Accepts a JSON list under `members` or an uploaded CSV/XLSX `file`; returns a result per row.
+    """
+    if not request.user.club:
+        logger.error(f"User {request.user.username} has no associated club")
+        return Response({'error': 'غير مسموح: المستخدم ليس مرتبط بنادي.'}, status=status.HTTP_403_FORBIDDEN)
+
+    if request.user.role not in FULL_ACCESS_ROLES:
+        return Response({'error': 'غير مسموح بالاستيراد. يجب أن تكون Owner أو Admin.'}, status=status.HTTP_403_FORBIDDEN)
+
+    dry_run = _is_true(request.data.get('dry_run'))
+    upload = request.FILES.get('file')
+    rows = request.data.get('members')
+    if not upload and (not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows)):
+        return Response({'error': 'يجب إرسال قائمة members أو ملف file.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        if upload:
+            # نوع ملف غير مدعوم يرفع ValueError فورا
+            rows = iter_rows(upload, upload.name)
+        result = import_members(request.user.club, rows, chunk_size=IMPORT_CHUNK_SIZE, dry_run=dry_run)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    logger.info(f"Bulk member import by {request.user.username}: created={result['created']} errors={result['errors']}")
+    response_status = status.HTTP_201_CREATED if result['created'] else status.HTTP_200_OK
+    return Response(result, status=response_status)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def member_duplicates_check_api(request):
+    """Possible duplicates for registration data (name, phone, phone2, national_id, birth_date)."""
+    if not request.user.club:
+        logger.error(f"User {request.user.username} has no associated club")
+        return Response({'error': 'غير مسموح: المستخدم ليس مرتبط بنادي.'}, status=status.HTTP_403_FORBIDDEN)
+
+    birth_date = request.GET.get('birth_date') or None
+    if birth_date:
+        try:
+            birth_date = parse_date(birth_date)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    exclude_id = request.GET.get('exclude') or None
+    if exclude_id:
+        try:
+            exclude_id = int(exclude_id)
+        except ValueError:
+            return Response({'error': 'معرف العضو المستبعد غير صالح.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    matches = find_possible_duplicates(
+        request.user.club.id,
+        name=request.GET.get('name'),
+        phone=request.GET.get('phone'),
+        phone2=request.GET.get('phone2'),
+        national_id=request.GET.get('national_id'),
+        birth_date=birth_date,
+        exclude_id=exclude_id,
+    )
+    return Response({'count': len(matches), 'results': matches})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def duplicate_clusters_api(request):
+    """Clusters of members that look like the same person (Owner/Admin only)."""
+    if not request.user.club:
+        logger.error(f"User {request.user.username} has no associated club")
+        return Response({'error': 'غير مسموح: المستخدم ليس مرتبط بنادي.'}, status=status.HTTP_403_FORBIDDEN)
+
+    if request.user.role not in FULL_ACCESS_ROLES:
+        return Response({'error': 'غير مسموح. يجب أن تكون Owner أو Admin.'}, status=status.HTTP_403_FORBIDDEN)
+
+    clusters = duplicate_clusters(request.user.club.id, include_name_only=_is_true(request.GET.get('include_name_only')))
+    paginator = PageNumberPagination()
+    result_page = paginator.paginate_queryset(clusters, request)
+    return paginator.get_paginated_response(result_page)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def merge_members_api(request):
+    """Merge duplicate members into `target_id` (Owner/Admin only)."""
+    if not request.user.club:
+        logger.error(f"User {request.user.username} has no associated club")
+        return Response({'error': 'غير مسموح: المستخدم ليس مرتبط بنادي.'}, status=status.HTTP_403_FORBIDDEN)
+
+    if request.user.role not in FULL_ACCESS_ROLES:
+        return Response({'error': 'غير مسموح بالدمج. يجب أن تكون Owner أو Admin.'}, status=status.HTTP_403_FORBIDDEN)
+
+    member_ids = request.data.get('member_ids') or []
+    if not isinstance(member_ids, list) or not member_ids:
+        return Response({'error': 'يجب تحديد الأعضاء المراد دمجهم.'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        target_id = int(request.data.get('target_id'))
+        member_ids = {int(member_id) for member_id in member_ids}
+    except (TypeError, ValueError):
+        return Response({'error': 'معرفات الأعضاء غير صالحة.'}, status=status.HTTP_400_BAD_REQUEST)
+    target = get_object_or_404(Member, id=target_id, club=request.user.club)
+
+    duplicates = list(Member.objects.filter(id__in=member_ids, club=request.user.club).exclude(id=target.id))
+    if len(duplicates) != len(member_ids - {target.id}):
+        return Response({'error': 'بعض الأعضاء غير موجودين في النادي.'}, status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        result = merge_members(target, duplicates)
+    except (ValueError, IntegrityError) as e:
+        logger.error(f"Error merging members into {target.id}: {str(e)}")
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    target.refresh_from_db()
+    return Response({'result': result, 'member': MemberSerializer(target, context={'request': request}).data})
+
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
 def update_member_api(request, member_id):
@@ -239,94 +392,34 @@ def member_subscription_report_api(request):
         if expiry_days < 1 or inactive_days < 1:
             raise ValueError
 
-        today = timezone.now().date()
-        expiry_threshold = today + timedelta(days=expiry_days)
-        inactive_threshold = today - timedelta(days=inactive_days)
-
-        base_query = Member.objects.filter(club_id=club_id)
-        if name:
-            base_query = base_query.filter(name__icontains=name)
-        if rfid_code:
-            base_query = base_query.filter(rfid_code__icontains=rfid_code)
-        if gender:
-            base_query = base_query.filter(gender=gender)  # تطبيق فلتر gender
-
-        # باقي الكود بدون تغيير
-        members_without_subscriptions = base_query.annotate(
-            has_subscription=Exists(Subscription.objects.filter(member=OuterRef('pk')))
-        ).filter(has_subscription=False)
-        members_with_expired_subscriptions = base_query.filter(
-            subscription__isnull=False,
-            subscription__end_date__lt=today
-        ).distinct()
-        members_with_near_expiry = base_query.filter(
-            subscription__end_date__gte=today,
-            subscription__end_date__lte=expiry_threshold
-        ).distinct()
-        members_inactive = base_query.filter(
-            subscription__end_date__gte=today
-        ).exclude(
-            subscription__attendance_attendances__attendance_date__gt=inactive_threshold
-        ).distinct()
-
-        if subscription_status:
-            if subscription_status == 'without_subscriptions':
-                members_without_subscriptions = members_without_subscriptions
-                members_with_expired_subscriptions = members_with_expired_subscriptions.none()
-                members_with_near_expiry = members_with_near_expiry.none()
-                members_inactive = members_inactive.none()
-            elif subscription_status == 'expired_subscriptions':
-                members_without_subscriptions = members_without_subscriptions.none()
-                members_with_expired_subscriptions = members_with_expired_subscriptions
-                members_with_near_expiry = members_with_near_expiry.none()
-                members_inactive = members_inactive.none()
-            elif subscription_status == 'near_expiry_subscriptions':
-                members_without_subscriptions = members_without_subscriptions.none()
-                members_with_expired_subscriptions = members_with_expired_subscriptions.none()
-                members_with_near_expiry = members_with_near_expiry
-                members_inactive = members_inactive.none()
-            elif subscription_status == 'inactive_members':
-                members_without_subscriptions = members_without_subscriptions.none()
-                members_with_expired_subscriptions = members_with_expired_subscriptions.none()
-                members_with_near_expiry = members_with_near_expiry.none()
-                members_inactive = members_inactive
-
-        paginator = PageNumberPagination()
-        paginator.page_size = 20
-
-        serializer_without = MemberSerializer(paginator.paginate_queryset(members_without_subscriptions, request), many=True)
-        serializer_expired = MemberSerializer(paginator.paginate_queryset(members_with_expired_subscriptions, request), many=True)
-        serializer_near_expiry = MemberSerializer(paginator.paginate_queryset(members_with_near_expiry, request), many=True)
-        serializer_inactive = MemberSerializer(paginator.paginate_queryset(members_inactive, request), many=True)
-
-        response_data = {
-            'without_subscriptions': {
-                'count': members_without_subscriptions.count(),
-                'results': serializer_without.data,
+        segments = get_segments(club_id, expiry_days, inactive_days, refresh=request.GET.get('refresh') == '1')
+
+        member_ids = None
+        if name or rfid_code:
+            # نفس استعلام البحث الفرعي (بدون ترتيب) لكل كلمة، ثم تقاطع مع الشرائح المخزنة
+            matched = Member.objects.filter(club_id=club_id)
+            for term in (name, rfid_code):
+                if term:
+                    matched = matching_members(club_id, term, matched)
+            member_ids = set(matched.values_list('id', flat=True))
+
+        response_data = {}
+        for segment in SEGMENTS:
+            ids = filter_segment(segments[segment], gender=gender, member_ids=member_ids)
+            if subscription_status and subscription_status != segment:
+                ids = []
+            paginator = PageNumberPagination()
+            paginator.page_size = 20
+            page_ids = paginator.paginate_queryset(ids, request) or []
+            serializer = MemberSerializer(list(members_for_ids(page_ids)), many=True)
+            response_data[segment] = {
+                'count': len(ids),
+                'results': serializer.data,
                 'next': paginator.get_next_link(),
                 'previous': paginator.get_previous_link(),
-            },
-            'expired_subscriptions': {
-                'count': members_with_expired_subscriptions.count(),
-                'results': serializer_expired.data,
-                'next': paginator.get_next_link(),
-                'previous': paginator.get_previous_link(),
-            },
-            'near_expiry_subscriptions': {
-                'count': members_with_near_expiry.count(),
-                'results': serializer_near_expiry.data,
-                'next': paginator.get_next_link(),
-                'previous': paginator.get_previous_link(),
-            },
-            'inactive_members': {
-                'count': members_inactive.count(),
-                'results': serializer_inactive.data,
-                'next': paginator.get_next_link(),
-                'previous': paginator.get_previous_link(),
-            },
-            'days': expiry_days,
-            'inactive_days': inactive_days,
-        }
+            }
+        response_data['days'] = expiry_days
+        response_data['inactive_days'] = inactive_days
 
         return Response(response_data, status=status.HTTP_200_OK)
     except Exception as e:
@@ -349,59 +442,55 @@ def export_subscription_report_api(request):
         if expiry_days < 1 or inactive_days < 1:
             return Response({'error': 'يجب أن تكون أيام الانتهاء وعدم الحضور قيمًا صحيحة وموجبة'}, status=status.HTTP_400_BAD_REQUEST)
 
-        today = timezone.now().date()
-        expiry_threshold = today + timedelta(days=expiry_days)
-        inactive_threshold = today - timedelta(days=inactive_days)
-
-        base_query = Member.objects.filter(club_id=club_id)
-
-        members_without_subscriptions = base_query.annotate(
-            has_subscription=Exists(Subscription.objects.filter(member=OuterRef('pk')))
-        ).filter(has_subscription=False)
-        
-        members_with_expired_subscriptions = base_query.filter(
-            subscription__isnull=False,
-            subscription__end_date__lt=today
-        ).distinct()
-        
-        members_with_near_expiry = base_query.filter(
-            subscription__end_date__gte=today,
-            subscription__end_date__lte=expiry_threshold
-        ).distinct()
-        
-        members_inactive = base_query.filter(
-            subscription__end_date__gte=today
-        ).exclude(
-            subscription__attendance_attendances__attendance_date__gt=inactive_threshold
-        ).distinct()
-
-        serializer_without = MemberSerializer(members_without_subscriptions, many=True)
-        serializer_expired = MemberSerializer(members_with_expired_subscriptions, many=True)
-        serializer_near_expiry = MemberSerializer(members_with_near_expiry, many=True)
-        serializer_inactive = MemberSerializer(members_inactive, many=True)
-
-        response_data = {
-            'without_subscriptions': {
-                'count': members_without_subscriptions.count(),
-                'results': serializer_without.data,
-            },
-            'expired_subscriptions': {
-                'count': members_with_expired_subscriptions.count(),
-                'results': serializer_expired.data,
-            },
-            'near_expiry_subscriptions': {
-                'count': members_with_near_expiry.count(),
-                'results': serializer_near_expiry.data,
-            },
-            'inactive_members': {
-                'count': members_inactive.count(),
-                'results': serializer_inactive.data,
-            },
-            'days': expiry_days,
-            'inactive_days': inactive_days,
-        }
+        segments = get_segments(club_id, expiry_days, inactive_days)
+
+        response_data = {}
+        for segment in SEGMENTS:
+            ids = [member_id for member_id, _ in segments[segment]]
+            response_data[segment] = {
+                'count': len(ids),
+                'results': MemberSerializer(members_for_ids(ids), many=True).data,
+            }
+        response_data['days'] = expiry_days
+        response_data['inactive_days'] = inactive_days
 
         return Response(response_data, status=status.HTTP_200_OK)
     except Exception as e:
         logger.error(f"Error in export_subscription_report_api: {str(e)}")
-        return Response({'error': f'خطأ داخلي: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        return Response({'error': f'خطأ داخلي: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_subscription_report_stream_api(request):
+    """Stream the member subscription report as CSV or NDJSON."""
+    if not request.user.club:
+        logger.error(f"User {request.user.username} has no associated club")
+        return Response({'error': 'غير مسموح: المستخدم ليس مرتبط بنادي.'}, status=status.HTTP_403_FORBIDDEN)
+
+    export_format = request.GET.get('export_format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return Response({'error': 'صيغة التصدير غير مدعومة (csv أو ndjson).'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        expiry_days = int(request.GET.get('days', 7))
+        inactive_days = int(request.GET.get('inactive_days', 7))
+    except ValueError:
+        expiry_days = inactive_days = 0
+    if expiry_days < 1 or inactive_days < 1:
+        return Response({'error': 'يجب أن تكون أيام الانتهاء وعدم الحضور قيمًا صحيحة وموجبة'}, status=status.HTTP_400_BAD_REQUEST)
+
+    segments = get_segments(request.user.club.id, expiry_days, inactive_days)
+    columns = [
+        ('segment', 'التصنيف'),
+        ('id', 'id'),
+        ('membership_number', 'رقم العضوية'),
+        ('name', 'الاسم'),
+        ('phone', 'الهاتف'),
+        ('rfid_code', 'RFID'),
+        ('gender', 'النوع'),
+        ('current_subscription_end', 'نهاية الاشتراك'),
+        ('last_attendance_at', 'آخر حضور'),
+    ]
+    fields = [key for key, _ in columns if key not in ('segment', 'id')]
+    rows = iter_segment_values(segments, fields)
+    return streaming_export(rows, columns, f"subscription_report_{timezone.localdate().isoformat()}", export_format)
@@ -0,0 +1,207 @@
+import logging
+
+from django.db import transaction
+from django.db.models import Q
+
+from attendance.models import EntryLog
+from invites.models import FreeInvite
+from subscriptions.models import Subscription
+from utils.phone import phone_suffix_q, reverse_digits
+from utils.text import name_fingerprint
+from .activity import refresh_member_activity
+from .models import Member
+from .segments import invalidate_segments
+
+logger = logging.getLogger(__name__)
+
+# آخر 9 أرقام من الهاتف تكفي لمطابقة 010... و +2010... لنفس الرقم
+PHONE_MATCH_DIGITS = 9
+MIN_PHONE_DIGITS = 7
+MIN_NATIONAL_ID_LENGTH = 10
+REASON_SCORES = {
+    'national_id': 3,
+    'phone': 2,
+    'name_birth_date': 2,
+    'name': 1,
+}
+DUPLICATE_FIELDS = ('id', 'name', 'membership_number', 'phone', 'phone2', 'national_id', 'birth_date', 'created_at')
+# الحقول التي تنسخ من العضو المكرر لو كانت فارغة في العضو الأساسي
+MERGE_FILL_FIELDS = ('rfid_code', 'national_id', 'phone2', 'job', 'address', 'note', 'gender', 'referred_by_id')
+
+
+def phone_key(value):
+    """Reversed last digits of a phone, or None if too short to be a reliable match."""
+    digits = reverse_digits(value)
+    if not digits or len(digits) < MIN_PHONE_DIGITS:
+        return None
+    return digits[:PHONE_MATCH_DIGITS]
+
+
+def national_id_key(value):
+    value = (value or '').strip()
+    # تجاهل القيم الافتراضية مثل 0000000000
+    if len(value) < MIN_NATIONAL_ID_LENGTH or len(set(value)) == 1:
+        return None
+    return value
+
+
+def _reasons(row, national_id, phone_keys, fingerprint, birth_date):
+    reasons = []
+    if national_id and row['national_id'] == national_id:
+        reasons.append('national_id')
+    row_phones = {phone_key(row['phone']), phone_key(row['phone2'])} - {None}
+    if phone_keys & row_phones:
+        reasons.append('phone')
+    if fingerprint and row['name_fingerprint'] == fingerprint:
+        reasons.append('name_birth_date' if birth_date and row['birth_date'] == birth_date else 'name')
+    return reasons
+
+
+def find_possible_duplicates(club_id, name=None, phone=None, phone2=None, national_id=None,
+                             birth_date=None, exclude_id=None, limit=20):
+    """
+    Members of the club that look like the given registration data, best match first.
+    Every condition is an indexed lookup (national id, reversed phone range, name fingerprint).
+    """
+    national_id = national_id_key(national_id)
+    phone_keys = {phone_key(phone), phone_key(phone2)} - {None}
+    fingerprint = name_fingerprint(name)
+
+    condition = Q()
+    if national_id:
+        condition |= Q(national_id=national_id)
+    for key in phone_keys:
+        suffix = key[::-1]
+        condition |= phone_suffix_q('phone_reversed', suffix) | phone_suffix_q('phone2_reversed', suffix)
+    if fingerprint:
+        condition |= Q(name_fingerprint=fingerprint)
+    if not condition:
+        return []
+
+    rows = Member.objects.filter(condition, club_id=club_id)
+    if exclude_id:
+        rows = rows.exclude(id=exclude_id)
+    rows = rows.order_by('-id').values(*DUPLICATE_FIELDS, 'name_fingerprint')[:limit * 5]
+
+    matches = []
+    for row in rows:
+        reasons = _reasons(row, national_id, phone_keys, fingerprint, birth_date)
+        if not reasons:
+            continue
+        row.pop('name_fingerprint')
+        row['reasons'] = reasons
+        row['score'] = sum(REASON_SCORES[reason] for reason in reasons)
+        matches.append(row)
+    matches.sort(key=lambda row: -row['score'])
+    return matches[:limit]
+
+
+def _find(parents, item):
+    while parents[item] != item:
+        parents[item] = parents[parents[item]]
+        item = parents[item]
+    return item
+
+
+def duplicate_clusters(club_id, include_name_only=False):
+    """
+    Group the club's members that share a national id, phone or name (+ birth date).
+    One pass over the indexed columns with union-find; returns the largest clusters first.
+    """
+    rows = (
+        Member.objects.filter(club_id=club_id)
+        .values_list('id', 'national_id', 'phone_reversed', 'phone2_reversed', 'name_fingerprint', 'birth_date')
+        .iterator(chunk_size=2000)
+    )
+
+    parents = {}
+    owners = {}
+    member_keys = {}
+    for member_id, national_id, phone_reversed, phone2_reversed, fingerprint, birth_date in rows:
+        keys = []
+        if national_id_key(national_id):
+            keys.append(('national_id', national_id.strip()))
+        for reversed_phone in (phone_reversed, phone2_reversed):
+            if reversed_phone and len(reversed_phone) >= MIN_PHONE_DIGITS:
+                keys.append(('phone', reversed_phone[:PHONE_MATCH_DIGITS]))
+        if fingerprint:
+            keys.append(('name_birth_date', fingerprint, birth_date))
+            if include_name_only:
+                keys.append(('name', fingerprint))
+        if not keys:
+            continue
+
+        parents.setdefault(member_id, member_id)
+        member_keys[member_id] = keys
+        for key in keys:
+            owner = owners.setdefault(key, member_id)
+            if owner != member_id:
+                parents[_find(parents, member_id)] = _find(parents, owner)
+
+    groups = {}
+    for member_id in parents:
+        groups.setdefault(_find(parents, member_id), []).append(member_id)
+    groups = [sorted(ids) for ids in groups.values() if len(ids) > 1]
+    if not groups:
+        return []
+
+    details = Member.objects.in_bulk([member_id for ids in groups for member_id in ids])
+    clusters = []
+    for ids in groups:
+        key_counts = {}
+        for member_id in ids:
+            for key in set(member_keys[member_id]):
+                key_counts[key] = key_counts.get(key, 0) + 1
+        reasons = sorted({key[0] for key, count in key_counts.items() if count > 1})
+        clusters.append({
+            'reasons': reasons,
+            'members': [
+                {field: getattr(details[member_id], field) for field in DUPLICATE_FIELDS}
+                for member_id in ids if member_id in details
+            ],
+        })
+    clusters.sort(key=lambda cluster: (-len(cluster['members']), cluster['members'][0]['id']))
+    return clusters
+
+
+def merge_members(target, duplicates):
+    """
+    Move subscriptions (with their attendance), entry logs, invites and referrals of the
+    duplicates to `target`, fill target's empty fields from them and delete the duplicates.
+    """
+    duplicate_ids = [member.pk for member in duplicates if member.pk != target.pk]
+    if not duplicate_ids:
+        return {'merged': 0}
+    if any(member.club_id != target.club_id for member in duplicates):
+        raise ValueError('لا يمكن دمج أعضاء من أندية مختلفة.')
+
+    with transaction.atomic():
+        counts = {
+            'subscriptions': Subscription.objects.filter(member_id__in=duplicate_ids).update(member=target),
+            'entry_logs': EntryLog.objects.filter(member_id__in=duplicate_ids).update(member=target),
+            'invites': FreeInvite.objects.filter(invited_by_id__in=duplicate_ids).update(invited_by=target),
+            'referrals': Member.objects.filter(referred_by_id__in=duplicate_ids)
+                .exclude(id__in=[target.pk, *duplicate_ids]).update(referred_by=target),
+        }
+
+        for duplicate in sorted(duplicates, key=lambda member: member.pk):
+            if duplicate.pk == target.pk:
+                continue
+            for field in MERGE_FILL_FIELDS:
+                if not getattr(target, field) and getattr(duplicate, field):
+                    setattr(target, field, getattr(duplicate, field))
+            if not target.photo and duplicate.photo:
+                target.photo = duplicate.photo
+                target.photo_variants = duplicate.photo_variants
+        if target.referred_by_id in duplicate_ids or target.referred_by_id == target.pk:
+            target.referred_by = None
+
+        # الحذف قبل الحفظ حتى لا يتعارض RFID المنقول مع قيد التفرد
+        Member.objects.filter(id__in=duplicate_ids).delete()
+        target.save()
+        refresh_member_activity([target.pk])
+        transaction.on_commit(lambda: invalidate_segments(target.club_id))
+
+    counts['merged'] = len(duplicate_ids)
+    logger.info(f"Merged members {duplicate_ids} into {target.pk}: {counts}")
+    return counts
@@ -0,0 +1,175 @@
+import logging
+
+from django.db import IntegrityError, transaction
+
+from utils.generate_membership_number import generate_membership_numbers
+from utils.phone import normalize_phone, reverse_digits
+from utils.tabular import parse_date
+from utils.text import name_fingerprint
+from .models import Member
+from .search import index_members
+from .segments import invalidate_segments
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+OPTIONAL_FIELDS = ('phone2', 'job', 'address', 'note')
+GENDERS = dict(Member.GENDER_CHOICES)
+
+
+def _clean(value):
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+class MemberImporter:
+    """
+    Validates member rows in chunks with set-based uniqueness checks, reserves
+    membership numbers as one block per chunk and inserts with bulk_create.
+    import_members runs the whole import in one transaction.
+    """
+
+    def __init__(self, club, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+        self.club = club
+        self.chunk_size = max(1, int(chunk_size))
+        self.dry_run = dry_run
+        self.results = []
+        self.created = 0
+        # قيم تم قبولها في صفوف سابقة من نفس الملف
+        self._seen = {'rfid_code': set(), 'phone': set(), 'national_id': set()}
+
+    def _validate(self, row):
+        errors = {}
+        data = {'name': _clean(row.get('name'))}
+        if not data['name']:
+            errors['name'] = 'الاسم مطلوب'
+
+        data['phone'] = normalize_phone(_clean(row.get('phone')))
+        if not data['phone']:
+            errors['phone'] = 'رقم الهاتف مطلوب'
+
+        try:
+            data['birth_date'] = parse_date(row.get('birth_date'))
+            if not data['birth_date']:
+                errors['birth_date'] = 'تاريخ الميلاد مطلوب'
+        except ValueError as e:
+            errors['birth_date'] = str(e)
+
+        data['national_id'] = _clean(row.get('national_id'))
+        if len(data['national_id']) > 14:
+            errors['national_id'] = 'الرقم القومي لا يزيد عن 14 رقم'
+
+        data['rfid_code'] = _clean(row.get('rfid_code')) or None
+        gender = _clean(row.get('gender')).upper() or None
+        if gender and gender not in GENDERS:
+            errors['gender'] = 'النوع يجب أن يكون M أو F'
+        data['gender'] = gender
+
+        for field in OPTIONAL_FIELDS:
+            data[field] = _clean(row.get(field)) or None
+        data['phone2'] = normalize_phone(data['phone2']) or None
+        return data, errors
+
+    def _existing(self, field, values):
+        values = {v for v in values if v}
+        if not values:
+            return set()
+        members = Member.objects.filter(**{f'{field}__in': values})
+        if field != 'rfid_code':
+            # RFID فريد على مستوى النظام، الهاتف والرقم القومي داخل النادي فقط
+            members = members.filter(club=self.club)
+        return set(members.values_list(field, flat=True))
+
+    def _process_chunk(self, chunk):
+        validated = [(row_number, *self._validate(row)) for row_number, row in chunk]
+
+        existing = {
+            field: self._existing(field, (data[field] for _, data, _ in validated))
+            for field in self._seen
+        }
+
+        valid = []
+        for row_number, data, errors in validated:
+            for field, label in (('rfid_code', 'RFID'), ('phone', 'رقم الهاتف'), ('national_id', 'الرقم القومي')):
+                value = data[field]
+                if value and field not in errors and (value in existing[field] or value in self._seen[field]):
+                    errors[field] = f'{label} مستخدم بالفعل'
+            if errors:
+                self.results.append({'row': row_number, 'status': 'error', 'errors': errors})
+                continue
+            for field in self._seen:
+                if data[field]:
+                    self._seen[field].add(data[field])
+            valid.append((row_number, data))
+
+        if not valid:
+            return
+        if self.dry_run:
+            for row_number, data in valid:
+                self.results.append({'row': row_number, 'status': 'valid', 'name': data['name']})
+            return
+
+        with transaction.atomic():
+            numbers = generate_membership_numbers(len(valid))
+            members = [
+                Member(
+                    club=self.club,
+                    membership_number=number,
+                    phone_reversed=reverse_digits(data['phone']),
+                    phone2_reversed=reverse_digits(data['phone2']),
+                    name_fingerprint=name_fingerprint(data['name']),
+                    **data,
+                )
+                for number, (_, data) in zip(numbers, valid)
+            ]
+            created = Member.objects.bulk_create(members)
+            # bulk_create لا يرسل post_save لذلك نبني فهرس البحث هنا
+            index_members(created)
+
+        for (row_number, _), member in zip(valid, created):
+            self.results.append({
+                'row': row_number,
+                'status': 'created',
+                'id': member.pk,
+                'membership_number': member.membership_number,
+            })
+        self.created += len(created)
+
+    def run(self, rows):
+        """Import an iterable of dict rows; row numbers start at 1."""
+        chunk = []
+        for row_number, row in enumerate(rows, start=1):
+            chunk.append((row_number, row))
+            if len(chunk) >= self.chunk_size:
+                self._process_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._process_chunk(chunk)
+        if self.created:
+            transaction.on_commit(lambda: invalidate_segments(self.club.id))
+        return self.summary()
+
+    def summary(self):
+        self.results.sort(key=lambda r: r['row'])
+        errors = sum(1 for r in self.results if r['status'] == 'error')
+        return {
+            'dry_run': self.dry_run,
+            'total_rows': len(self.results),
+            'created': self.created,
+            'errors': errors,
+            'results': self.results,
+        }
+
+
+def import_members(club, rows, **options):
+    """
+    Import rows as one transaction: a conflict in any chunk (IntegrityError from a concurrent
+    registration) rolls back every chunk, so either all the reported rows exist or none do.
+    """
+    try:
+        with transaction.atomic():
+            return MemberImporter(club, **options).run(rows)
+    except IntegrityError as e:
+        logger.error(f"IntegrityError during bulk member import: {str(e)}")
+        raise ValueError('تعارض في البيانات أثناء الحفظ (رقم عضوية أو RFID مكرر)، لم يتم حفظ أي عضو.')
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import User
+from members.models import Member
+from utils.phone import normalize_phone, reverse_digits
+from utils.text import name_fingerprint
+
+
+class Command(BaseCommand):
+    help = "Normalize stored phone numbers and fill the reversed-digits suffix and name fingerprint columns."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+
+        members_updated = 0
+        last_id = 0
+        while True:
+            batch = list(
+                Member.objects.filter(id__gt=last_id).order_by('id')
+                .only('id', 'name', 'phone', 'phone2', 'phone_reversed', 'phone2_reversed', 'name_fingerprint')[:batch_size]
+            )
+            if not batch:
+                break
+            changed = []
+            for member in batch:
+                phone = normalize_phone(member.phone)
+                phone2 = normalize_phone(member.phone2) or None
+                values = (phone, phone2, reverse_digits(phone), reverse_digits(phone2), name_fingerprint(member.name))
+                current = (member.phone, member.phone2, member.phone_reversed, member.phone2_reversed, member.name_fingerprint)
+                if values != current:
+                    (member.phone, member.phone2, member.phone_reversed,
+                     member.phone2_reversed, member.name_fingerprint) = values
+                    changed.append(member)
+            if changed and not dry_run:
+                with transaction.atomic():
+                    Member.objects.bulk_update(
+                        changed, ['phone', 'phone2', 'phone_reversed', 'phone2_reversed', 'name_fingerprint']
+                    )
+            members_updated += len(changed)
+            last_id = batch[-1].id
+
+        users = []
+        for user in User.objects.only('id', 'phone_number', 'phone_number_reversed'):
+            phone = normalize_phone(user.phone_number) or None
+            reversed_phone = reverse_digits(phone)
+            if (phone, reversed_phone) != (user.phone_number, user.phone_number_reversed):
+                user.phone_number, user.phone_number_reversed = phone, reversed_phone
+                users.append(user)
+        if users and not dry_run:
+            User.objects.bulk_update(users, ['phone_number', 'phone_number_reversed'], batch_size=batch_size)
+
+        prefix = "[dry-run] " if dry_run else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Updated {members_updated} members and {len(users)} users"
+        ))
@@ -0,0 +1,50 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Club
+from members.importer import DEFAULT_CHUNK_SIZE, import_members
+from utils.tabular import iter_rows
+
+
+class Command(BaseCommand):
+    help = "Bulk register members of a club from a CSV/XLSX file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Path to the CSV or XLSX file")
+        parser.add_argument('--club', type=int, required=True, help="Club id the members belong to")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help="Validate rows without writing anything")
+        parser.add_argument('--results-file', help="Write the per-row results to this JSON file")
+
+    def handle(self, *args, **options):
+        try:
+            club = Club.objects.get(id=options['club'])
+        except Club.DoesNotExist:
+            raise CommandError(f"Club {options['club']} not found")
+
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                result = import_members(
+                    club,
+                    iter_rows(fileobj, options['path']),
+                    chunk_size=options['chunk_size'],
+                    dry_run=options['dry_run'],
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        errors = [row for row in result['results'] if row['status'] == 'error']
+        for row in errors[:50]:
+            self.stderr.write(f"row {row['row']}: {row['errors']}")
+        if len(errors) > 50:
+            self.stderr.write(f"... {len(errors) - 50} more errors")
+
+        if options['results_file']:
+            with open(options['results_file'], 'w', encoding='utf-8') as f:
+                json.dump(result['results'], f, ensure_ascii=False, indent=2, default=str)
+
+        prefix = "[dry-run] " if result['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}rows={result['total_rows']} created={result['created']} errors={result['errors']}"
+        ))
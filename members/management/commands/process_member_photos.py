@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from members.models import Member
+from members.photos import needs_processing, process_member_photo
+
+
+class Command(BaseCommand):
+    help = "Build thumbnail/medium variants for member photos that have not been processed yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--club', type=int, help="Only process members of this club id")
+        parser.add_argument('--force', action='store_true', help="Reprocess photos that already have variants")
+
+    def handle(self, *args, **options):
+        members = Member.objects.exclude(photo='').exclude(photo__isnull=True).only('id', 'photo', 'photo_variants')
+        if options['club']:
+            members = members.filter(club_id=options['club'])
+
+        processed = 0
+        failed = 0
+        for member in members.iterator(chunk_size=500):
+            if not options['force'] and not needs_processing(member):
+                continue
+            if process_member_photo(member.id):
+                processed += 1
+            else:
+                failed += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} photos ({failed} failed)"))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from members.models import Member
+from members.search import index_members
+
+
+class Command(BaseCommand):
+    help = "Rebuild the member search index for all members (or one club)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--club', type=int, help="Only rebuild members of this club id")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        members = Member.objects.order_by('id')
+        if options['club']:
+            members = members.filter(club_id=options['club'])
+
+        batch_size = options['batch_size']
+        total_members = 0
+        total_tokens = 0
+        last_id = 0
+        while True:
+            batch = list(members.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                total_tokens += index_members(batch)
+            total_members += len(batch)
+            last_id = batch[-1].id
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total_members} members ({total_tokens} tokens)"))
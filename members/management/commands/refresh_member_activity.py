@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from members.activity import refresh_member_activity
+from members.models import Member
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfill last_attendance_at, current_attendance_at, current_subscription_end and "
+        "active_subscription_count. Run daily so current_attendance_at and active_subscription_count "
+        "follow subscriptions that started or expired."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--club', type=int, help="Only refresh members of this club id")
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        members = Member.objects.order_by('id')
+        if options['club']:
+            members = members.filter(club_id=options['club'])
+
+        batch_size = options['batch_size']
+        last_id = 0
+        total = 0
+        changed = 0
+        while True:
+            ids = list(members.filter(id__gt=last_id).values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            changed += refresh_member_activity(ids)
+            total += len(ids)
+            last_id = ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(f"Checked {total} members, updated {changed}"))
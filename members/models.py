@@ -1,5 +1,7 @@
 from django.db import models
 from utils.generate_membership_number import generate_membership_number
+from utils.phone import normalize_phone, reverse_digits
+from utils.text import name_fingerprint
 
 class Member(models.Model):
     GENDER_CHOICES = (
@@ -15,17 +17,42 @@ class Member(models.Model):
     birth_date = models.DateField()
     phone = models.CharField(max_length=20)
     phone2 = models.CharField(max_length=20, blank=True, null=True)
+    phone_reversed = models.CharField(max_length=20, blank=True, null=True, editable=False)
+    phone2_reversed = models.CharField(max_length=20, blank=True, null=True, editable=False)
+    # الاسم بعد توحيد الحروف وترتيب الكلمات لاكتشاف التسجيل المكرر (members.duplicates)
+    name_fingerprint = models.CharField(max_length=255, blank=True, null=True, editable=False)
     photo = models.ImageField(upload_to='member_photos/', blank=True, null=True)
+    # مسارات نسخ الصورة المصغرة (members.photos) بأسماء مشتقة من محتواها
+    photo_variants = models.JSONField(default=dict, blank=True, editable=False)
     job = models.CharField(max_length=100, blank=True, null=True)
     address = models.CharField(max_length=100, blank=True, null=True)
     note = models.CharField(max_length=100, blank=True, null=True)
     gender = models.CharField(max_length=1, choices=GENDER_CHOICES, blank=True, null=True)  
     created_at = models.DateTimeField(auto_now_add=True)
     referred_by = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL, related_name='referrals')
+    # حقول محسوبة مسبقا يتم تحديثها من members.activity عند الحضور أو تعديل الاشتراكات
+    last_attendance_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # آخر حضور (Attendance فقط) على اشتراك لم ينته بعد، وهو ما يعرضه last_attendance_date
+    current_attendance_at = models.DateTimeField(null=True, blank=True, editable=False)
+    current_subscription_end = models.DateField(null=True, blank=True, editable=False)
+    active_subscription_count = models.PositiveIntegerField(default=0, editable=False)
 
     def save(self, *args, **kwargs):
         if not self.membership_number:
             self.membership_number = generate_membership_number()
+        self.phone = normalize_phone(self.phone)
+        self.phone2 = normalize_phone(self.phone2) or None
+        self.phone_reversed = reverse_digits(self.phone)
+        self.phone2_reversed = reverse_digits(self.phone2)
+        self.name_fingerprint = name_fingerprint(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if 'phone' in update_fields or 'phone2' in update_fields:
+                update_fields |= {'phone_reversed', 'phone2_reversed'}
+            if 'name' in update_fields:
+                update_fields.add('name_fingerprint')
+            kwargs['update_fields'] = update_fields
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -38,4 +65,24 @@ class Member(models.Model):
             models.Index(fields=['rfid_code']),
             models.Index(fields=['created_at']),
             models.Index(fields=['gender']),  
-        ]
\ No newline at end of file
+            models.Index(fields=['club', 'phone_reversed']),
+            models.Index(fields=['club', 'phone2_reversed']),
+            models.Index(fields=['club', 'current_subscription_end']),
+            models.Index(fields=['club', 'name_fingerprint']),
+            models.Index(fields=['club', 'national_id']),
+        ]
+
+class MemberSearchToken(models.Model):
+    """Normalized search tokens for a member, kept in sync by members.signals."""
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='search_tokens')
+    club = models.ForeignKey('core.Club', on_delete=models.CASCADE)
+    field = models.CharField(max_length=20)
+    token = models.CharField(max_length=255)
+
+    def __str__(self):
+        return f"{self.member_id}:{self.field}:{self.token}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['club', 'token']),
+        ]
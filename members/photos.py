@@ -0,0 +1,132 @@
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import Member
+
+logger = logging.getLogger(__name__)
+
+# أقصى طول ضلع لكل نسخة من الصورة
+VARIANT_SIZES = {
+    'thumb': 96,
+    'medium': 480,
+}
+ORIGINAL_MAX_SIZE = 1600
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+PHOTO_DIR = 'member_photos'
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='member-photos')
+
+
+def _encode(image, fmt, options):
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+
+def _save_hashed(content, suffix, extension):
+    digest = hashlib.sha256(content).hexdigest()[:20]
+    name = f"{PHOTO_DIR}/{digest}{suffix}.{extension}"
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(content))
+    return name
+
+
+def _render_photo(fileobj):
+    """Return the re-encoded original and {variant: {extension: bytes}} for an uploaded photo."""
+    from PIL import Image, ImageOps
+
+    with Image.open(fileobj) as source:
+        # تصحيح الاتجاه من بيانات EXIF ثم حذفها بإعادة الترميز بدون exif
+        image = ImageOps.exif_transpose(source)
+        image = image.convert('RGB')
+
+    original = image.copy()
+    original.thumbnail((ORIGINAL_MAX_SIZE, ORIGINAL_MAX_SIZE))
+    original_bytes = _encode(original, *VARIANT_FORMATS['jpeg'])
+
+    variants = {}
+    for variant, size in VARIANT_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail((size, size))
+        variants[variant] = {ext: _encode(resized, fmt, options) for ext, (fmt, options) in VARIANT_FORMATS.items()}
+    return original_bytes, variants
+
+
+def process_member_photo(member_id):
+    """Normalize a member's photo and build its thumbnail/medium variants."""
+    member = Member.objects.filter(id=member_id).only('id', 'photo', 'photo_variants').first()
+    if not member or not member.photo:
+        return None
+
+    source_name = member.photo.name
+    try:
+        with member.photo.open('rb') as fileobj:
+            original_bytes, rendered = _render_photo(fileobj)
+    except Exception as e:
+        logger.error(f"Could not process photo for member {member_id}: {str(e)}")
+        return None
+
+    photo_name = _save_hashed(original_bytes, '', 'jpg')
+    variants = {'source': photo_name}
+    for variant, formats in rendered.items():
+        variants[variant] = {ext: _save_hashed(content, f"_{variant}", ext) for ext, content in formats.items()}
+
+    # التحديث فقط لو الصورة لم تتغير أثناء المعالجة
+    updated = Member.objects.filter(id=member_id, photo=source_name).update(photo=photo_name, photo_variants=variants)
+    if not updated:
+        return None
+
+    # بعد حفظ النسخ الجديدة: حذف الملف المرفوع والنسخ السابقة التي لم تعد مستخدمة
+    previous = {source_name, *_variant_names(member.photo_variants)} - {photo_name, *_variant_names(variants)}
+    transaction.on_commit(lambda: _delete_unused(previous))
+    return variants
+
+
+def _variant_names(variants):
+    variants = variants or {}
+    names = [variants.get('source')]
+    names += [name for formats in variants.values() if isinstance(formats, dict) for name in formats.values()]
+    return {name for name in names if name}
+
+
+def _delete_unused(names):
+    """Delete photo files no member refers to; content-hashed files may be shared by several members."""
+    for name in names:
+        if Member.objects.filter(Q(photo=name) | Q(photo_variants__icontains=name)).exists():
+            continue
+        try:
+            default_storage.delete(name)
+        except Exception as e:
+            logger.warning(f"Could not delete photo file {name}: {str(e)}")
+
+
+def _run_in_background(member_id):
+    try:
+        process_member_photo(member_id)
+    except Exception as e:
+        logger.error(f"Photo processing failed for member {member_id}: {str(e)}")
+    finally:
+        connection.close()
+
+
+def schedule_photo_processing(member_id):
+    """Process the photo after the current transaction commits, off the request thread."""
+    if getattr(settings, 'MEMBER_PHOTO_ASYNC', True):
+        transaction.on_commit(lambda: _executor.submit(_run_in_background, member_id))
+    else:
+        transaction.on_commit(lambda: process_member_photo(member_id))
+
+
+def needs_processing(member):
+    return bool(member.photo) and (member.photo_variants or {}).get('source') != member.photo.name
@@ -0,0 +1,164 @@
+import logging
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, Prefetch, Q
+from django.utils import timezone
+
+from attendance.models import Attendance
+from invites.models import FreeInvite
+from subscriptions.models import Payment, Subscription
+from subscriptions.serializers import subscription_status
+from .models import Member
+from .serializers import MemberSerializer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CALENDAR_DAYS = 365
+MAX_CALENDAR_DAYS = 730
+RECENT_LIMIT = 50
+
+
+def _freeze_is_active(freeze, today):
+    return freeze.is_active and freeze.start_date <= today and freeze.end_date is not None and freeze.end_date >= today
+
+
+def _subscription_data(subscription, today):
+    freezes = list(subscription.freeze_requests.all())
+    subscription_type = subscription.type
+    return {
+        'id': subscription.id,
+        'type': {
+            'id': subscription_type.id,
+            'name': subscription_type.name,
+            'duration_days': subscription_type.duration_days,
+            'price': subscription_type.price,
+            'max_entries': subscription_type.max_entries or 0,
+            'free_invites_allowed': subscription_type.free_invites_allowed,
+        },
+        'coach': {'id': subscription.coach.id, 'username': subscription.coach.username} if subscription.coach else None,
+        'start_date': subscription.start_date,
+        'end_date': subscription.end_date,
+        'paid_amount': subscription.paid_amount,
+        'remaining_amount': subscription.remaining_amount,
+        'entry_count': subscription.entry_count,
+        'is_cancelled': subscription.is_cancelled,
+        'cancellation_date': subscription.cancellation_date,
+        'refund_amount': subscription.refund_amount,
+        'status': subscription_status(
+            subscription, any(_freeze_is_active(freeze, today) for freeze in freezes), today
+        ),
+        'payments': [
+            {
+                'id': payment.id,
+                'amount': payment.amount,
+                'payment_method': payment.payment_method.name,
+                'payment_date': payment.payment_date,
+                'transaction_id': payment.transaction_id,
+            }
+            for payment in subscription.payments.all()
+        ],
+        'freeze_requests': [
+            {
+                'id': freeze.id,
+                'requested_days': freeze.requested_days,
+                'start_date': freeze.start_date,
+                'end_date': freeze.end_date,
+                'is_active': freeze.is_active,
+            }
+            for freeze in freezes
+        ],
+        'used_invites': subscription.used_invites,
+    }
+
+
+def build_member_profile(member_id, club, request=None, calendar_days=DEFAULT_CALENDAR_DAYS):
+    """
+    Everything the member profile page needs in a fixed number of queries:
+    member (1), subscriptions (1) + payments (1) + freezes (1), attendance calendar (1),
+    referrals (1) and invites (1). Returns None if the member is not in the club.
+    """
+    today = timezone.localdate()
+    calendar_days = max(1, min(int(calendar_days), MAX_CALENDAR_DAYS))
+
+    member = (
+        Member.objects.select_related('club', 'referred_by')
+        .annotate(referrals_count=Count('referrals'))
+        .filter(id=member_id, club=club)
+        .first()
+    )
+    if member is None:
+        return None
+
+    subscriptions = list(
+        Subscription.objects.filter(member_id=member.id, club=club)
+        .select_related('type', 'coach')
+        .annotate(used_invites=Count('free_invites', filter=Q(free_invites__status__in=['pending', 'used'])))
+        .prefetch_related(
+            Prefetch('payments', queryset=Payment.objects.select_related('payment_method').order_by('payment_date')),
+            'freeze_requests',
+        )
+        .order_by('-start_date', '-id')
+    )
+
+    since = today - timedelta(days=calendar_days - 1)
+    since_start = timezone.make_aware(datetime.combine(since, time.min))
+    daily_counts = (
+        Attendance.objects.filter(subscription__member_id=member.id, timestamp__gte=since_start)
+        .values('timestamp__date')
+        .annotate(count=Count('id'))
+        .order_by('timestamp__date')
+    )
+    calendar = [
+        {'date': row['timestamp__date'].isoformat(), 'count': row['count']}
+        for row in daily_counts if row['timestamp__date'] is not None
+    ]
+
+    referrals = list(
+        Member.objects.filter(referred_by_id=member.id)
+        .order_by('-created_at')
+        .values('id', 'name', 'membership_number', 'created_at')[:RECENT_LIMIT]
+    )
+    invites = list(
+        FreeInvite.objects.filter(invited_by_id=member.id)
+        .order_by('-date', '-id')
+        .values('id', 'guest_name', 'phone', 'date', 'status', 'subscription_id')[:RECENT_LIMIT]
+    )
+
+    subscription_data = [_subscription_data(subscription, today) for subscription in subscriptions]
+    invite_quotas = [
+        {
+            'subscription_id': subscription.id,
+            'subscription_type': subscription.type.name,
+            'total_allowed': subscription.type.free_invites_allowed,
+            'used': subscription.used_invites,
+            'remaining': max(0, subscription.type.free_invites_allowed - subscription.used_invites),
+        }
+        for subscription in subscriptions
+        if not subscription.is_cancelled and subscription.start_date <= today and subscription.end_date
+        and subscription.end_date >= today
+    ]
+
+    return {
+        'member': MemberSerializer(member, context={'request': request}).data,
+        'subscriptions': subscription_data,
+        'totals': {
+            'subscriptions': len(subscriptions),
+            'paid_amount': sum((s.paid_amount for s in subscriptions), 0),
+            'remaining_amount': sum((s.remaining_amount for s in subscriptions), 0),
+            'entries': sum(s.entry_count for s in subscriptions),
+        },
+        'attendance': {
+            'since': since,
+            'last_attendance_at': member.last_attendance_at,
+            'calendar': calendar,
+        },
+        'invites': {
+            'quotas': invite_quotas,
+            'recent': invites,
+        },
+        'referrals': {
+            'referred_by': {'id': member.referred_by.id, 'name': member.referred_by.name} if member.referred_by else None,
+            'count': member.referrals_count,
+            'recent': referrals,
+        },
+    }
@@ -0,0 +1,160 @@
+import logging
+
+from django.db.models import Case, Exists, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import Member, MemberSearchToken
+from utils.phone import is_phone_query, phone_suffix_q
+from utils.text import normalize_text, tokenize
+
+logger = logging.getLogger(__name__)
+
+# أقصى عدد نتائج لقائمة المعرفات المرتبة (الإكمال التلقائي)؛ القوائم المقسمة لصفحات بدون حد
+MAX_RESULTS = 500
+
+# الحقول المفهرسة ووزن كل حقل في الترتيب
+FIELD_WEIGHTS = {
+    'rfid_code': 40,
+    'membership_number': 30,
+    'national_id': 20,
+    'phone': 20,
+    'phone2': 10,
+    'name': 10,
+}
+EXACT_BONUS = 2
+
+# أعلى حرف يونيكود لعمل بحث البادئة كنطاق على الفهرس
+_PREFIX_END = '\U0010ffff'
+
+
+def build_tokens(member):
+    """Return unsaved MemberSearchToken rows for a member."""
+    tokens = []
+    seen = set()
+    for field in FIELD_WEIGHTS:
+        raw = getattr(member, field, None)
+        if not raw:
+            continue
+        values = tokenize(raw) if field == 'name' else [normalize_text(raw).replace(' ', '')]
+        for token in values:
+            key = (field, token[:255])
+            if not token or key in seen:
+                continue
+            seen.add(key)
+            tokens.append(MemberSearchToken(
+                member_id=member.pk, club_id=member.club_id, field=field, token=token[:255]
+            ))
+    return tokens
+
+
+def index_member(member):
+    MemberSearchToken.objects.filter(member_id=member.pk).delete()
+    MemberSearchToken.objects.bulk_create(build_tokens(member))
+
+
+def index_members(members, batch_size=1000):
+    """Rebuild the index for many members at once (used by bulk imports and backfills)."""
+    members = list(members)
+    if not members:
+        return 0
+    MemberSearchToken.objects.filter(member_id__in=[m.pk for m in members]).delete()
+    tokens = []
+    for member in members:
+        tokens.extend(build_tokens(member))
+    MemberSearchToken.objects.bulk_create(tokens, batch_size=batch_size)
+    return len(tokens)
+
+
+def ranked_member_ids(club_id, query, limit=MAX_RESULTS):
+    """
+    Return member ids whose tokens start with every word of the query,
+    best matches first.
+    """
+    words = tokenize(query)
+    if not words:
+        return []
+
+    token_filter = Q()
+    for word in words:
+        token_filter |= Q(token__gte=word, token__lt=word + _PREFIX_END)
+
+    scores = {}
+    matched = {}
+    rows = MemberSearchToken.objects.filter(token_filter, club_id=club_id).values_list('member_id', 'field', 'token')
+    for member_id, field, token in rows:
+        for index, word in enumerate(words):
+            if not token.startswith(word):
+                continue
+            matched.setdefault(member_id, set()).add(index)
+            weight = FIELD_WEIGHTS[field] * (EXACT_BONUS if token == word else 1)
+            scores[member_id] = scores.get(member_id, 0) + weight
+
+    if len(words) == 1 and is_phone_query(query):
+        # البحث بآخر أرقام الهاتف عن طريق عمود الأرقام المعكوسة
+        suffix_ids = Member.objects.filter(
+            phone_suffix_q('phone_reversed', query) | phone_suffix_q('phone2_reversed', query),
+            club_id=club_id,
+        ).values_list('id', flat=True)[:limit]
+        for member_id in suffix_ids:
+            matched.setdefault(member_id, set()).add(0)
+            scores[member_id] = scores.get(member_id, 0) + FIELD_WEIGHTS['phone']
+
+    ranked = [member_id for member_id, hits in matched.items() if len(hits) == len(words)]
+    ranked.sort(key=lambda member_id: (-scores[member_id], -member_id))
+    return ranked[:limit]
+
+
+def _word_tokens(club_id, word):
+    """Tokens of the outer member that start with word."""
+    return MemberSearchToken.objects.filter(
+        member_id=OuterRef('pk'), club_id=club_id, token__gte=word, token__lt=word + _PREFIX_END
+    )
+
+
+def _word_score(club_id, word):
+    """Same weights as ranked_member_ids, summed in a subquery for the outer member."""
+    weight = Case(
+        *[When(field=field, then=Value(value)) for field, value in FIELD_WEIGHTS.items()],
+        default=Value(0), output_field=IntegerField(),
+    ) * Case(When(token=word, then=Value(EXACT_BONUS)), default=Value(1), output_field=IntegerField())
+    scores = _word_tokens(club_id, word).values('member_id').annotate(score=Sum(weight)).values('score')
+    return Coalesce(Subquery(scores, output_field=IntegerField()), Value(0))
+
+
+def _search_terms(club_id, query):
+    """(words, phone suffix Q or None) for a query."""
+    words = tokenize(query)
+    phone = None
+    if len(words) == 1 and is_phone_query(query):
+        phone = phone_suffix_q('phone_reversed', query) | phone_suffix_q('phone2_reversed', query)
+    return words, phone
+
+
+def matching_members(club_id, query, queryset=None):
+    """Members whose tokens start with every word of the query, filtered in SQL (unordered)."""
+    if queryset is None:
+        queryset = Member.objects.filter(club_id=club_id)
+    words, phone = _search_terms(club_id, query)
+    if not words:
+        return queryset.none()
+    for word in words:
+        match = Q(Exists(_word_tokens(club_id, word)))
+        queryset = queryset.filter(match | phone if phone else match)
+    return queryset
+
+
+def search_members(club_id, query, queryset=None):
+    """Members matching the query ordered by rank in SQL, so every page and the count stay exact."""
+    words, phone = _search_terms(club_id, query)
+    queryset = matching_members(club_id, query, queryset)
+    if not words:
+        return queryset
+    score = sum((_word_score(club_id, word) for word in words), Value(0))
+    if phone:
+        score += Case(When(phone, then=Value(FIELD_WEIGHTS['phone'])), default=Value(0), output_field=IntegerField())
+    return queryset.annotate(search_score=score).order_by('-search_score', '-id')
+
+
+def filter_by_member_search(queryset, club_id, query, member_field='member_id'):
+    """Restrict a queryset of related rows (e.g. subscriptions) to members matching the query."""
+    return queryset.filter(**{f'{member_field}__in': matching_members(club_id, query).values('id')})
@@ -0,0 +1,118 @@
+import logging
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .models import Member
+
+logger = logging.getLogger(__name__)
+
+SEGMENTS = (
+    'without_subscriptions',
+    'expired_subscriptions',
+    'near_expiry_subscriptions',
+    'inactive_members',
+)
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _version_key(club_id):
+    return f"member_segments_version:{club_id}"
+
+
+def invalidate_segments(club_id):
+    """Drop cached segments of a club (called when its members or subscriptions change)."""
+    if not club_id:
+        return
+    try:
+        cache.incr(_version_key(club_id))
+    except ValueError:
+        cache.set(_version_key(club_id), 1, timeout=None)
+
+
+def compute_segments(club_id, expiry_days, inactive_days, today=None):
+    """
+    Classify every member of the club in one grouped query.
+    Returns {segment: [(member_id, gender), ...]} ordered by member id.
+    """
+    today = today or timezone.localdate()
+    expiry_threshold = today + timedelta(days=expiry_days)
+    inactive_threshold = today - timedelta(days=inactive_days)
+
+    rows = (
+        Member.objects.filter(club_id=club_id)
+        .annotate(
+            subscription_total=Count('subscription'),
+            first_end=Min('subscription__end_date'),
+            near_expiry=Count('subscription', filter=Q(
+                subscription__end_date__gte=today, subscription__end_date__lte=expiry_threshold
+            )),
+            current=Count('subscription', filter=Q(subscription__end_date__gte=today)),
+        )
+        .order_by('id')
+        .values_list('id', 'gender', 'last_attendance_at', 'subscription_total', 'first_end', 'near_expiry', 'current')
+    )
+
+    segments = {name: [] for name in SEGMENTS}
+    for member_id, gender, last_attendance_at, total, first_end, near_expiry, current in rows:
+        item = (member_id, gender)
+        if not total:
+            segments['without_subscriptions'].append(item)
+            continue
+        if first_end and first_end < today:
+            segments['expired_subscriptions'].append(item)
+        if near_expiry:
+            segments['near_expiry_subscriptions'].append(item)
+        if current:
+            last_date = timezone.localtime(last_attendance_at).date() if last_attendance_at else None
+            if not last_date or last_date <= inactive_threshold:
+                segments['inactive_members'].append(item)
+    return segments
+
+
+def get_segments(club_id, expiry_days, inactive_days, refresh=False):
+    """Segments for today, cached per club until the day ends or the club's data changes."""
+    today = timezone.localdate()
+    version = cache.get(_version_key(club_id), 0)
+    key = f"member_segments:{club_id}:{today.isoformat()}:{expiry_days}:{inactive_days}:{version}"
+    segments = None if refresh else cache.get(key)
+    if segments is None:
+        segments = compute_segments(club_id, expiry_days, inactive_days, today=today)
+        cache.set(key, segments, timeout=CACHE_TIMEOUT)
+        logger.debug(f"Computed member segments for club {club_id}: " +
+                     ", ".join(f"{name}={len(items)}" for name, items in segments.items()))
+    return segments
+
+
+def filter_segment(items, gender=None, member_ids=None):
+    """Apply the report's gender/search filters to a cached segment and return member ids."""
+    return [
+        member_id for member_id, member_gender in items
+        if (not gender or member_gender == gender) and (member_ids is None or member_id in member_ids)
+    ]
+
+
+def members_for_ids(ids, chunk_size=500):
+    """Yield Member objects in the given id order, loading them in chunks."""
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        members = Member.objects.select_related('club', 'referred_by').in_bulk(chunk)
+        for member_id in chunk:
+            if member_id in members:
+                yield members[member_id]
+
+
+def iter_segment_values(segments, fields, chunk_size=1000):
+    """Yield values() dicts for every member of every segment, tagged with the segment name."""
+    for segment in SEGMENTS:
+        ids = [member_id for member_id, _ in segments[segment]]
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            rows = {row['id']: row for row in Member.objects.filter(id__in=chunk).values('id', *fields)}
+            for member_id in chunk:
+                row = rows.get(member_id)
+                if row is not None:
+                    row['segment'] = segment
+                    yield row
@@ -1,13 +1,15 @@
 from rest_framework import serializers
+from django.core.files.storage import default_storage
 from django.utils import timezone
 from .models import Member
-from attendance.models import Attendance
 
 class MemberSerializer(serializers.ModelSerializer):
     referred_by_name = serializers.CharField(source='referred_by.name', read_only=True)
     club_name = serializers.CharField(source='club.name', read_only=True)
     last_attendance_date = serializers.SerializerMethodField()
     near_expiry_date = serializers.SerializerMethodField()
+    photo_thumbnail = serializers.SerializerMethodField()
+    photo_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Member
@@ -15,8 +17,11 @@ class MemberSerializer(serializers.ModelSerializer):
             'id', 'club', 'club_name', 'name', 'membership_number', 'rfid_code',
             'national_id', 'birth_date', 'phone', 'phone2', 'photo', 'job',
             'address', 'note', 'gender', 'created_at', 'referred_by', 'referred_by_name',
-            'last_attendance_date', 'near_expiry_date'
+            'last_attendance_date', 'near_expiry_date',
+            'last_attendance_at', 'current_subscription_end', 'active_subscription_count',
+            'photo_thumbnail', 'photo_variants'
         ]
+        read_only_fields = ['last_attendance_at', 'current_subscription_end', 'active_subscription_count']
         extra_kwargs = {
             'photo': {'required': False, 'allow_null': True},
             'referred_by': {'required': False, 'allow_null': True},
@@ -29,23 +34,30 @@ class MemberSerializer(serializers.ModelSerializer):
             'gender': {'required': False, 'allow_null': True}, 
         }
 
-    # def get_last_attendance_date(self, obj):
-    #     last_attendance = Attendance.objects.filter(
-    #         subscription__member=obj,
-    #         subscription__end_date__gte=timezone.now().date()
-    #     ).order_by('-timestamp').first()
-    #     return last_attendance.timestamp.date() if last_attendance else None
-    
     def get_last_attendance_date(self, obj):
-        last_attendance = Attendance.objects.filter(
-            subscription__member=obj,
-            subscription__end_date__gte=timezone.now().date()
-        ).order_by('-timestamp').first()
-        return last_attendance.timestamp.date() if last_attendance and last_attendance.timestamp else None
-    
-    
+        # آخر حضور على اشتراك لم ينته، محسوب مسبقا على العضو (members.activity) بدلا من استعلام لكل عضو
+        if not obj.current_attendance_at or not obj.current_subscription_end:
+            return None
+        if obj.current_subscription_end < timezone.now().date():
+            return None
+        return obj.current_attendance_at.date()
+
     def get_near_expiry_date(self, obj):
-        subscription = obj.subscription_set.filter(
-            end_date__gte=timezone.now().date()
-        ).order_by('-end_date').first()
-        return subscription.end_date if subscription else None
+        end_date = obj.current_subscription_end
+        return end_date if end_date and end_date >= timezone.now().date() else None
+
+    def _media_url(self, name):
+        url = default_storage.url(name)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def get_photo_variants(self, obj):
+        variants = obj.photo_variants or {}
+        return {
+            variant: {ext: self._media_url(name) for ext, name in formats.items()}
+            for variant, formats in variants.items() if isinstance(formats, dict)
+        }
+
+    def get_photo_thumbnail(self, obj):
+        name = ((obj.photo_variants or {}).get('thumb') or {}).get('jpeg')
+        return self._media_url(name) if name else None
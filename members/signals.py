@@ -0,0 +1,115 @@
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Member
+from .search import index_member
+from .activity import refresh_member_activity, record_attendance
+from .segments import invalidate_segments
+from .photos import needs_processing, schedule_photo_processing
+from attendance.models import Attendance, EntryLog
+from subscriptions.models import Subscription
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Member)
+def update_member_search_index(sender, instance, raw=False, **kwargs):
+    """Keep the member search tokens in sync with the member row."""
+    if raw:
+        return
+    index_member(instance)
+    invalidate_segments(instance.club_id)
+    if needs_processing(instance):
+        schedule_photo_processing(instance.pk)
+
+
+@receiver(post_delete, sender=Member)
+def member_deleted(sender, instance, **kwargs):
+    invalidate_segments(instance.club_id)
+
+
+def _attendance_subscription(attendance):
+    """(member_id, club_id, end_date) of an attendance's subscription."""
+    if Attendance.subscription.is_cached(attendance):
+        subscription = attendance.subscription
+        return subscription.member_id, subscription.club_id, subscription.end_date
+    return (
+        Subscription.objects.filter(id=attendance.subscription_id).values_list('member_id', 'club_id', 'end_date').first()
+        or (None, None, None)
+    )
+
+
+def _activity_changed(member_id, club_id, timestamp=None, created=False, current=False):
+    """Update Member.last_attendance_at and drop the club's segments if it changed them."""
+    if created:
+        changed = record_attendance(member_id, timestamp, current=current)
+    else:
+        changed = refresh_member_activity([member_id])
+    if changed:
+        invalidate_segments(club_id)
+
+
+@receiver(post_save, sender=Attendance)
+def attendance_saved(sender, instance, created, raw=False, **kwargs):
+    """Keep Member.last_attendance_at current."""
+    if raw:
+        return
+    member_id, club_id, end_date = _attendance_subscription(instance)
+    _activity_changed(
+        member_id, club_id, timestamp=instance.timestamp, created=created,
+        current=bool(end_date) and end_date >= timezone.now().date(),
+    )
+
+
+@receiver(post_delete, sender=Attendance)
+def attendance_deleted(sender, instance, **kwargs):
+    member_id, club_id, _ = _attendance_subscription(instance)
+    _activity_changed(member_id, club_id)
+
+
+@receiver(post_save, sender=EntryLog)
+def entry_log_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    _activity_changed(instance.member_id, instance.club_id, timestamp=instance.timestamp, created=created)
+
+
+@receiver(post_delete, sender=EntryLog)
+def entry_log_deleted(sender, instance, **kwargs):
+    _activity_changed(instance.member_id, instance.club_id)
+
+
+# حقول الاشتراك التي تغير تصنيف الأعضاء؛ تعديل عدد الدخول عند كل حضور لا يغيرها
+SEGMENT_FIELDS = ('member_id', 'start_date', 'end_date', 'is_cancelled')
+
+
+def _segment_values(subscription):
+    return tuple(getattr(subscription, field) for field in SEGMENT_FIELDS)
+
+
+@receiver(pre_save, sender=Subscription)
+def remember_subscription_fields(sender, instance, raw=False, **kwargs):
+    """Remember the stored segment fields of an edited subscription."""
+    instance._segment_previous = None
+    if raw or not instance.pk:
+        return
+    instance._segment_previous = sender.objects.filter(pk=instance.pk).values_list(*SEGMENT_FIELDS).first()
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_saved(sender, instance, created, raw=False, **kwargs):
+    """Keep Member.current_subscription_end and active_subscription_count current."""
+    if raw:
+        return
+    previous = getattr(instance, '_segment_previous', None)
+    member_ids = [instance.member_id, previous[0] if previous else None]
+    changed = refresh_member_activity(member_ids)
+    if created or changed or previous is None or previous != _segment_values(instance):
+        invalidate_segments(instance.club_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(sender, instance, **kwargs):
+    refresh_member_activity([instance.member_id])
+    invalidate_segments(instance.club_id)
@@ -1,3 +1,378 @@
-from django.test import TestCase
+import io
+import json
+import shutil
+import tempfile
+from datetime import date, datetime, time, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from accounts.models import User
+from attendance.api import add_attendance_api
+from attendance.models import Attendance, EntryLog
+from core.models import Club
+from invites.models import FreeInvite
+from subscriptions.importer import import_subscriptions
+from subscriptions.models import FreezeRequest, Payment, PaymentMethod, Subscription, SubscriptionType
+from utils.phone import is_phone_query, normalize_phone, reverse_digits
+from .api import (
+    bulk_create_members_api, export_subscription_report_stream_api, member_duplicates_check_api, member_profile_api,
+    member_subscription_report_api, merge_members_api,
+)
+from .importer import import_members
+from .models import Member
+from .search import index_members, ranked_member_ids, search_members
+from .serializers import MemberSerializer
+from .segments import _version_key, get_segments
+
+
+class MemberImportTests(TestCase):
+    def setUp(self):
+        self.club = Club.objects.create(name='Club')
+        self.user = User.objects.create(username='owner', club=self.club, role='owner')
+        self.rows = [
+            {'name': f'Member {i}', 'phone': f'0100000000{i}', 'birth_date': '1990-01-01'}
+            for i in range(3)
+        ]
+
+    def test_unsupported_file_type_is_rejected(self):
+        upload = SimpleUploadedFile('members.pdf', b'%PDF-1.4', content_type='application/pdf')
+        request = APIRequestFactory().post('/', {'file': upload}, format='multipart')
+        force_authenticate(request, user=self.user)
+        response = bulk_create_members_api(request)
+        self.assertEqual(response.status_code, 400)
+
+    def test_conflict_in_later_chunk_rolls_back_whole_import(self):
+        with mock.patch('members.importer.index_members', side_effect=[None, IntegrityError('duplicate')]):
+            with self.assertRaises(ValueError):
+                import_members(self.club, self.rows, chunk_size=2)
+        self.assertFalse(Member.objects.exists())
+
+    def test_import_creates_members(self):
+        result = import_members(self.club, self.rows, chunk_size=2)
+        self.assertEqual(result['created'], 3)
+        self.assertEqual(Member.objects.filter(club=self.club).count(), 3)
+
+
+class MemberSegmentTests(TestCase):
+    def setUp(self):
+        self.club = Club.objects.create(name='Club')
+        self.type = SubscriptionType.objects.create(club=self.club, name='Monthly', duration_days=30, price=100)
+        self.member = Member.objects.create(
+            club=self.club, name='Member', membership_number='1001', national_id='1',
+            birth_date=date(1990, 1, 1), phone='01000000001',
+        )
+        today = timezone.localdate()
+        self.subscription = Subscription.objects.create(
+            club=self.club, member=self.member, type=self.type,
+            start_date=today - timedelta(days=10), end_date=today + timedelta(days=20),
+        )
+
+    def _segment(self, name):
+        return [member_id for member_id, _ in get_segments(self.club.id, 7, 7)[name]]
+
+    def test_attendance_and_entry_log_refresh_inactive_members(self):
+        self.assertEqual(self._segment('inactive_members'), [self.member.id])
+        Attendance.objects.create(subscription=self.subscription, timestamp=timezone.now())
+        self.assertEqual(self._segment('inactive_members'), [])
+
+        Attendance.objects.all().delete()
+        self.assertEqual(self._segment('inactive_members'), [self.member.id])
+        EntryLog.objects.create(club=self.club, member=self.member, timestamp=timezone.now())
+        self.assertEqual(self._segment('inactive_members'), [])
+
+    def test_subscription_import_refreshes_segments(self):
+        other = Member.objects.create(
+            club=self.club, name='Other', membership_number='1002', national_id='2',
+            birth_date=date(1990, 1, 1), phone='01000000002',
+        )
+        self.assertEqual(self._segment('without_subscriptions'), [other.id])
+        content = f"member__name,type__name,start_date\n1002,Monthly,{timezone.localdate().isoformat()}\n"
+        with self.captureOnCommitCallbacks(execute=True):
+            result = import_subscriptions(io.BytesIO(content.encode('utf-8')), 'subscriptions.csv', club=self.club)
+        self.assertEqual(result.created, 1)
+        self.assertEqual(self._segment('without_subscriptions'), [])
+
+    def test_report_filters_segments_by_search(self):
+        user = User.objects.create(username='owner', club=self.club, role='owner')
+        for query, expected in (('memb', 1), ('1001', 1), ('other', 0)):
+            request = APIRequestFactory().get('/', {'name': query})
+            force_authenticate(request, user=user)
+            response = member_subscription_report_api(request)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['inactive_members']['count'], expected, query)
+
+    def test_report_streams_as_ndjson(self):
+        user = User.objects.create(username='owner', club=self.club, role='owner')
+        request = APIRequestFactory().get('/', {'export_format': 'ndjson'})
+        force_authenticate(request, user=user)
+        response = export_subscription_report_stream_api(request)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+        self.assertEqual(
+            [(row['segment'], row['id'], row['membership_number']) for row in rows],
+            [('inactive_members', self.member.id, '1001')],
+        )
+        self.assertEqual(rows[0]['current_subscription_end'], self.subscription.end_date.isoformat())
+
+    def test_check_in_keeps_cached_segments(self):
+        user = User.objects.create(username='owner', club=self.club, role='owner')
+        Attendance.objects.create(subscription=self.subscription, timestamp=timezone.now() - timedelta(seconds=10))
+        version = cache.get(_version_key(self.club.id), 0)
+
+        request = APIRequestFactory().post('/', {'identifier': self.member.phone}, format='json')
+        force_authenticate(request, user=user)
+        response = add_attendance_api(request)
+        self.assertEqual(response.status_code, 201)
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.entry_count, 1)
+        self.assertEqual(cache.get(_version_key(self.club.id), 0), version)
+
+        self.subscription.end_date -= timedelta(days=15)
+        self.subscription.save()
+        self.assertEqual(cache.get(_version_key(self.club.id), 0), version + 1)
+
+
+class MemberSerializerTests(TestCase):
+    def setUp(self):
+        self.club = Club.objects.create(name='Club')
+        self.type = SubscriptionType.objects.create(club=self.club, name='Monthly', duration_days=30, price=100)
+        self.member = Member.objects.create(
+            club=self.club, name='Member', membership_number='1001', national_id='1',
+            birth_date=date(1990, 1, 1), phone='01000000001',
+        )
+        self.today = timezone.localdate()
+
+    def _at(self, days_ago):
+        return timezone.make_aware(datetime.combine(self.today - timedelta(days=days_ago), time(12)))
+
+    def _subscription(self, start, end):
+        return Subscription.objects.create(
+            club=self.club, member=self.member, type=self.type,
+            start_date=self.today - timedelta(days=start), end_date=self.today - timedelta(days=end),
+        )
+
+    def test_last_attendance_date_counts_only_unexpired_subscriptions(self):
+        expired = self._subscription(40, 1)
+        current = self._subscription(10, -20)
+        Attendance.objects.create(subscription=current, timestamp=self._at(5))
+        Attendance.objects.create(subscription=expired, timestamp=self._at(2))
+        EntryLog.objects.create(club=self.club, member=self.member, timestamp=self._at(0))
+
+        self.member.refresh_from_db()
+        data = MemberSerializer(self.member).data
+        self.assertEqual(data['last_attendance_date'], self.today - timedelta(days=5))
+        self.assertEqual(data['near_expiry_date'], self.today + timedelta(days=20))
+
+        current.end_date = self.today - timedelta(days=1)
+        current.save()
+        self.member.refresh_from_db()
+        self.assertIsNone(MemberSerializer(self.member).data['last_attendance_date'])
+
+
+class MemberSearchTests(TestCase):
+    def setUp(self):
+        self.club = Club.objects.create(name='Club')
+        names = ['Ahmed Ali', 'Ahmed Hassan', 'Ali Ahmed', 'Mona Ali', 'Aliaa Samir']
+        members = Member.objects.bulk_create([
+            Member(
+                club=self.club, name=names[i % len(names)], membership_number=f'{5000 + i}', national_id=f'{i}',
+                birth_date=date(1990, 1, 1), phone=f'010{i:08d}', phone_reversed=f'010{i:08d}'[::-1],
+            )
+            for i in range(620)
+        ])
+        index_members(members)
+
+    def test_sql_ranking_matches_ranked_ids(self):
+        for query in ('ahmed', 'ali', 'ahmed ali', 'ali ahm', '5001', '0012'):
+            self.assertEqual(
+                list(search_members(self.club.id, query).values_list('id', flat=True)),
+                ranked_member_ids(self.club.id, query, limit=None),
+                query,
+            )
+
+    def test_listing_is_not_capped(self):
+        members = search_members(self.club.id, 'ali')
+        self.assertEqual(members.count(), 496)
+        self.assertEqual(search_members(self.club.id, 'a').count(), 620)
+
+
+class PhoneIndexTests(TestCase):
+    def setUp(self):
+        self.club = Club.objects.create(name='Club')
+
+    def test_normalize_phone(self):
+        self.assertEqual(normalize_phone(' ٠١٠-١٢٣٤ ٥٦٧٨ '), '01012345678')
+        self.assertEqual(normalize_phone('0020 10 1234 5678'), '+201012345678')
+        self.assertEqual(normalize_phone('+20 (10) 1234-5678'), '+201012345678')
+        self.assertEqual(normalize_phone(' abc '), 'abc')
+        self.assertIsNone(normalize_phone(None))
+        self.assertEqual(reverse_digits('+2010'), '0102')
+        self.assertEqual([is_phone_query(value) for value in ('5678', '+5678', '56', '56a8')], [True, True, False, False])
+
+    def test_backfill_normalizes_legacy_rows(self):
+        member = Member.objects.create(
+            club=self.club, name='Member', membership_number='1001', national_id='1',
+            birth_date=date(1990, 1, 1), phone='010 1234 5678',
+        )
+        user = User.objects.create(username='reception', club=self.club, role='reception', phone_number='010-555-0000')
+        self.assertEqual((member.phone, member.phone_reversed), ('01012345678', '87654321010'))
+        self.assertEqual(list(search_members(self.club.id, '5678')), [member])
+
+        # صفوف قديمة محفوظة قبل التطبيع
+        Member.objects.filter(id=member.id).update(phone='٠١٠ ١٢٣٤ ٥٦٧٨', phone_reversed=None)
+        User.objects.filter(id=user.id).update(phone_number='010 555 0000', phone_number_reversed=None)
+        call_command('backfill_phone_index', '--dry-run', stdout=io.StringIO())
+        self.assertIsNone(Member.objects.get(id=member.id).phone_reversed)
+
+        out = io.StringIO()
+        call_command('backfill_phone_index', stdout=out)
+        self.assertIn('Updated 1 members and 1 users', out.getvalue())
+        member.refresh_from_db()
+        user.refresh_from_db()
+        self.assertEqual((member.phone, member.phone_reversed), ('01012345678', '87654321010'))
+        self.assertEqual((user.phone_number, user.phone_number_reversed), ('0105550000', '0000555010'))
+
+
+class MemberDuplicatesApiTests(TestCase):
+    def setUp(self):
+        self.club = Club.objects.create(name='Club')
+        self.user = User.objects.create(username='owner', club=self.club, role='owner')
+        self.target, self.duplicate = [
+            Member.objects.create(
+                club=self.club, name='Ahmed Ali', membership_number=f'{7000 + i}', national_id='29901011234567',
+                birth_date=date(1990, 1, 1), phone=f'0100000000{i}',
+            )
+            for i in range(2)
+        ]
+        self.factory = APIRequestFactory()
+
+    def call(self, view, method, data):
+        request = getattr(self.factory, method)('/', data, format='json' if method != 'get' else None)
+        force_authenticate(request, user=self.user)
+        return view(request)
+
+    def test_non_numeric_exclude_is_rejected(self):
+        response = self.call(member_duplicates_check_api, 'get', {'name': 'Ahmed Ali', 'exclude': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        response = self.call(member_duplicates_check_api, 'get', {'name': 'Ahmed Ali', 'exclude': str(self.target.id)})
+        self.assertEqual(response.status_code, 200)
+
+    def test_merge_accepts_string_ids_and_rejects_invalid(self):
+        response = self.call(merge_members_api, 'post', {'target_id': self.target.id, 'member_ids': ['x']})
+        self.assertEqual(response.status_code, 400)
+        response = self.call(merge_members_api, 'post', {
+            'target_id': str(self.target.id), 'member_ids': [str(self.duplicate.id), str(self.target.id)],
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Member.objects.filter(id=self.duplicate.id).exists())
+
+
+class MemberProfileTests(TestCase):
+    def setUp(self):
+        self.club = Club.objects.create(name='Club')
+        self.user = User.objects.create(username='owner', club=self.club, role='owner')
+        self.type = SubscriptionType.objects.create(
+            club=self.club, name='Monthly', duration_days=30, price=100, free_invites_allowed=3,
+        )
+        self.member = Member.objects.create(
+            club=self.club, name='Member', membership_number='1001', national_id='1',
+            birth_date=date(1990, 1, 1), phone='01000000001',
+        )
+        method = PaymentMethod.objects.create(club=self.club, name='Cash', is_active=True)
+        today = timezone.localdate()
+        for i in range(3):
+            subscription = Subscription.objects.create(
+                club=self.club, member=self.member, type=self.type,
+                start_date=today - timedelta(days=30 * i + 10), end_date=today - timedelta(days=30 * i - 20),
+            )
+            Payment.objects.bulk_create([
+                Payment(subscription=subscription, amount=50, payment_method=method) for _ in range(2)
+            ])
+            FreezeRequest.objects.bulk_create([
+                FreezeRequest(subscription=subscription, requested_days=3, start_date=today, end_date=today + timedelta(days=3)),
+            ])
+            Attendance.objects.bulk_create([
+                Attendance(subscription=subscription, timestamp=timezone.now() - timedelta(days=30 * i + day))
+                for day in range(3)
+            ])
+            FreeInvite.objects.create(
+                club=self.club, subscription=subscription, guest_name=f'Guest {i}', phone=f'0110000000{i}',
+                date=today, status='used', invited_by=self.member,
+            )
+            Member.objects.create(
+                club=self.club, name=f'Friend {i}', membership_number=f'{2000 + i}', national_id=f'{10 + i}',
+                birth_date=date(1990, 1, 1), phone=f'0120000000{i}', referred_by=self.member,
+            )
+
+    def test_profile_uses_fixed_number_of_queries(self):
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=self.user)
+        with self.assertNumQueries(7):
+            response = member_profile_api(request, member_id=self.member.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['subscriptions']), 3)
+        self.assertEqual([len(s['payments']) for s in response.data['subscriptions']], [2, 2, 2])
+        self.assertEqual([len(s['freeze_requests']) for s in response.data['subscriptions']], [1, 1, 1])
+        self.assertEqual(sum(day['count'] for day in response.data['attendance']['calendar']), 9)
+        self.assertEqual(len(response.data['invites']['recent']), 3)
+        self.assertEqual(response.data['referrals']['count'], 3)
+        self.assertEqual(len(response.data['referrals']['recent']), 3)
+
+
+class MemberPhotoTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root, MEMBER_PHOTO_ASYNC=False)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.club = Club.objects.create(name='Club')
+
+    def _upload(self, color):
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (640, 480), color).save(buffer, 'JPEG')
+        return SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def _files(self, member):
+        member.refresh_from_db()
+        return {member.photo.name} | {name for formats in member.photo_variants.values() if isinstance(formats, dict)
+                                      for name in formats.values()}
+
+    def test_replaced_photo_files_are_deleted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            member = Member.objects.create(
+                club=self.club, name='Member', membership_number='1001', national_id='1',
+                birth_date=date(1990, 1, 1), phone='01000000001', photo=self._upload('red'),
+            )
+        first = self._files(member)
+        self.assertEqual(len(first), 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            twin = Member.objects.create(
+                club=self.club, name='Twin', membership_number='1002', national_id='2',
+                birth_date=date(1990, 1, 1), phone='01000000002', photo=self._upload('red'),
+            )
+        self.assertEqual(self._files(twin), first)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            member.photo = self._upload('blue')
+            member.save()
+        second = self._files(member)
+        self.assertFalse(first & second)
+        # النسخ القديمة ما زال يستخدمها عضو آخر
+        self.assertTrue(all(default_storage.exists(name) for name in first | second))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            twin.photo = self._upload('green')
+            twin.save()
+        self.assertFalse(any(default_storage.exists(name) for name in first))
+        self.assertTrue(all(default_storage.exists(name) for name in second | self._files(twin)))
+        self.assertEqual(len(default_storage.listdir('member_photos')[1]), 10)
@@ -13,12 +13,18 @@ urlpatterns = [
     # ===== API Endpoints (JWT Protected from inside views) =====
     path('api/members/', api.member_list_api, name='api-member-list'),
     path('api/members/create/', api.create_member_api, name='api-create-member'),
+    path('api/members/bulk-create/', api.bulk_create_members_api, name='api-bulk-create-members'),
     path('api/members/<int:member_id>/', api.member_detail_api, name='api-member-detail'),
+    path('api/members/<int:member_id>/profile/', api.member_profile_api, name='api-member-profile'),
     path('api/members/<int:member_id>/update/', api.update_member_api, name='api-update-member'),
     path('api/members/<int:member_id>/delete/', api.delete_member_api, name='api-delete-member'),
 
     path('api/members/search/', api.member_search_api, name='api-member-search'),
+    path('api/members/duplicates/check/', api.member_duplicates_check_api, name='api-member-duplicates-check'),
+    path('api/members/duplicates/', api.duplicate_clusters_api, name='api-member-duplicate-clusters'),
+    path('api/members/merge/', api.merge_members_api, name='api-merge-members'),
     path('api/user/profile/', api.api_user_profile, name='api-user-profile'),
     path('api/members/subscription-report/', api.member_subscription_report_api, name='member_subscription_report_api'),
     path('api/members/export-subscription-report/', api.export_subscription_report_api, name='export_subscription_report'),
+    path('api/members/export-subscription-report/stream/', api.export_subscription_report_stream_api, name='export_subscription_report_stream'),
 ]
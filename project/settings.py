@@ -158,6 +158,17 @@ DATABASES = {
 }
 
 
+# كاش مشترك بين كل عمليات الخادم (عمليات Passenger وأوامر الإدارة): إلغاء الكاش بمفاتيح الإصدار
+# (شرائح الأعضاء، تقييم المخزون، أسماء العرض) لا يصل للعمليات الأخرى مع LocMemCache الافتراضي.
+# يمكن استبداله بـ Redis أو Memcached عند التشغيل على أكثر من خادم.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+    }
+}
+# الاختبارات تستخدم كاشا في الذاكرة حتى لا تقرأ أو تعدل الكاش الحقيقي على القرص
+TEST_RUNNER = 'project.test_runner.LocMemCacheTestRunner'
 
 # # DATABASES = {
 # #     "default": {
@@ -272,4 +283,23 @@ EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = 'your-email@example.com'  # استبدل ببريدك الإلكتروني
 EMAIL_HOST_PASSWORD = 'your-email-password'  
-DEFAULT_FROM_EMAIL = 'your-email@example.com'
\ No newline at end of file
+DEFAULT_FROM_EMAIL = 'your-email@example.com'
+# السماح بتجاوز 999 رقم يوميا لأرقام العضوية والفواتير (يزيد عدد الخانات بدلا من رفض الإضافة)
+SEQUENCE_WIDE_NUMBERS = False
+
+# معالجة صور الأعضاء (تصغير وحذف EXIF) في خيط منفصل بعد الحفظ
+MEMBER_PHOTO_ASYNC = True
+
+# تشخيص استعلامات المالية (الفلاتر، عدد الصفوف، عينة): False، True لكل الأندية، أو قائمة بمعرفات أندية
+# يمكن تفعيله لطلب واحد بـ ?diagnostics=true أو ?diagnostics=explain (مالك/أدمن)
+FINANCE_QUERY_DIAGNOSTICS = False
+
+# تقارير PDF: تنفيذ في خيوط منفصلة بعد الطلب وعدد الخيوط
+REPORT_JOBS_ASYNC = True
+REPORT_WORKERS = 2
+# أمر LaTeX ومجلد العمل الدائم (الصيغ المترجمة مسبقا وكاش الخطوط)؛ None = مجلد مؤقت للنظام
+REPORT_LATEX_COMMAND = 'pdflatex'
+REPORT_LATEX_WORKDIR = None
+
+# مدة كاش تقييم المخزون بالثواني (يلغى مع كل حركة مخزون؛ المدة تحد أثر تعديل مبالغ المصروفات/الإيرادات المرتبطة)
+STOCK_VALUATION_CACHE_TIMEOUT = 300
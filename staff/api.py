@@ -13,6 +13,7 @@ from .models import Shift, StaffAttendance
 from .serializers import ShiftSerializer, StaffAttendanceSerializer, StaffMonthlyHoursSerializer
 from accounts.models import User
 from accounts.serializers import UserProfileSerializer
+from finance.shifts import close_shift_snapshot
 import logging
 
 logger = logging.getLogger(__name__)
@@ -172,6 +173,7 @@ def staff_check_in_by_code_api(request):
         logger.debug(f"Closing open attendance: {attendance.id}")
         attendance.check_out = timezone.now()
         attendance.save()
+        close_shift_snapshot(attendance)
 
     attendance = StaffAttendance.objects.create(
         staff=user,
@@ -210,6 +212,7 @@ def staff_check_out_by_code_api(request):
     
     attendance.check_out = timezone.now()
     attendance.save()
+    close_shift_snapshot(attendance)
     logger.info(f"Check-out recorded: {attendance.id} for user: {user.username}")
     return Response(StaffAttendanceSerializer(attendance).data, status=status.HTTP_200_OK)
 
@@ -3,6 +3,7 @@ from django.contrib.admin import AdminSite
 from django.core.exceptions import ValidationError
 from django.db.models import Q, Sum
 from django.http import HttpResponseRedirect
+from django.shortcuts import render
 from django.urls import reverse
 from django.utils import timezone, html
 from datetime import timedelta
@@ -12,6 +13,7 @@ from import_export import resources
 from django.utils.html import format_html
 
 from .models import SubscriptionType, Subscription, FreezeRequest, CoachProfile, Feature, PaymentMethod, Payment, SpecialOffer
+from .importer import import_subscriptions
 from finance.models import Income, IncomeSource
 from core.models import Club
 from accounts.models import User
@@ -221,6 +223,55 @@ class SubscriptionAdmin(ImportExportModelAdmin):
     )
     date_hierarchy = 'start_date'
     actions = ['renew_subscription', 'cancel_subscription']
+    change_list_template = 'admin/subscriptions/subscription/change_list.html'
+
+    def get_urls(self):
+        from django.urls import path
+        urls = super().get_urls()
+        custom_urls = [
+            path(
+                'bulk-import/',
+                self.admin_site.admin_view(self.bulk_import_view),
+                name='subscriptions_subscription_bulk_import'
+            ),
+        ]
+        return custom_urls + urls
+
+    def bulk_import_view(self, request):
+        if not self.has_add_permission(request):
+            return HttpResponseRedirect(reverse('admin:subscriptions_subscription_changelist'))
+
+        result = None
+        if request.method == 'POST' and request.FILES.get('file'):
+            uploaded = request.FILES['file']
+            club = None if request.user.is_superuser else request.user.club
+            try:
+                result = import_subscriptions(
+                    uploaded.file,
+                    uploaded.name,
+                    club=club,
+                    created_by=request.user,
+                    dry_run=bool(request.POST.get('dry_run')),
+                    start_row=int(request.POST.get('start_row') or 0),
+                )
+            except ValueError as e:
+                messages.error(request, str(e))
+            else:
+                level = messages.WARNING if result.errors else messages.SUCCESS
+                prefix = "(تجربة بدون حفظ) " if result.dry_run else ""
+                messages.add_message(
+                    request, level,
+                    f"{prefix}تمت معالجة {result.total_rows} صف: {result.created} جديد، "
+                    f"{result.skipped} مكرر، {len(result.errors)} خطأ."
+                )
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'استيراد الاشتراكات بالجملة',
+            'result': result,
+        }
+        return render(request, 'admin/subscriptions/subscription/bulk_import.html', context)
 
     def payments_list(self, obj):
         payments = obj.payments.all()
@@ -16,6 +16,8 @@ from .models import Subscription, SubscriptionType, FreezeRequest, Feature, Paym
 from .serializers import SubscriptionSerializer, SubscriptionTypeSerializer, CoachReportSerializer, MemberBehaviorSerializer, FeatureSerializer, PaymentMethodSerializer, PaymentSerializer, SpecialOfferSerializer
 from finance.models import Income, IncomeSource
 from members.models import Member
+from members.search import filter_by_member_search
+from utils.phone import normalize_phone
 from accounts.models import User
 from attendance.models import Attendance
 from staff.models import StaffAttendance
@@ -298,17 +300,13 @@ def subscription_list(request):
                     output_field=BooleanField()
                 )
             ).filter(
-                Q(member__rfid_code=identifier) | Q(member__phone=identifier)
+                Q(member__rfid_code=identifier) | Q(member__phone=normalize_phone(identifier))
             )
 
         if search_term or status_param:
             # فلترة بالبحث
             if search_term:
-                subscriptions = subscriptions.filter(
-                    Q(member__rfid_code__icontains=search_term) |
-                    Q(member__phone__icontains=search_term) |
-                    Q(member__name__icontains=search_term)
-                )
+                subscriptions = filter_by_member_search(subscriptions, request.user.club.id, search_term)
 
             # فلترة بالحقول المباشرة
             for param, field in [
@@ -830,9 +828,7 @@ def member_subscriptions(request):
     )
 
     if search_term:
-        subscriptions = subscriptions.filter(
-            Q(member__name__icontains=search_term) | Q(member__phone__icontains=search_term) | Q(member__rfid_code__icontains=search_term)
-        )
+        subscriptions = filter_by_member_search(subscriptions, request.user.club.id, search_term)
     subscriptions = subscriptions.order_by('-start_date')
     paginator = PageNumberPagination()
     page = paginator.paginate_queryset(subscriptions, request)
@@ -0,0 +1,240 @@
+import logging
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Q
+
+from core.models import Club
+from members.activity import refresh_member_activity
+from members.models import Member
+from members.segments import invalidate_segments
+from utils.tabular import iter_rows, parse_date
+from .models import Subscription, SubscriptionType
+
+logger = logging.getLogger(__name__)
+
+# نفس أسماء أعمدة SubscriptionResource؛ member__name يقبل اسم العضو (كما في التصدير) أو رقم العضوية أو المعرف
+REQUIRED_COLUMNS = ('club__name', 'member__name', 'type__name', 'start_date')
+OPTIONAL_COLUMNS = ('end_date', 'paid_amount', 'remaining_amount', 'entry_count')
+DEFAULT_CHUNK_SIZE = 2000
+
+
+class ImportResult:
+    """Counters and per-row errors collected while importing a file."""
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.total_rows = 0
+        self.created = 0
+        self.skipped = 0
+        self.last_row = 0
+        self.errors = []
+        self.ignored_columns = []
+
+    def add_error(self, row_number, message):
+        self.errors.append({'row': row_number, 'error': message})
+
+    def as_dict(self):
+        return {
+            'dry_run': self.dry_run,
+            'total_rows': self.total_rows,
+            'created': self.created,
+            'skipped': self.skipped,
+            'last_row': self.last_row,
+            'errors': self.errors,
+            'ignored_columns': self.ignored_columns,
+        }
+
+
+def _parse_decimal(value):
+    if value is None or str(value).strip() == '':
+        return Decimal('0')
+    try:
+        return Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError(f"قيمة مالية غير صالحة: {value}")
+
+
+def _parse_int(value):
+    if value is None or str(value).strip() == '':
+        return 0
+    try:
+        return int(float(str(value).strip()))
+    except ValueError:
+        raise ValueError(f"رقم غير صالح: {value}")
+
+
+class SubscriptionImporter:
+    """
+    Streams subscription rows in chunks, resolves foreign keys from prebuilt
+    dictionaries and inserts each chunk with a single bulk_create.
+    """
+
+    def __init__(self, club=None, created_by=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 dry_run=False, start_row=0, skip_existing=True):
+        self.club = club
+        self.created_by = created_by
+        self.chunk_size = max(1, int(chunk_size))
+        self.dry_run = dry_run
+        self.start_row = max(0, int(start_row))
+        self.skip_existing = skip_existing
+        self.result = ImportResult(dry_run=dry_run)
+        self._seen = set()
+        self._load_lookups()
+
+    def _load_lookups(self):
+        clubs = Club.objects.all()
+        if self.club:
+            clubs = clubs.filter(id=self.club.id)
+        self.clubs_by_name = {name.strip(): pk for pk, name in clubs.values_list('id', 'name')}
+
+        types = SubscriptionType.objects.filter(club_id__in=self.clubs_by_name.values())
+        self.types = {
+            (club_id, name.strip()): (pk, duration_days)
+            for pk, club_id, name, duration_days in types.values_list('id', 'club_id', 'name', 'duration_days')
+        }
+
+    def _resolve_members(self, chunk):
+        """
+        Fetch every member referenced by the chunk in one query, matched by membership
+        number, name or id. Returns (by_number, by_name, by_id) lookups.
+        """
+        values = {str(row.get('member__name') or '').strip() for _, row in chunk} - {''}
+        ids = {int(value) for value in values if value.isdigit()}
+        members = Member.objects.filter(
+            Q(membership_number__in=values) | Q(name__in=values) | Q(id__in=ids),
+            club_id__in=self.clubs_by_name.values(),
+        )
+        by_number, by_name, by_id = {}, {}, {}
+        for pk, club_id, name, number in members.values_list('id', 'club_id', 'name', 'membership_number'):
+            by_number[number] = (pk, club_id)
+            by_name.setdefault((club_id, name.strip()), []).append(pk)
+            by_id[pk] = club_id
+        return by_number, by_name, by_id
+
+    def _member_id(self, club_id, value, members):
+        """Member of the club for a membership number, a name or an id; raises ValueError."""
+        by_number, by_name, by_id = members
+        if not value:
+            raise ValueError("العضو مطلوب")
+        if value in by_number:
+            member_id, member_club_id = by_number[value]
+            if member_club_id != club_id:
+                raise ValueError("العضو لا ينتمي لهذا النادي")
+            return member_id
+        named = by_name.get((club_id, value), [])
+        if len(named) > 1:
+            raise ValueError(f"يوجد أكثر من عضو بالاسم {value}، استخدم رقم العضوية")
+        if named:
+            return named[0]
+        if value.isdigit() and int(value) in by_id:
+            if by_id[int(value)] != club_id:
+                raise ValueError("العضو لا ينتمي لهذا النادي")
+            return int(value)
+        raise ValueError(f"العضو غير موجود: {value}")
+
+    def _existing_keys(self, chunk_objects):
+        if not self.skip_existing or not chunk_objects:
+            return set()
+        member_ids = {obj.member_id for obj in chunk_objects}
+        return set(
+            Subscription.objects.filter(member_id__in=member_ids)
+            .values_list('member_id', 'type_id', 'start_date')
+        )
+
+    def _build(self, row, members):
+        club_name = str(row.get('club__name') or '').strip()
+        if not club_name and self.club:
+            club_id = self.club.id
+        else:
+            club_id = self.clubs_by_name.get(club_name)
+            if club_id is None:
+                raise ValueError(f"النادي غير موجود: {club_name}")
+
+        member_id = self._member_id(club_id, str(row.get('member__name') or '').strip(), members)
+
+        type_name = str(row.get('type__name') or '').strip()
+        type_info = self.types.get((club_id, type_name))
+        if type_info is None:
+            raise ValueError(f"نوع الاشتراك غير موجود: {type_name}")
+        type_id, duration_days = type_info
+
+        start_date = parse_date(row.get('start_date'))
+        if start_date is None:
+            raise ValueError("تاريخ البداية مطلوب")
+        end_date = parse_date(row.get('end_date')) or start_date + timedelta(days=duration_days)
+
+        return Subscription(
+            club_id=club_id,
+            member_id=member_id,
+            type_id=type_id,
+            start_date=start_date,
+            end_date=end_date,
+            paid_amount=_parse_decimal(row.get('paid_amount')),
+            remaining_amount=_parse_decimal(row.get('remaining_amount')),
+            entry_count=_parse_int(row.get('entry_count')),
+            created_by=self.created_by,
+        )
+
+    def _process_chunk(self, chunk):
+        members = self._resolve_members(chunk)
+        objects = []
+        for row_number, row in chunk:
+            try:
+                objects.append(self._build(row, members))
+            except ValueError as e:
+                self.result.add_error(row_number, str(e))
+
+        existing = self._existing_keys(objects)
+        to_create = []
+        for obj in objects:
+            key = (obj.member_id, obj.type_id, obj.start_date)
+            if self.skip_existing and (key in existing or key in self._seen):
+                self.result.skipped += 1
+                continue
+            self._seen.add(key)
+            to_create.append(obj)
+
+        if not self.dry_run and to_create:
+            with transaction.atomic():
+                Subscription.objects.bulk_create(to_create, batch_size=500)
+                # bulk_create لا يرسل post_save لذلك نحدث حقول العضو المحسوبة هنا
+                refresh_member_activity({obj.member_id for obj in to_create})
+                for club_id in {obj.club_id for obj in to_create}:
+                    transaction.on_commit(lambda club_id=club_id: invalidate_segments(club_id))
+        self.result.created += len(to_create)
+        self.result.last_row = chunk[-1][0]
+        logger.info(
+            f"Subscription import chunk up to row {self.result.last_row}: "
+            f"{len(to_create)} created, {len(self.result.errors)} errors so far"
+        )
+
+    def run(self, rows):
+        """Import an iterable of dict rows; row numbers start at 1 after the header."""
+        chunk = []
+        for row_number, row in enumerate(rows, start=1):
+            self.result.total_rows += 1
+            if row_number <= self.start_row:
+                continue
+            if row_number == self.start_row + 1:
+                missing = [c for c in REQUIRED_COLUMNS if c not in row and not (c == 'club__name' and self.club)]
+                if missing:
+                    raise ValueError(f"أعمدة مفقودة في الملف: {', '.join(missing)}")
+                # أعمدة التصدير التي لا يستوردها الملف (المدرب، الإلغاء، تعويض المدرب...) تظهر في النتيجة بدل تجاهلها بصمت
+                self.result.ignored_columns = [c for c in row if c not in REQUIRED_COLUMNS + OPTIONAL_COLUMNS]
+                if self.result.ignored_columns:
+                    logger.warning(f"Subscription import ignores columns: {', '.join(self.result.ignored_columns)}")
+            chunk.append((row_number, row))
+            if len(chunk) >= self.chunk_size:
+                self._process_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._process_chunk(chunk)
+        return self.result
+
+
+def import_subscriptions(fileobj, file_name, **options):
+    """Import a CSV/XLSX file of subscriptions and return an ImportResult."""
+    importer = SubscriptionImporter(**options)
+    return importer.run(iter_rows(fileobj, file_name))
@@ -0,0 +1,60 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Club
+from subscriptions.importer import DEFAULT_CHUNK_SIZE, import_subscriptions
+
+
+class Command(BaseCommand):
+    help = "Bulk import subscriptions from a CSV/XLSX file in streamed chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Path to the CSV or XLSX file")
+        parser.add_argument('--club', type=int, help="Restrict the import to this club id")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help="Validate rows without writing anything")
+        parser.add_argument('--start-row', type=int, default=0,
+                            help="Skip data rows up to and including this number (resume a stopped import)")
+        parser.add_argument('--allow-duplicates', action='store_true',
+                            help="Insert rows even if the same member/type/start_date already exists")
+        parser.add_argument('--errors-file', help="Write per-row errors to this JSON file")
+
+    def handle(self, *args, **options):
+        club = None
+        if options['club']:
+            try:
+                club = Club.objects.get(id=options['club'])
+            except Club.DoesNotExist:
+                raise CommandError(f"Club {options['club']} not found")
+
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                result = import_subscriptions(
+                    fileobj,
+                    options['path'],
+                    club=club,
+                    chunk_size=options['chunk_size'],
+                    dry_run=options['dry_run'],
+                    start_row=options['start_row'],
+                    skip_existing=not options['allow_duplicates'],
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        if result.ignored_columns:
+            self.stderr.write(f"ignored columns: {', '.join(result.ignored_columns)}")
+        for error in result.errors[:50]:
+            self.stderr.write(f"row {error['row']}: {error['error']}")
+        if len(result.errors) > 50:
+            self.stderr.write(f"... {len(result.errors) - 50} more errors")
+
+        if options['errors_file'] and result.errors:
+            with open(options['errors_file'], 'w', encoding='utf-8') as f:
+                json.dump(result.errors, f, ensure_ascii=False, indent=2)
+
+        prefix = "[dry-run] " if result.dry_run else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}rows={result.total_rows} created={result.created} "
+            f"skipped={result.skipped} errors={len(result.errors)} last_row={result.last_row}"
+        ))
@@ -6,6 +6,7 @@ from members.serializers import MemberSerializer
 from accounts.serializers import UserSerializer
 from accounts.models import User
 from members.models import Member
+from utils.phone import normalize_phone
 from django.utils import timezone
 from django.db.models import Q, Count, Sum, F
 from django.db.models.functions import TruncMonth
@@ -14,6 +15,32 @@ from invites.models import FreeInvite
 from decimal import Decimal, ROUND_HALF_UP
 from datetime import timedelta
 
+def subscription_status(obj, has_active_freeze, today=None):
+    """Display status of a subscription; the freeze check is passed in so callers can use prefetched rows."""
+    today = today or timezone.now().date()
+    is_expired = (
+        obj.end_date < today or
+        (obj.type.max_entries > 0 and obj.entry_count >= obj.type.max_entries)
+    )
+    is_nearing_expiry = obj.end_date >= today and obj.end_date <= today + timedelta(days=7)
+    has_remaining_amount = obj.remaining_amount > 0
+
+    if has_remaining_amount:
+        return "متبقي"
+    if is_nearing_expiry and not is_expired and not obj.is_cancelled:
+        return "قريب من الانتهاء"
+    if obj.is_cancelled:
+        return "ملغي"
+    if has_active_freeze:
+        return "مجمد"
+    if is_expired:
+        return "منتهي"
+    if obj.start_date > today:
+        return "قادم"
+    if obj.start_date <= today <= obj.end_date and obj.type.is_active:
+        return "نشط"
+    return "غير معروف"
+
 class FeatureSerializer(serializers.ModelSerializer):
     class Meta:
         model = Feature
@@ -212,31 +239,10 @@ class SubscriptionSerializer(serializers.ModelSerializer):
 
     def get_status(self, obj):
         today = timezone.now().date()
-        is_expired = (
-            obj.end_date < today or
-            (obj.type.max_entries > 0 and obj.entry_count >= obj.type.max_entries)
-        )
         has_active_freeze = obj.freeze_requests.filter(
             is_active=True, start_date__lte=today, end_date__gte=today
         ).exists()
-        is_nearing_expiry = obj.end_date >= today and obj.end_date <= today + timedelta(days=7)
-        has_remaining_amount = obj.remaining_amount > 0
-
-        if has_remaining_amount:
-            return "متبقي"
-        if is_nearing_expiry and not is_expired and not obj.is_cancelled:
-            return "قريب من الانتهاء"
-        if obj.is_cancelled:
-            return "ملغي"
-        if has_active_freeze:
-            return "مجمد"
-        if is_expired:
-            return "منتهي"
-        if obj.start_date > today:
-            return "قادم"
-        if obj.start_date <= today <= obj.end_date and obj.type.is_active:
-            return "نشط"
-        return "غير معروف"
+        return subscription_status(obj, has_active_freeze, today)
 
     def get_subscriptions_count(self, obj):
         return Subscription.objects.filter(member=obj.member).count()
@@ -335,7 +341,7 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         if identifier and not member:
             try:
                 member = Member.objects.get(
-                    Q(phone=identifier) | Q(rfid_code=identifier) | Q(name__iexact=identifier),
+                    Q(phone=normalize_phone(identifier)) | Q(rfid_code=identifier) | Q(name__iexact=identifier),
                     club=club
                 )
                 data['member'] = member
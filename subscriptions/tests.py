@@ -1,3 +1,53 @@
+import io
+from datetime import date
+
 from django.test import TestCase
 
-# Create your tests here.
+from core.models import Club
+from members.models import Member
+from .admin import SubscriptionResource
+from .importer import import_subscriptions
+from .models import Subscription, SubscriptionType
+
+
+class SubscriptionImportTests(TestCase):
+    def setUp(self):
+        self.club = Club.objects.create(name='Club')
+        self.member = Member.objects.create(
+            club=self.club, name='Ahmed Ali', membership_number='1001', national_id='29901011234567',
+            birth_date=date(1999, 1, 1), phone='01000000000',
+        )
+        self.type = SubscriptionType.objects.create(club=self.club, name='Monthly', duration_days=30, price=100)
+
+    def _import(self, content, **options):
+        return import_subscriptions(io.BytesIO(content.encode('utf-8')), 'subscriptions.csv', club=self.club, **options)
+
+    def test_existing_export_imports_back(self):
+        Subscription.objects.create(
+            club=self.club, member=self.member, type=self.type, start_date=date(2025, 1, 1),
+            end_date=date(2025, 1, 31), paid_amount=100,
+        )
+        exported = SubscriptionResource().export().csv
+        Subscription.objects.all().delete()
+
+        result = self._import(exported)
+        self.assertEqual(result.errors, [])
+        self.assertEqual(result.created, 1)
+        self.assertIn('coach__username', result.ignored_columns)
+        self.assertIn('is_cancelled', result.ignored_columns)
+        subscription = Subscription.objects.get()
+        self.assertEqual((subscription.member_id, subscription.start_date), (self.member.id, date(2025, 1, 1)))
+
+    def test_member_by_membership_number_and_ambiguous_name(self):
+        Member.objects.create(
+            club=self.club, name='Ahmed Ali', membership_number='1002', national_id='29901011234568',
+            birth_date=date(1999, 1, 1), phone='01000000001',
+        )
+        result = self._import(
+            "member__name,type__name,start_date\n"
+            "1001,Monthly,2025-02-01\n"
+            "Ahmed Ali,Monthly,2025-03-01\n"
+        )
+        self.assertEqual(result.created, 1)
+        self.assertEqual([error['row'] for error in result.errors], [2])
+        self.assertEqual(Subscription.objects.get().member_id, self.member.id)
@@ -8,7 +8,9 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
 from .models import Ticket, TicketType
 from .serializers import TicketSerializer, TicketTypeSerializer
+from utils.generate_ticket_serial import generate_ticket_serials
 from finance.models import Income, IncomeSource
+from finance.periods import ClosedPeriodError
 from datetime import datetime
 from datetime import timedelta
 import logging
@@ -130,36 +132,21 @@ def add_ticket_api(request):
         with transaction.atomic():
             club = request.user.club
             ticket_type = serializer.validated_data['ticket_type']
-            today = timezone.now().date()
-            date_prefix = today.strftime('%Y%m%d')
-
-            # الحصول على عدد التذاكر الحالية
-            ticket_count = Ticket.objects.filter(
-                club=club, ticket_type=ticket_type, issue_datetime__date=today
-            ).select_for_update().count()
-
-            # تخصيص أرقام تسلسلية
-            tickets_to_create = []
-            serial_numbers = []
-            serial_index = ticket_count + 1
-            for _ in range(num_tickets):
-                serial_number = f"{date_prefix}-{str(serial_index).zfill(4)}"
-                while Ticket.objects.filter(serial_number=serial_number).exists():
-                    serial_index += 1
-                    serial_number = f"{date_prefix}-{str(serial_index).zfill(4)}"
-                serial_numbers.append(serial_number)
-                tickets_to_create.append(
-                    Ticket(
-                        club=club,
-                        ticket_type=ticket_type,
-                        notes=ticket_data['notes'],
-                        price=ticket_type.price,
-                        issue_datetime=timezone.now(),
-                        issued_by=request.user,
-                        serial_number=serial_number
-                    )
+            # حجز كل الأرقام التسلسلية المطلوبة دفعة واحدة
+            serial_numbers = generate_ticket_serials(num_tickets)
+            issue_datetime = timezone.now()
+            tickets_to_create = [
+                Ticket(
+                    club=club,
+                    ticket_type=ticket_type,
+                    notes=ticket_data['notes'],
+                    price=ticket_type.price,
+                    issue_datetime=issue_datetime,
+                    issued_by=request.user,
+                    serial_number=serial_number
                 )
-                serial_index += 1
+                for serial_number in serial_numbers
+            ]
 
             Ticket.objects.bulk_create(tickets_to_create)
 
@@ -198,9 +185,12 @@ def delete_ticket_api(request, ticket_id):
         return Response({'error': 'غير مسموح بالحذف. يجب أن تكون Owner أو Admin.'}, status=status.HTTP_403_FORBIDDEN)
     
     ticket = get_object_or_404(Ticket, id=ticket_id, club=request.user.club)
-    with transaction.atomic():
-        ticket.delete()
-        Income.objects.filter(club=ticket.club, description__contains=ticket.serial_number).delete()
+    try:
+        with transaction.atomic():
+            ticket.delete()
+            Income.objects.filter(club=ticket.club, description__contains=ticket.serial_number).delete()
+    except ClosedPeriodError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     return Response({'message': 'تم حذف التذكرة بنجاح.'}, status=status.HTTP_204_NO_CONTENT)
 
 @api_view(['POST'])
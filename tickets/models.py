@@ -1,5 +1,6 @@
 from django.db import models
 from django.utils import timezone
+from utils.generate_ticket_serial import generate_ticket_serial
 
 class TicketType(models.Model):
     club = models.ForeignKey('core.Club', on_delete=models.CASCADE)
@@ -31,20 +32,7 @@ class Ticket(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.serial_number:
-            today = timezone.now().date()
-            date_prefix = today.strftime('%Y%m%d')
-            ticket_count = Ticket.objects.filter(
-                club=self.club,
-                ticket_type=self.ticket_type,
-                issue_datetime__date=today
-            ).count()
-            if ticket_count >= 999:  
-                raise ValueError("Maximum tickets for today reached.")
-            serial_number = f"{date_prefix}-{str(ticket_count + 1).zfill(3)}"
-            while Ticket.objects.filter(serial_number=serial_number).exists():
-                ticket_count += 1
-                serial_number = f"{date_prefix}-{str(ticket_count + 1).zfill(3)}"
-            self.serial_number = serial_number
+            self.serial_number = generate_ticket_serial()
         if self.ticket_type and not self.price:
             self.price = self.ticket_type.price
         super().save(*args, **kwargs)
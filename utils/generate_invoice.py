@@ -1,29 +1,30 @@
-from django.db.models import Max
-from django.db import transaction
 from datetime import date
 
-def generate_invoice_number(invoice_date=None):
+from utils.sequences import allocate, daily_limit, format_daily_number, max_existing_sequence
+
+LIMIT_MESSAGE = "Cannot generate invoice number: Maximum limit of 999 invoices per day reached."
+
+
+def generate_invoice_numbers(count, invoice_date=None):
+    """Reserve `count` invoice numbers for the day in one allocation."""
     if invoice_date is None:
         invoice_date = date.today()
-
-    year = str(invoice_date.year)[-2:]
-    month = str(invoice_date.month).zfill(2)
-    day = str(invoice_date.day).zfill(2)
+    if hasattr(invoice_date, 'date'):
+        invoice_date = invoice_date.date()
 
     from finance.models import Expense
-    prefix = f"{year}{month}{day}"
-
-    with transaction.atomic():  
-        last_invoice = Expense.objects.filter(
-            invoice_number__startswith=prefix
-        ).select_for_update().aggregate(Max('invoice_number'))
-
-        if last_invoice['invoice_number__max']:
-            last_sequence = int(last_invoice['invoice_number__max'][-3:])
-            if last_sequence >= 999:
-                raise ValueError("Cannot generate invoice number: Maximum limit of 999 invoices per day reached.")
-            sequence = str(last_sequence + 1).zfill(3)
-        else:
-            sequence = "001"
-
-        return f"{prefix}{sequence}"
+    prefix = invoice_date.strftime('%y%m%d')
+
+    def seed():
+        return max_existing_sequence(
+            Expense.objects.filter(invoice_number__startswith=prefix).values_list('invoice_number', flat=True),
+            prefix,
+        )
+
+    values = allocate('invoice', invoice_date, count, seed=seed,
+                      max_value=daily_limit(), limit_message=LIMIT_MESSAGE)
+    return [format_daily_number(prefix, value) for value in values]
+
+
+def generate_invoice_number(invoice_date=None):
+    return generate_invoice_numbers(1, invoice_date=invoice_date)[0]
@@ -1,29 +1,29 @@
-from django.db.models import Max
-from django.db import transaction
 from datetime import datetime
 
-def generate_membership_number(created_at=None):
+from utils.sequences import allocate, daily_limit, format_daily_number, max_existing_sequence
+
+LIMIT_MESSAGE = "Cannot generate membership number: Maximum limit of 999 members per day reached."
+
+
+def generate_membership_numbers(count, created_at=None):
+    """Reserve `count` membership numbers for the day in one allocation."""
     if created_at is None:
         created_at = datetime.now()
 
-    year = str(created_at.year)[-2:]
-    month = str(created_at.month).zfill(2)
-    day = str(created_at.day).zfill(2)
-
     from members.models import Member
-    prefix = f"{year}{month}{day}"
-
-    with transaction.atomic():  
-        last_member = Member.objects.filter(
-            membership_number__startswith=prefix
-        ).select_for_update().aggregate(Max('membership_number'))
-
-        if last_member['membership_number__max']:
-            last_sequence = int(last_member['membership_number__max'][-3:])
-            if last_sequence >= 999:
-                raise ValueError("Cannot generate membership number: Maximum limit of 999 members per day reached.")
-            sequence = str(last_sequence + 1).zfill(3)
-        else:
-            sequence = "001"
-
-        return f"{prefix}{sequence}"
\ No newline at end of file
+    prefix = created_at.strftime('%y%m%d')
+
+    def seed():
+        return max_existing_sequence(
+            Member.objects.filter(membership_number__startswith=prefix).values_list('membership_number', flat=True),
+            prefix,
+        )
+
+    day = created_at.date() if isinstance(created_at, datetime) else created_at
+    values = allocate('membership', day, count, seed=seed,
+                      max_value=daily_limit(), limit_message=LIMIT_MESSAGE)
+    return [format_daily_number(prefix, value) for value in values]
+
+
+def generate_membership_number(created_at=None):
+    return generate_membership_numbers(1, created_at=created_at)[0]
@@ -0,0 +1,26 @@
+from django.utils import timezone
+
+from utils.sequences import allocate, max_existing_sequence
+
+
+def generate_ticket_serials(count, day=None):
+    """Reserve `count` ticket serial numbers (YYYYMMDD-NNNN) for the day in one allocation."""
+    if day is None:
+        day = timezone.localdate()
+
+    from tickets.models import Ticket
+    prefix = day.strftime('%Y%m%d')
+
+    def seed():
+        return max_existing_sequence(
+            Ticket.objects.filter(serial_number__startswith=f"{prefix}-").values_list('serial_number', flat=True),
+            prefix, separator='-',
+        )
+
+    values = allocate('ticket', day, count, seed=seed)
+    # الأرقام التسلسلية للتذاكر تزيد خاناتها تلقائيا بعد 9999 لأن الحقل فريد ولا يعتمد على الترتيب
+    return [f"{prefix}-{str(value).zfill(4)}" for value in values]
+
+
+def generate_ticket_serial(day=None):
+    return generate_ticket_serials(1, day=day)[0]
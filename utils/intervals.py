@@ -0,0 +1,48 @@
+from bisect import bisect_right
+
+
+def merge_intervals(intervals):
+    """Sort closed (start, end) intervals and merge the ones that overlap or touch."""
+    merged = []
+    for start, end in sorted(interval for interval in intervals if interval[0] <= interval[1]):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def clip_intervals(intervals, lower, upper):
+    """Intersect merged intervals with lower..upper."""
+    clipped = []
+    for start, end in intervals:
+        start, end = max(start, lower), min(end, upper)
+        if start <= end:
+            clipped.append((start, end))
+    return clipped
+
+
+class IntervalSet:
+    """Merged closed intervals with O(log n) membership checks."""
+
+    def __init__(self, intervals):
+        self.intervals = merge_intervals(intervals)
+        self._starts = [start for start, _ in self.intervals]
+
+    def __bool__(self):
+        return bool(self.intervals)
+
+    def __len__(self):
+        return len(self.intervals)
+
+    @property
+    def bounds(self):
+        """(first start, last end), or None when empty."""
+        if not self.intervals:
+            return None
+        return self.intervals[0][0], self.intervals[-1][1]
+
+    def __contains__(self, value):
+        index = bisect_right(self._starts, value) - 1
+        return index >= 0 and value <= self.intervals[index][1]
@@ -0,0 +1,48 @@
+import re
+from django.db.models import Q
+
+# أقل عدد أرقام لبحث نهاية الرقم (آخر 4-6 أرقام عادة)
+MIN_SUFFIX_DIGITS = 3
+
+_DIGITS = str.maketrans('٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹', '01234567890123456789')
+_NON_DIGITS = re.compile(r'\D')
+
+
+def normalize_phone(value):
+    """
+    Fold Arabic-Indic digits and drop separators, keeping a leading '+'
+    ('00' international prefix becomes '+'). Values without digits are returned stripped.
+    """
+    if value is None:
+        return None
+    value = str(value).strip().translate(_DIGITS)
+    digits = _NON_DIGITS.sub('', value)
+    if not digits:
+        return value
+    if value.startswith('+'):
+        return f"+{digits}"
+    if digits.startswith('00'):
+        return f"+{digits[2:]}"
+    return digits
+
+
+def reverse_digits(value):
+    """Digits of a phone in reverse order, so suffix searches become indexed prefix scans."""
+    if not value:
+        return None
+    digits = _NON_DIGITS.sub('', str(value).translate(_DIGITS))
+    return digits[::-1] or None
+
+
+def is_phone_query(value):
+    digits = _NON_DIGITS.sub('', str(value or '').translate(_DIGITS))
+    return len(digits) >= MIN_SUFFIX_DIGITS and len(digits) == len(str(value).strip().lstrip('+'))
+
+
+def phone_suffix_q(field, value):
+    """Q for rows whose phone ends with the digits of value, using the reversed column `field`."""
+    reversed_value = reverse_digits(value)
+    if not reversed_value:
+        return Q(pk__in=[])
+    # ':' هو الحرف التالي بعد '9' فيصبح البحث نطاقا على الفهرس
+    return Q(**{f'{field}__gte': reversed_value, f'{field}__lt': reversed_value + ':'})
@@ -1,29 +1,23 @@
-from django.db.models import Count, Sum
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 from rest_framework import status
 from accounts.models import User
 from staff.models import StaffAttendance
+from finance.labels import translate_payment_method, translate_source
 from finance.models import Income, Expense
 import logging
 from django.shortcuts import get_object_or_404
 from django.db.models import Q
-from functools import reduce
-from operator import or_
 from decimal import Decimal
+from utils.intervals import IntervalSet, clip_intervals, merge_intervals
 
 logger = logging.getLogger(__name__)
 
-SOURCE_TRANSLATIONS = {
-    "Refund": "استرداد",
-    "Renewal": "تجديد",
-    "Subscription": "اشتراك"
-}
 
-PAYMENT_METHOD_TRANSLATIONS = {
-    "Cash": "كاش",
-    "Visa": "فيزا"
-}
+def _name_key(name):
+    # الأسماء الفارغة أولا مثل ترتيب قاعدة البيانات
+    return (name is not None, name or '')
+
 
 def get_employee_report_data(user, employee_id=None, start_date=None, end_date=None, shift_id=None):
     """Generate employee report data with required filters including specific time and payment methods."""
@@ -70,69 +64,65 @@ def get_employee_report_data(user, employee_id=None, start_date=None, end_date=N
             expense_filters['paid_by'] = employee
 
         # Apply attendance filter for non-admin/owner users
+        shift_windows = None
         if user.role not in ['admin', 'owner'] and employee == user and not shift_id:
-            attendances = StaffAttendance.objects.filter(
-                staff=employee, club=user.club, check_in__lte=end, check_out__gte=start
-            ).select_related('staff', 'club')
-
-            if not attendances.exists():
+            now = timezone.now()
+            windows = [
+                (check_in, check_out or now)
+                for check_in, check_out in StaffAttendance.objects.filter(
+                    staff=employee, club=user.club, check_in__lte=end
+                ).filter(Q(check_out__gte=start) | Q(check_out__isnull=True)).values_list('check_in', 'check_out')
+            ]
+            # دمج الشيفتات المتداخلة ثم فلتر SQL واحد على حدودها بدلا من OR لكل شيفت
+            shift_windows = IntervalSet(clip_intervals(merge_intervals(windows), start, end))
+            if not shift_windows:
                 logger.error("No attendance records found for employee: %s", employee.username)
                 return {'error': 'لا توجد سجلات حضور للموظف في الفترة المحددة.'}, status.HTTP_404_NOT_FOUND
-
-            # Combine attendance periods
-            report_filters = []
-            for attendance in attendances:
-                end_time = attendance.check_out if attendance.check_out else timezone.now()
-                report_filters.append(
-                    Q(date__gte=attendance.check_in, date__lte=end_time)
-                )
-
-            # Apply combined filter
-            combined_filter = reduce(or_, report_filters) if report_filters else Q()
-            income_filters['combined_filter'] = combined_filter
-            expense_filters['combined_filter'] = combined_filter
-
-        # Query incomes
-        incomes = Income.objects.select_related('source', 'payment_method').filter(**income_filters).only(
-            'id', 'amount', 'date', 'source__name', 'payment_method__name', 'quantity'
+            first, last = shift_windows.bounds
+            for filters in (income_filters, expense_filters):
+                filters['date__gte'], filters['date__lte'] = first, last
+
+        # مرور واحد على صفوف الإيرادات والمصروفات لحساب كل أقسام التقرير
+        total_income = Decimal('0.0')
+        total_expenses = Decimal('0.0')
+        null_payment_methods = 0
+        income_by_payment_method = {}
+        incomes_by_source = {}
+        expenses_by_category = {}
+
+        incomes = Income.objects.filter(**income_filters).values_list(
+            'date', 'amount', 'quantity', 'source__name', 'payment_method__name'
         )
+        for date, amount, quantity, source_name, method_name in incomes.iterator(chunk_size=2000):
+            if shift_windows is not None and date not in shift_windows:
+                continue
+            total_income += amount
+            if method_name is None:
+                null_payment_methods += 1
+            income_by_payment_method[method_name] = income_by_payment_method.get(method_name, Decimal('0.0')) + amount
+            group = incomes_by_source.setdefault((source_name, method_name), {'count': 0, 'total': Decimal('0.0')})
+            group['count'] += quantity or 0
+            group['total'] += amount
+
+        expenses = Expense.objects.filter(**expense_filters).values_list('date', 'amount', 'category__name')
+        for date, amount, category_name in expenses.iterator(chunk_size=2000):
+            if shift_windows is not None and date not in shift_windows:
+                continue
+            total_expenses += amount
+            expenses_by_category[category_name] = expenses_by_category.get(category_name, Decimal('0.0')) + amount
 
-        # Check for incomes with no payment method
-        null_payment_methods = incomes.filter(payment_method__isnull=True).count()
         if null_payment_methods > 0:
             logger.warning(f"Found {null_payment_methods} income records with no payment method for employee {employee.username}")
-
-        # Group incomes by source and payment method
-        incomes_by_source = incomes.values('source__name', 'payment_method__name').annotate(
-            count=Sum('quantity'), total=Sum('amount')
-        )
-
-        # Group incomes by payment method only
-        income_by_payment_method = incomes.values('payment_method__name').annotate(
-            total_income=Sum('amount')
-        ).order_by('payment_method__name')
-
-        # Query expenses
-        expenses = Expense.objects.filter(**expense_filters).values('category__name').annotate(
-            total=Sum('amount')
-        )
-
-        # Calculate totals
-        total_income = incomes.aggregate(total=Sum('amount'))['total'] or Decimal('0.0')
-        total_expenses = expenses.aggregate(total=Sum('amount'))['total'] or Decimal('0.0')
         net_profit = total_income - total_expenses
 
         # Prepare payment methods data
         payment_methods_data = []
-        for item in income_by_payment_method:
-            method_name = item['payment_method__name'] or 'غير محدد'
-            method_income = item['total_income'] or Decimal('0.0')
+        for method_name, method_income in sorted(income_by_payment_method.items(), key=lambda item: _name_key(item[0])):
             # Distribute expenses proportionally based on income
             method_expense = (method_income / total_income * total_expenses) if total_income > 0 else Decimal('0.0')
             method_net_profit = method_income - method_expense
-            logger.debug(f"Payment method {method_name}: income={method_income}, expense={method_expense}, net_profit={method_net_profit}")
             payment_methods_data.append({
-                'payment_method': PAYMENT_METHOD_TRANSLATIONS.get(method_name, method_name),
+                'payment_method': translate_payment_method(method_name),
                 'total_income': float(method_income),
                 'total_expense': float(method_expense),
                 'net_profit': float(method_net_profit)
@@ -150,19 +140,21 @@ def get_employee_report_data(user, employee_id=None, start_date=None, end_date=N
             'payment_methods': payment_methods_data,
             'incomes': [
                 {
-                    'source': SOURCE_TRANSLATIONS.get(item['source__name'], item['source__name']) or 'غير محدد',
-                    'payment_method': PAYMENT_METHOD_TRANSLATIONS.get(item['payment_method__name'], item['payment_method__name'] or 'غير محدد'),
-                    'count': item['count'],
-                    'total': float(item['total'])
+                    'source': translate_source(source_name) or 'غير محدد',
+                    'payment_method': translate_payment_method(method_name),
+                    'count': group['count'],
+                    'total': float(group['total'])
                 }
-                for item in incomes_by_source
+                for (source_name, method_name), group in sorted(
+                    incomes_by_source.items(), key=lambda item: (_name_key(item[0][0]), _name_key(item[0][1]))
+                )
             ],
             'expenses': [
                 {
-                    'category': item['category__name'] or 'غير محدد',
-                    'total': float(item['total'])
+                    'category': category_name or 'غير محدد',
+                    'total': float(total)
                 }
-                for item in expenses
+                for category_name, total in sorted(expenses_by_category.items(), key=lambda item: _name_key(item[0]))
             ]
         }
 
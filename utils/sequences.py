@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from core.models import SequenceCounter
+
+
+def _get_counter(kind, club, day, seed):
+    counter = SequenceCounter.objects.filter(club=club, kind=kind, day=day).first()
+    if counter:
+        return counter
+    # أول رقم في اليوم: نبدأ من آخر رقم موجود بالفعل (بيانات ما قبل العدادات)
+    initial = seed() if seed else 0
+    try:
+        with transaction.atomic():
+            return SequenceCounter.objects.create(club=club, kind=kind, day=day, last_value=initial)
+    except IntegrityError:
+        return SequenceCounter.objects.get(club=club, kind=kind, day=day)
+
+
+def allocate(kind, day, count=1, club=None, seed=None, max_value=None, limit_message=None):
+    """
+    Reserve `count` consecutive numbers of a daily sequence and return them as a range.
+    The increment is a single UPDATE so concurrent callers never get the same numbers;
+    going past max_value rolls the reservation back and raises ValueError.
+    """
+    if count < 1:
+        raise ValueError("count must be positive")
+    with transaction.atomic():
+        counter = _get_counter(kind, club, day, seed)
+        SequenceCounter.objects.filter(pk=counter.pk).update(last_value=F('last_value') + count)
+        last_value = SequenceCounter.objects.filter(pk=counter.pk).values_list('last_value', flat=True).get()
+        if max_value is not None and last_value > max_value:
+            raise ValueError(limit_message or f"Maximum limit of {max_value} numbers per day reached.")
+    return range(last_value - count + 1, last_value + 1)
+
+
+def daily_limit(width=3):
+    """Highest sequence value allowed for the width, or None when SEQUENCE_WIDE_NUMBERS is on."""
+    if getattr(settings, 'SEQUENCE_WIDE_NUMBERS', False):
+        return None
+    return 10 ** width - 1
+
+
+def format_daily_number(prefix, value, width=3, separator=''):
+    return f"{prefix}{separator}{str(value).zfill(width)}"
+
+
+def max_existing_sequence(values, prefix, separator=''):
+    """Highest numeric suffix among existing identifiers starting with prefix (used to seed counters)."""
+    highest = 0
+    start = len(prefix) + len(separator)
+    for value in values:
+        suffix = (value or '')[start:]
+        if suffix.isdigit():
+            highest = max(highest, int(suffix))
+    return highest
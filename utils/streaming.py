@@ -0,0 +1,69 @@
+import csv
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+DEFAULT_CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """File-like object whose write() just returns the value, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _to_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    return _to_text(value)
+
+
+def iter_values(queryset, fields, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Iterate a values() projection using a server-side chunked iterator."""
+    return queryset.values(*fields).iterator(chunk_size=chunk_size)
+
+
+def _csv_stream(rows, columns):
+    writer = csv.writer(_Echo())
+    # BOM حتى يفتح Excel الملف بالعربي بشكل صحيح
+    yield '\ufeff' + writer.writerow([label for _, label in columns])
+    for row in rows:
+        yield writer.writerow([_to_text(row.get(key)) for key, _ in columns])
+
+
+def _ndjson_stream(rows, columns):
+    for row in rows:
+        yield json.dumps({key: row.get(key) for key, _ in columns}, ensure_ascii=False, default=_json_default) + '\n'
+
+
+def streaming_export(rows, columns, filename, export_format='csv'):
+    """
+    Build a StreamingHttpResponse for an iterable of dict rows.
+    `columns` is a list of (key, header label) pairs.
+    """
+    if export_format == 'ndjson':
+        response = StreamingHttpResponse(_ndjson_stream(rows, columns), content_type='application/x-ndjson; charset=utf-8')
+        extension = 'ndjson'
+    else:
+        response = StreamingHttpResponse(_csv_stream(rows, columns), content_type='text/csv; charset=utf-8')
+        extension = 'csv'
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{extension}"'
+    response['X-Accel-Buffering'] = 'no'
+    return response
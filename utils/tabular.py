@@ -0,0 +1,59 @@
+import csv
+import io
+import os
+from datetime import datetime
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%Y/%m/%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M')
+
+
+def parse_date(value):
+    """Parse a date cell from CSV text or an XLSX date/datetime value."""
+    if value is None or value == '':
+        return None
+    if hasattr(value, 'date') and callable(value.date):
+        return value.date()
+    if hasattr(value, 'year'):
+        return value
+    value = str(value).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"تاريخ غير صالح: {value}")
+
+
+def _iter_csv_rows(fileobj):
+    if isinstance(fileobj, (bytes, bytearray)):
+        fileobj = io.BytesIO(fileobj)
+    if not isinstance(fileobj, io.TextIOBase):
+        fileobj = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    for row in csv.DictReader(fileobj):
+        yield {(k or '').strip(): v for k, v in row.items()}
+
+
+def _iter_xlsx_rows(fileobj):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("استيراد ملفات XLSX يتطلب تثبيت openpyxl.")
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = [str(h).strip() if h is not None else '' for h in next(rows, [])]
+        for values in rows:
+            if values is None or all(v is None for v in values):
+                continue
+            yield dict(zip(headers, values))
+    finally:
+        workbook.close()
+
+
+def iter_rows(fileobj, file_name):
+    """Yield rows from a CSV or XLSX file one at a time, without loading the whole sheet."""
+    extension = os.path.splitext(file_name or '')[1].lower()
+    if extension in ('.xlsx', '.xlsm'):
+        return _iter_xlsx_rows(fileobj)
+    if extension in ('.csv', '.txt', ''):
+        return _iter_csv_rows(fileobj)
+    raise ValueError(f"نوع الملف غير مدعوم: {extension}")
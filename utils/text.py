@@ -0,0 +1,31 @@
+import re
+
+_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+_FOLD = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي',
+    'ة': 'ه',
+    'ؤ': 'و',
+    '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
+    '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
+    '۰': '0', '۱': '1', '۲': '2', '۳': '3', '۴': '4',
+    '۵': '5', '۶': '6', '۷': '7', '۸': '8', '۹': '9',
+})
+_SPLIT = re.compile(r'[^\w]+')
+
+
+def normalize_text(value):
+    """Fold Arabic letter variants and digits, strip diacritics/tatweel and lowercase."""
+    if not value:
+        return ''
+    value = _DIACRITICS.sub('', str(value)).translate(_FOLD).lower()
+    return ' '.join(_SPLIT.sub(' ', value).split())
+
+
+def tokenize(value):
+    return [t for t in normalize_text(value).split(' ') if t]
+
+
+def name_fingerprint(value, max_length=255):
+    """Folded name tokens, de-duplicated and sorted, so word order and spelling variants match."""
+    return ' '.join(sorted(set(tokenize(value))))[:max_length] or None